@@ -0,0 +1,112 @@
+"""Micro-benchmark of the Birthday type against the old string-based helpers.
+
+Run with `python -m benchmarks.birthday` from the root of the repository.
+The old helpers are copied here as they were before the Birthday type.
+"""
+import datetime as dt
+import random
+from datetime import datetime
+from timeit import timeit
+from typing import Optional
+
+from milton.repositories.birthdays import Birthday
+
+N = 10_000
+REPEAT = 10
+
+
+def birth_from_str(date: Optional[str]) -> Optional[dt.datetime]:
+    if date:
+        if len(date) == 5:
+            birthday = dt.datetime.strptime(date, "%d-%m")
+            birthday = birthday.replace(year=1)
+        else:
+            birthday = dt.datetime.strptime(date, "%d-%m-%Y")
+
+        return birthday
+    return None
+
+
+def time_to_bday(date: Optional[str]) -> Optional[int]:
+    now = datetime.now()
+    if date := birth_from_str(date):
+        date = date.replace(year=now.year)
+        diff = date - now
+
+        if diff.days < 0:
+            return (now.replace(year=(now.year + 1)) - now).days + diff.days
+        return diff.days
+
+
+def calculate_age(date: Optional[str]) -> Optional[int]:
+    born = birth_from_str(date)
+    today = dt.date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def is_today(this: dt.date, other: dt.date) -> bool:
+    return all((this.day == other.day, this.month == other.month))
+
+
+def make_rows(n: int):
+    rows = []
+    for _ in range(n):
+        # Skip the 29th of February: the old helpers crash on it.
+        month = random.randint(1, 12)
+        day = random.randint(1, 28)
+        year = random.choice((None, random.randint(1950, 2010)))
+        rows.append((day, month, year))
+    return rows
+
+
+def old_check(rows, today):
+    found = 0
+    for day, month, year in rows:
+        if year:
+            date = f"{day:02}-{month:02}-{year:04}"
+        else:
+            date = f"{day:02}-{month:02}"
+        if is_today(today, birth_from_str(date).date()):
+            found += 1
+    return found
+
+
+def new_check(rows, today):
+    return sum(Birthday(*x).is_today(today) for x in rows)
+
+
+def old_show(rows):
+    dates = []
+    for day, month, year in rows:
+        if year:
+            dates.append(f"{day:02}-{month:02}-{year:04}")
+        else:
+            dates.append(f"{day:02}-{month:02}")
+    dates = sorted(dates, key=time_to_bday)
+    return [(time_to_bday(x), calculate_age(x) if len(x) != 5 else None) for x in dates]
+
+
+def new_show(rows, today):
+    birthdays = sorted((Birthday(*x) for x in rows), key=lambda x: x.days_until(today))
+    return [(x.days_until(today), x.age(today)) for x in birthdays]
+
+
+def main():
+    rows = make_rows(N)
+    today = dt.date.today()
+
+    cases = (
+        ("check (old helpers)", lambda: old_check(rows, today)),
+        ("check (Birthday)", lambda: new_check(rows, today)),
+        ("show (old helpers)", lambda: old_show(rows)),
+        ("show (Birthday)", lambda: new_show(rows, today)),
+    )
+
+    print(f"Timing {N} birthdays, best of {REPEAT} runs:")
+    for name, func in cases:
+        best = min(timeit(func, number=1) for _ in range(REPEAT))
+        print(f"\t{name:<22}{best * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
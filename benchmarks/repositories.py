@@ -0,0 +1,100 @@
+"""Benchmark of the birthday repository, in memory and on SQLite.
+
+Run with `python -m benchmarks.repositories` from the root of the repository.
+The in-memory numbers are the cost of the logic alone: the difference with the
+SQLite ones is what is spent on the database (and the disk).
+"""
+import asyncio
+import datetime as dt
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from milton.core.database import Database
+from milton.core.migrations import find_migrations, migrate
+from milton.repositories.birthdays import (
+    Birthday,
+    BirthdayRepository,
+    MemoryBirthdayRepository,
+    SqliteBirthdayRepository,
+)
+
+GUILDS = 100
+USERS = 100
+OPS = 2_000
+
+SCHEMAS = Path(__file__).parent.parent / "milton" / "schemas"
+
+
+def make_birthday() -> Birthday:
+    month = random.randint(1, 12)
+    day = random.randint(1, 28)
+    year = random.choice((None, random.randint(1950, 2010)))
+    return Birthday(day, month, year)
+
+
+async def timed(name: str, ops: int, func):
+    start = time.perf_counter()
+    await func()
+    elapsed = time.perf_counter() - start
+    print(f"\t{name:<24}{ops / elapsed:>12.0f} ops/s")
+
+
+async def run(repository: BirthdayRepository):
+    today = dt.date.today()
+    guild_ids = list(range(GUILDS))
+
+    async def fill():
+        for guild_id in guild_ids:
+            await repository.set_many(
+                guild_id, {x: make_birthday() for x in range(USERS)}
+            )
+
+    async def set_one():
+        await asyncio.gather(
+            *(
+                repository.set(random.choice(guild_ids), x, make_birthday())
+                for x in range(OPS)
+            )
+        )
+
+    async def celebrating():
+        for _ in range(OPS):
+            await repository.celebrating(today, guild_ids)
+
+    async def upcoming():
+        for _ in range(OPS):
+            await repository.upcoming(random.choice(guild_ids), today, 20, 40)
+
+    async def stats():
+        for _ in range(OPS // 10):
+            await repository.stats(random.choice(guild_ids), today, 30)
+
+    await timed("set_many", GUILDS, fill)
+    await timed("set (concurrent)", OPS, set_one)
+    await timed("celebrating", OPS, celebrating)
+    await timed("upcoming", OPS, upcoming)
+    await timed("stats", OPS // 10, stats)
+
+
+async def main():
+    print(f"{GUILDS} guilds with {USERS} birthdays each.")
+
+    print("In memory:")
+    await run(MemoryBirthdayRepository())
+
+    with tempfile.TemporaryDirectory() as folder:
+        db = Database(Path(folder) / "benchmark.db")
+        await db.connect()
+        await migrate(db, find_migrations(SCHEMAS))
+        try:
+            print("On SQLite:")
+            await run(SqliteBirthdayRepository(db))
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    asyncio.run(main())
@@ -1,3 +1,6 @@
+# Imported first, so that the timeline covers everything else
+from milton.utils.startup import TIMELINE  # isort: skip
+
 import logging
 import os
 from logging import StreamHandler
@@ -7,7 +10,10 @@ from pathlib import Path
 from colorama import Back, Fore, Style
 from prompt_toolkit.patch_stdout import StdoutProxy
 
-from milton.core.config import CONFIG
+TIMELINE.mark("import logging libraries")
+
+with TIMELINE.phase("load config"):
+    from milton.core.config import CONFIG
 
 __all__ = ["__version__", "CHANGELOG"]
 
@@ -66,3 +72,5 @@ stream_h.setLevel(CONFIG.logs.stdout_level)
 
 log.addHandler(file_h)
 log.addHandler(stream_h)
+
+TIMELINE.mark("set up logging")
@@ -1,90 +1,125 @@
 # Implements the birthday cog
 # TODO: This is bad and I cannot be bothered to make it better!
+import asyncio
+import csv
 import datetime as dt
+import io
 import logging
+import time
 from datetime import datetime
-from typing import Optional
+from functools import partial
+from math import ceil
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
 
 import discord
 from discord import Interaction, app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 
 from milton.core.bot import Milton
 from milton.core.config import CONFIG
+from milton.core.jobs import Job, daily
+from milton.repositories.birthdays import Birthday
 from milton.utils.enums import Months
-from milton.utils.paginator import Paginator
-from milton.utils.tools import unwrap
+from milton.utils.paginator import LazyPaginator
+from milton.utils.tools import gather_limited
 
 log = logging.getLogger(__name__)
 
+BIRTHDAYS_PER_PAGE = 20
 
-def birth_from_str(date: Optional[str]) -> Optional[dt.datetime]:
-    """Returns a datetime object by parsing a date
+# Largest CSV file that can be imported, in bytes
+MAX_IMPORT_SIZE = 2**20
 
-    A wrapper to handle the optional presence of a year.
+# How many days the `stats` command looks ahead
+STATS_DAYS = 30
+
+
+def parse_birthdays_csv(
+    content: str,
+) -> Tuple[Dict[int, Birthday], List[str]]:
+    """Parse and validate a CSV file of birthdays.
+
+    The file must have a header with (at least) the `user_id`, `day` and
+    `month` columns, and optionally a `year` column.
 
     Args:
-        date: string that can be parsed in a date by strptime. If None, this
-            function returns None.
+        content: The content of the CSV file.
+
+    Returns:
+        A tuple with a dictionary of user ids to their birthdays, and a list
+        of the problems that were found. If a user appears more than once,
+        the last row wins.
     """
-    if date:
-        if len(date) == 5:
-            # This is a date without a year
-            birthday = dt.datetime.strptime(date, "%d-%m")
-            birthday = birthday.replace(year=1)
-        else:
-            birthday = dt.datetime.strptime(date, "%d-%m-%Y")
+    reader = csv.DictReader(io.StringIO(content))
+    missing = {"user_id", "day", "month"} - set(reader.fieldnames or [])
+    if missing:
+        return {}, [f"Missing column(s): {', '.join(sorted(missing))}"]
+
+    birthdays = {}
+    errors = []
+    for line, row in enumerate(reader, start=2):
+        try:
+            user_id = int(row["user_id"])
+            year = int(row["year"]) if row.get("year") else None
+            if year is not None and not 1000 <= year <= 9999:
+                raise ValueError("year must be between 1000 and 9999")
+            birthdays[user_id] = Birthday(int(row["day"]), int(row["month"]), year)
+        except (ValueError, TypeError) as e:
+            errors.append(f"Line {line}: {e}")
+
+    return birthdays, errors
 
-        return birthday
-    return None
 
+def render_stats_chart(
+    title: str, months: List[int], weekdays: List[int], upcoming: List[int]
+) -> bytes:
+    """Render the birthday statistics of a guild to a PNG image.
 
-def time_to_bday(date: Optional[str]) -> Optional[int]:
-    """Returns the time from now to the next date in days.
+    This is slow, so it is meant to be run in an executor.
 
     Args:
-        Date: A parseable string to check.
+        title: The title of the chart.
+        months: The number of birthdays in each month, from January.
+        weekdays: The number of birthdays on each weekday this year, from Monday.
+        upcoming: The number of birthdays in each of the next days, from today.
+
+    Returns:
+        The bytes of the PNG image.
     """
-    now = datetime.now()
-    if date := birth_from_str(date):
-        date = date.replace(year=now.year)
-        diff = date - now
+    # Matplotlib is heavy, and only needed here
+    from matplotlib.figure import Figure
 
-        if diff.days < 0:
-            return (now.replace(year=(now.year + 1)) - now).days + diff.days
-        return diff.days
+    figure = Figure(figsize=(8, 9), dpi=100, layout="constrained")
+    figure.suptitle(title)
+    month_axes, weekday_axes, upcoming_axes = figure.subplots(3, 1)
 
+    month_axes.bar([x.name[:3] for x in Months], months)
+    month_axes.set_title("Birthdays per month")
 
-def calculate_age(date: Optional[str]) -> Optional[int]:
-    """Returns the age of the person given their birthday
+    weekday_axes.bar(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], weekdays)
+    weekday_axes.set_title(f"Weekday of the birthdays in {dt.date.today().year}")
 
-    Args:
-        date: A parseable string to check.
-    """
-    born = birth_from_str(date)
-    today = dt.date.today()
-    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+    upcoming_axes.bar(range(len(upcoming)), upcoming)
+    upcoming_axes.set_title(f"Birthdays in the next {len(upcoming)} days")
+    upcoming_axes.set_xlabel("Days from today")
+
+    for axes in (month_axes, weekday_axes, upcoming_axes):
+        axes.yaxis.get_major_locator().set_params(integer=True)
 
+    with io.BytesIO() as buffer:
+        figure.savefig(buffer, format="png")
+        return buffer.getvalue()
 
-def is_today(this: dt.date, other: dt.date) -> bool:
-    """Checks if the two dates point to the same day"""
-    return all((this.day == other.day, this.month == other.month))
 
+def job_name(guild_id: int) -> str:
+    """Get the name of the job announcing the birthdays of a guild."""
+    return f"birthday.{guild_id}"
 
-def clean_date(date: Optional[str]):
-    """This shouldn't have been necessary..."""
-    if not date:
-        return date
 
-    if len(date) in (5, 9):
-        return date
-    else:
-        output = []
-        for item in date.split("-"):
-            if len(item) == 1:
-                item = f"0{item}"
-            output.append(item)
-        return "-".join(output)
+def local_today(timezone: Optional[str]) -> dt.date:
+    """Get today's date in a timezone (or the server's, if None)."""
+    return datetime.now(ZoneInfo(timezone) if timezone else None).date()
 
 
 @app_commands.guild_only
@@ -109,162 +144,337 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
 
     def __init__(self, bot: Milton) -> None:
         self.bot: Milton = bot
-        self.check_birthdays_task.start()
+
+        self._due: Dict[int, dt.date] = {}
+        """The guilds due for an announcement, and the day they are due for."""
+        self._checking: Optional[asyncio.Task] = None
+        self._scheduled: Set[int] = set()
+        """The guilds whose announcements are scheduled."""
+        self._scheduling_task: Optional[asyncio.Task] = None
+
+        self._stats_cache: Dict[int, Tuple[dt.date, bytes]] = {}
+        """The rendered `stats` charts of each guild, and the day they were
+        made on. Entries are dropped when the birthdays of the guild change."""
+
+    async def cog_load(self):
+        self._scheduling_task = asyncio.create_task(self.schedule_guilds())
 
     def cog_unload(self):
-        self.check_birthdays_task.stop()
-
-    @tasks.loop(time=dt.time(hour=CONFIG.birthday.when))
-    async def check_birthdays_task(self):
-        """Tasks the checking of the birthdays in a loop"""
-        log.info("Checking today's birthdays...")
-
-        async with self.bot.db.execute(
-            "SELECT guild_id, bday_shout_channel FROM guild_config"
-        ) as cursor:
-            async for row in cursor:
-                if row[1] is not None:
-                    await self.check_birthdays(row[0])
-
-    @check_birthdays_task.before_loop
-    async def before_task(self):
+        if self._scheduling_task:
+            self._scheduling_task.cancel()
+        for guild_id in list(self._scheduled):
+            self.bot.jobs.remove(job_name(guild_id))
+
+    async def schedule_guilds(self):
+        """Schedule the birthday announcements of all guilds with a shout channel."""
         await self.bot.wait_until_ready()
 
-    async def check_birthdays(self, guild_id: int):
-        """Checks if it's someone's birthday and sends the respective messages
+        for settings in self.bot.guild_settings:
+            if settings.bday_shout_channel is not None:
+                self.schedule_guild(
+                    settings.guild_id, settings.bday_timezone, settings.bday_hour
+                )
+
+        log.info(
+            f"Scheduled birthday announcements for {len(self._scheduled)} guild(s)."
+        )
+
+    def schedule_guild(
+        self, guild_id: int, timezone: Optional[str], hour: Optional[int]
+    ):
+        """Announce the birthdays of a guild every day, at its own time.
 
-        Takes a guild_id of a guild THAT HAS SET THE SHOUT CHANNEL!!
+        Replaces the schedule that the guild already had, if any. If the
+        announcement of the day was missed (say, the bot was offline), it is
+        sent as soon as possible.
         """
-        async with self.bot.db.execute(
-            f"SELECT bday_shout_channel FROM guild_config WHERE guild_id = :guild_id",
-            (guild_id,),
-        ) as cursor:
-            shout_channel_id = await cursor.fetchone()
+        if hour is None:
+            hour = CONFIG.birthday.when
+
+        self.bot.jobs.add(
+            Job(
+                job_name(guild_id),
+                partial(self.announce_due, guild_id),
+                daily(hour, timezone),
+            )
+        )
+        self._scheduled.add(guild_id)
+
+    async def unschedule_guild(self, guild_id: int):
+        """Stop announcing birthdays in a guild."""
+        self._scheduled.discard(guild_id)
+        await self.bot.jobs.forget(job_name(guild_id))
+
+    @commands.Cog.listener()
+    async def on_guild_data_removed(self, guild_ids: List[int]):
+        for guild_id in guild_ids:
+            self._stats_cache.pop(guild_id, None)
+            await self.unschedule_guild(guild_id)
+
+    @commands.Cog.listener()
+    async def on_member_data_removed(self, guild_id: int, user_ids: List[int]):
+        self._stats_cache.pop(guild_id, None)
+
+    @commands.Cog.listener()
+    async def on_channel_data_removed(self, channels: List[Tuple[int, int]]):
+        # The announcement channel of the guild might be gone
+        for guild_id in {x for x, _ in channels}:
+            if self.bot.guild_settings.get(guild_id).bday_shout_channel is None:
+                await self.unschedule_guild(guild_id)
+
+    async def announce_due(self, guild_id: int, due: float):
+        """Job that announces the birthdays of a guild.
+
+        The guilds that are due at the same time are checked together.
+
+        Args:
+            guild_id: The id of the guild.
+            due: When the announcement was due. Late announcements are for
+                the day they were due on, in the timezone of the guild.
+        """
+        timezone = self.bot.guild_settings.get(guild_id).bday_timezone
+        self._due[guild_id] = datetime.fromtimestamp(
+            due, ZoneInfo(timezone) if timezone else None
+        ).date()
+
+        while guild_id in self._due:
+            if self._checking is None or self._checking.done():
+                self._checking = asyncio.create_task(self.check_due())
+            await asyncio.shield(self._checking)
+
+    async def check_due(self):
+        """Check the birthdays of all guilds that are due."""
+        due, self._due = self._due, {}
+        await self.check_birthdays(due)
+
+    async def check_birthdays(self, guild_days: Dict[int, dt.date]):
+        """Check the birthdays of some guilds.
+
+        Args:
+            guild_days: The ids of the guilds to check, to the day to check.
+        """
+        if not guild_days:
+            return
 
-        shout_channel_id = unwrap(shout_channel_id)
+        log.info(f"Checking the birthdays for {len(guild_days)} guild(s)...")
 
-        assert shout_channel_id is not None
+        # Group the guilds by their local date, usually there is only one
+        by_date: Dict[dt.date, List[int]] = {}
+        for guild_id, day in guild_days.items():
+            by_date.setdefault(day, []).append(guild_id)
 
-        out = []
-        today = dt.date.today()
+        announcements = []
+        for today, ids in by_date.items():
+            celebrations = await self.todays_birthdays(today, ids)
+            for guild_id, (shout_channel_id, celebrants) in celebrations.items():
+                announcements.append(
+                    self.announce_birthdays(
+                        guild_id, shout_channel_id, celebrants, today
+                    )
+                )
 
-        async with self.bot.db.execute(
-            f"SELECT user_id, year, day, month FROM birthdays WHERE guild_id = :guild_id",
-            (guild_id,),
-        ) as cursor:
-            async for row in cursor:
-                user_id, year, day, month = row
+        if not announcements:
+            return
 
-                if year:
-                    date = f"{day:02}-{month:02}-{year:04}"
-                else:
-                    date = f"{day:02}-{month:02}"
+        start = time.perf_counter()
+        results = await gather_limited(announcements, CONFIG.birthday.max_concurrency)
+        sent = sum(x is True for x in results)
+        for result in results:
+            if isinstance(result, Exception):
+                log.error("Failed to announce birthdays", exc_info=result)
 
-                birthday = birth_from_str(date).date()
+        log.info(
+            f"Birthday announcements: {sent} sent, {len(results) - sent} failed, "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
 
-                if not is_today(today, birthday):
-                    continue
+    async def todays_birthdays(
+        self, today: dt.date, guild_ids: Optional[List[int]] = None
+    ) -> Dict[int, Tuple[int, List[Tuple[int, Birthday]]]]:
+        """Get who is celebrating their birthday today, grouped by guild.
 
-                if not year:
-                    # This is a date without a year.
-                    out.append(f"Happy birthday to you, <@!{user_id}>!!")
-                else:
-                    # This is a date with a year
-                    age = today.year - birthday.year
-
-                    if age == 0:
-                        ending = "You seem to have been born today. Congratulations!"
-                    elif age < 0:
-                        ending = f"You must be a time traveler! You will be born in {-age} years!"
-                    else:
-                        ending = f"You just turned {age}!!"
-
-                    out.append(f"Happy birthday to you, <@!{user_id}>!! " + ending)
-
-        if len(out) != 0:
-            shout_channel = self.bot.get_channel(int(shout_channel_id))
-            if shout_channel:
-                await shout_channel.send(content="\n".join(out))
+        Only guilds that have set a shout channel are considered. People born
+        on the 29th of February celebrate on the 28th in non-leap years.
+
+        Args:
+            today: The date to check for.
+            guild_ids: If given, only check these guilds.
+
+        Returns:
+            A dictionary of guild ids to a tuple with the id of the shout
+            channel of the guild and a list of (user_id, birthday) of the
+            people celebrating in that guild.
+        """
+        if guild_ids is None:
+            guild_ids = [x.guild_id for x in self.bot.guild_settings]
+        shout_channels = {}
+        for guild_id in guild_ids:
+            channel_id = self.bot.guild_settings.get(guild_id).bday_shout_channel
+            if channel_id is not None:
+                shout_channels[guild_id] = channel_id
+
+        if not shout_channels:
+            return {}
+
+        out = {}
+        for guild_id, user_id, birthday in await self.bot.birthdays.celebrating(
+            today, list(shout_channels)
+        ):
+            _, celebrants = out.setdefault(guild_id, (shout_channels[guild_id], []))
+            celebrants.append((user_id, birthday))
+
+        return out
+
+    async def announce_birthdays(
+        self,
+        guild_id: int,
+        shout_channel_id: int,
+        celebrants: List[Tuple[int, Birthday]],
+        today: dt.date,
+    ) -> bool:
+        """Send the birthday wishes for a guild in its shout channel.
+
+        If the shout channel cannot be found, it is removed for the guild.
+
+        Args:
+            guild_id: The id of the guild.
+            shout_channel_id: The id of the shout channel of the guild.
+            celebrants: A list of (user_id, birthday) of the people to wish a
+                happy birthday to.
+            today: The date of the birthdays.
+
+        Returns:
+            True if the wishes were sent, False otherwise.
+        """
+        out = []
+        for user_id, birthday in celebrants:
+            age = birthday.age(today)
+            if age is None:
+                # This is a date without a year.
+                out.append(f"Happy birthday to you, <@!{user_id}>!!")
             else:
-                log.error(
-                    (
-                        f"I could not fetch the shout channel for guild {guild_id}"
-                        " maybe the channel got deleted? Removing the shout channel"
-                        " for this guild."
-                    )
-                )
-                await self.bot.db.execute(
-                    f"UPDATE guild_config SET bday_shout_channel = NULL WHERE guild_id = :guild_id",
-                    (guild_id,),
+                if age == 0:
+                    ending = "You seem to have been born today. Congratulations!"
+                elif age < 0:
+                    ending = f"You must be a time traveler! You will be born in {-age} years!"
+                else:
+                    ending = f"You just turned {age}!!"
+
+                out.append(f"Happy birthday to you, <@!{user_id}>!! " + ending)
+
+        if len(out) == 0:
+            return False
+
+        shout_channel = self.bot.get_channel(int(shout_channel_id))
+        if not shout_channel:
+            log.error(
+                (
+                    f"I could not fetch the shout channel for guild {guild_id}"
+                    " maybe the channel got deleted? Removing the shout channel"
+                    " for this guild."
                 )
-                await self.bot.db.commit()
+            )
+            await self.bot.guild_settings.update(guild_id, bday_shout_channel=None)
+            await self.unschedule_guild(guild_id)
+            return False
+
+        try:
+            await shout_channel.send(content="\n".join(out))
+        except discord.HTTPException as e:
+            log.error(f"Could not send the birthday wishes for guild {guild_id}: {e}")
+            return False
+
+        return True
 
     @app_commands.command(name="show")
     async def get_birthdays(self, interaction: Interaction):
         """Get birthdays registered in this guild."""
-        do_paginate = False  # This is horrible but I want to get it over with
-        out = Paginator(
-            prefix="```",
-            suffix="```",
-            force_embed=True,
-            title=f"Here are the birthdays for **{interaction.guild.name}**",
-        )
-
         if not interaction.guild:
-            interaction.response.send_message("You must run this in a server.")
+            await interaction.response.send_message("You must run this in a server.")
             return
 
-        guild_id = str(interaction.guild.id)
         guild = interaction.guild
+        today = dt.date.today()
 
-        birthdays = []
-        async with self.bot.db.execute(
-            f"SELECT user_id, year, day, month FROM birthdays WHERE guild_id = :guild_id",
-            (guild_id,),
-        ) as cursor:
-            async for row in cursor:
-                if row[1] is None:
-                    # This has no year
-                    birthdays.append((row[0], f"{row[2]:02}-{row[3]:02}"))
-                else:
-                    birthdays.append((row[0], f"{row[2]:02}-{row[3]:02}-{row[1]:04}"))
-
-        if not birthdays:
+        total, _ = await self.bot.birthdays.count(guild.id, today)
+        if not total:
             await interaction.response.send_message(
                 "Nobody registered a birthday in this server, sorry."
             )
             return
 
-        birthdays = sorted(birthdays, key=lambda x: time_to_bday(x[1]))
+        async def fetch_lines(page: int) -> List[str]:
+            rows = await self.bot.birthdays.upcoming(
+                guild.id, today, BIRTHDAYS_PER_PAGE, page * BIRTHDAYS_PER_PAGE
+            )
 
-        for entry in birthdays:
-            user_id = int(entry[0])
-            date = clean_date(entry[1])
+            # Only the members on this page are requested
+            members = await self.bot.members.resolve(guild, [x[0] for x in rows])
 
-            dateobj = birth_from_str(date)
+            lines = []
+            for user_id, birthday, days_until in rows:
+                user = members.get(user_id)
+                if user is None:
+                    continue
+                username = user.display_name
+                if len(username) > 20:
+                    username = username[:20] + "..."
+                if (age := birthday.age(today)) is None:
+                    lines.append(f"{username:<25}{birthday} (-{days_until} days)")
+                else:
+                    lines.append(
+                        f"{username:<25}{birthday} (Age {age}, -{days_until} days)"
+                    )
+            return lines
 
-            user = guild.get_member(user_id)
-            if not (user is not None and date is not None):
-                continue
-            username = user.display_name
-            if len(username) > 20:
-                username = username[:20] + "..."
-            do_paginate = True
-            if dateobj.year == 1:
-                out.add_line(f"{username:<25}{date} (-{time_to_bday(date)} days)")
-            else:
-                out.add_line(
-                    f"{username:<25}{date} (Age {calculate_age(date)},"
-                    f" -{time_to_bday(date)} days)"
-                )
+        out = LazyPaginator(
+            fetch_lines,
+            page_count=ceil(total / BIRTHDAYS_PER_PAGE),
+            prefix="```",
+            suffix="```",
+            force_embed=True,
+            title=f"Here are the birthdays for **{guild.name}**",
+        )
+        await out.paginate(interaction)
 
-        if do_paginate:
-            await out.paginate(interaction)
-        else:
-            await interaction.response.send_message(
-                "Nobody registered a birthday in this server, sorry."
+    @app_commands.command()
+    async def stats(self, interaction: Interaction):
+        """Show some statistics on the birthdays in this server."""
+        guild_id = interaction.guild.id
+        today = dt.date.today()
+
+        cached_on, chart = self._stats_cache.get(guild_id, (None, None))
+        if cached_on != today:
+            months, weekdays, upcoming = await self.bot.birthdays.stats(
+                guild_id, today, STATS_DAYS
             )
 
+            if not any(months):
+                await interaction.response.send_message(
+                    "Nobody registered a birthday in this server, sorry."
+                )
+                return
+
+            await interaction.response.defer(thinking=True)
+            loop = asyncio.get_running_loop()
+            chart = await loop.run_in_executor(
+                None,
+                partial(
+                    render_stats_chart,
+                    f"Birthdays in {interaction.guild.name}",
+                    months,
+                    weekdays,
+                    upcoming,
+                ),
+            )
+            self._stats_cache[guild_id] = (today, chart)
+        else:
+            await interaction.response.defer(thinking=True)
+
+        await interaction.followup.send(
+            file=discord.File(io.BytesIO(chart), filename="birthdays.png")
+        )
+
     @app_commands.command(name="set")
     async def register(
         self,
@@ -282,15 +492,11 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
 
         month = month.value
 
-        guild_id = str(interaction.guild.id)
-        user_id = str(interaction.user.id)
+        guild_id = interaction.guild.id
+        user_id = interaction.user.id
 
         try:
-            if year:
-                birth_from_str(f"{day:02}-{month:02}-{year:04}")
-            else:
-                birth_from_str(f"{day:02}-{month:02}")
-
+            birthday = Birthday(day, month, year)
         except ValueError:
             log.debug("Inputted birthday is not parseable to a date.")
             await interaction.response.send_message(
@@ -300,26 +506,80 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
 
         log.debug(f"Updating birthday of user {user_id} in guild {guild_id}")
 
-        await self.bot.db.execute(
-            ("DELETE FROM birthdays WHERE guild_id = :guild_id AND user_id = :user_id"),
-            (guild_id, user_id),
-        )
-        await self.bot.db.commit()
-
-        await self.bot.db.execute(
-            (
-                "INSERT INTO birthdays "
-                "(guild_id, user_id, year, day, month) "
-                "VALUES (:guild_id, :user_id, :year, :day, :month) "
-            ),
-            (guild_id, user_id, year, day, month),
-        )
-        await self.bot.db.commit()
+        await self.bot.birthdays.set(guild_id, user_id, birthday)
+        self._stats_cache.pop(guild_id, None)
 
         await interaction.response.send_message(
             "Huzzah! I will now remember your birthday."
         )
 
+    @app_commands.command(name="import")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def import_birthdays(
+        self, interaction: Interaction, file: discord.Attachment
+    ):
+        """Import many birthdays at once from a CSV file.
+
+        The file needs the `user_id`, `day` and `month` columns, and may have
+        a `year` column. Birthdays of users already registered are replaced.
+        """
+        if file.size > MAX_IMPORT_SIZE:
+            await interaction.response.send_message(
+                "Sorry, that file is too large.", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        try:
+            content = (await file.read()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            await interaction.followup.send("That file is not a text (UTF-8) file.")
+            return
+
+        birthdays, errors = parse_birthdays_csv(content)
+        if errors:
+            shown = "\n".join(errors[:10])
+            more = f"\n...and {len(errors) - 10} more." if len(errors) > 10 else ""
+            await interaction.followup.send(
+                f"I did not import anything, as I found some problems:\n{shown}{more}"
+            )
+            return
+
+        guild_id = interaction.guild.id
+        log.info(f"Importing {len(birthdays)} birthday(s) in guild {guild_id}")
+
+        await self.bot.birthdays.set_many(guild_id, birthdays)
+        self._stats_cache.pop(guild_id, None)
+
+        await interaction.followup.send(f"Imported {len(birthdays)} birthday(s)!")
+
+    @app_commands.command(name="export")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def export_birthdays(self, interaction: Interaction):
+        """Export the birthdays of this server to a CSV file."""
+        # Large servers take a while, and interactions must be answered fast
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        buffer = io.BytesIO()
+        # Rows go straight from the repository to the file
+        stream = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+        writer = csv.writer(stream)
+        writer.writerow(("user_id", "day", "month", "year"))
+
+        async for user_id, birthday in self.bot.birthdays.of_guild(
+            interaction.guild.id
+        ):
+            writer.writerow((user_id, birthday.day, birthday.month, birthday.year))
+
+        stream.flush()
+        stream.detach()
+        buffer.seek(0)
+
+        await interaction.followup.send(
+            file=discord.File(buffer, filename="birthdays.csv")
+        )
+
     @app_commands.command()
     async def remove(self, interaction):
         """Removes the birthday date from yourself."""
@@ -328,16 +588,13 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
                 "You must use this in a guild.", ephemeral=True
             )
 
-        guild_id = str(interaction.guild.id)
-        user_id = str(interaction.user.id)
+        guild_id = interaction.guild.id
+        user_id = interaction.user.id
 
         log.debug(f"Removing birthday of user {user_id} in guild {guild_id}")
 
-        await self.bot.db.execute(
-            "DELETE FROM birthdays WHERE guild_id = :guild_id AND user_id = :user_id",
-            (guild_id, user_id),
-        )
-        await self.bot.db.commit()
+        await self.bot.birthdays.remove(guild_id, user_id)
+        self._stats_cache.pop(guild_id, None)
 
         await interaction.response.send_message(
             "Sure! I forgot your birthday for this server. Bye!"
@@ -356,23 +613,17 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
                 "You must use this in a guild.", ephemeral=True
             )
 
-        guild_id = str(interaction.guild.id)
-        channel_id = str(interaction.channel.id)
+        guild_id = interaction.guild.id
+        channel_id = interaction.channel.id
 
         log.debug(
             f"Setting birthday shout channel for guild {guild_id} to {channel_id}"
         )
 
-        await self.bot.db.execute(
-            (
-                "INSERT INTO guild_config "
-                "(guild_id, bday_shout_channel) "
-                "VALUES (:guild_id, :channel_id) "
-                "ON CONFLICT (guild_id) DO UPDATE SET bday_shout_channel = :channel_id WHERE guild_id = :guild_id"
-            ),
-            (guild_id, channel_id),
+        settings = await self.bot.guild_settings.update(
+            guild_id, bday_shout_channel=channel_id
         )
-        await self.bot.db.commit()
+        self.schedule_guild(guild_id, settings.bday_timezone, settings.bday_hour)
 
         await interaction.response.send_message(
             (
@@ -395,23 +646,58 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
                 "You must use this in a guild.", ephemeral=True
             )
 
-        guild_id = str(interaction.guild.id)
+        guild_id = interaction.guild.id
 
         log.debug(f"Removing birthday shout channel for guild {guild_id}")
 
-        await self.bot.db.execute(
-            (
-                "UPDATE OR IGNORE birthdays SET bday_shout_channel = NULL "
-                "WHERE guild_id = :guild_id"
-            ),
-            (guild_id,),
-        )
-        await self.bot.db.commit()
+        await self.bot.guild_settings.update(guild_id, bday_shout_channel=None)
+        await self.unschedule_guild(guild_id)
 
         await interaction.response.send_message(
             ("I will be silent about birthdays from now on.")
         )
 
+    @app_commands.command()
+    @app_commands.checks.has_permissions(administrator=True)
+    async def schedule(
+        self,
+        interaction: Interaction,
+        timezone: str,
+        hour: app_commands.Range[int, 0, 23],
+    ):
+        """Set when to shout the birthdays, in your timezone.
+
+        The timezone is a name like "Europe/Rome" or "America/New_York".
+        """
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            await interaction.response.send_message(
+                f"Sorry, I don't know the timezone '{timezone}'.", ephemeral=True
+            )
+            return
+
+        guild_id = interaction.guild.id
+        log.debug(
+            f"Setting birthday schedule for guild {guild_id} to {hour} {timezone}"
+        )
+
+        settings = await self.bot.guild_settings.update(
+            guild_id, bday_timezone=timezone, bday_hour=hour
+        )
+        if settings.bday_shout_channel is not None:
+            self.schedule_guild(guild_id, timezone, hour)
+
+        await interaction.response.send_message(
+            f"I will shout the birthdays at {hour:02}:00 ({timezone}) from now on!"
+        )
+
+    @schedule.autocomplete("timezone")
+    async def timezone_autocomplete(self, interaction: Interaction, current: str):
+        current = current.lower()
+        matches = sorted(x for x in available_timezones() if current in x.lower())
+        return [app_commands.Choice(name=x, value=x) for x in matches[:25]]
+
     @app_commands.command()
     @app_commands.checks.has_permissions(administrator=True)
     async def check(self, interaction: Interaction):
@@ -424,21 +710,20 @@ class BirthdayCog(commands.GroupCog, name="birthday"):
                 "You must use this in a guild.", ephemeral=True
             )
 
-        guild_id = str(interaction.guild.id)
+        guild_id = interaction.guild.id
 
-        async with self.bot.db.execute(
-            f"SELECT bday_shout_channel FROM guild_config WHERE guild_id = :guild_id",
-            (guild_id,),
-        ) as cursor:
-            shout_channel = await cursor.fetchone()
+        settings = self.bot.guild_settings.get(guild_id)
 
-        shout_channel = unwrap(shout_channel)
-
-        if shout_channel is not None:
+        if settings.bday_shout_channel is not None:
             await interaction.response.send_message(
                 "Checking birthdays, please wait.", ephemeral=True
             )
-            await self.check_birthdays(guild_id)
+            today = local_today(settings.bday_timezone)
+            celebrations = await self.todays_birthdays(today, [guild_id])
+            if guild_id in celebrations:
+                await self.announce_birthdays(
+                    guild_id, *celebrations[guild_id], today=today
+                )
         else:
             await interaction.response.send_message(
                 "Sorry, you did not set a shout channel.", ephemeral=True
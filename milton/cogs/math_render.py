@@ -3,24 +3,59 @@ import io
 import logging
 import re
 from itertools import batched
+from typing import List
 
 import discord
 from discord import Message
 from discord.ext import commands
-from matplotlib.mathtext import math_to_image
 
 from milton.core.bot import Milton
+from milton.core.config import CONFIG
+from milton.utils.tools import lazy_import, warm_up
 
 log = logging.getLogger(__name__)
 
+# Matplotlib is heavy, so it is imported on first use (or after startup)
+MATHTEXT = "matplotlib.mathtext"
+
 FIND_MATH_REGEX = re.compile(r"(\$.+?\$)")
 MATH_RENDER_EMOJI = "👁️"
 
 
+def render_formulae(formulae: List[str]) -> List[io.BytesIO]:
+    """Render some formulae to PNG images.
+
+    This is slow, so it is meant to be run in an executor. Formulae that
+    fail to render are skipped.
+    """
+    math_to_image = lazy_import(MATHTEXT).math_to_image
+
+    renders = []
+    for formula in formulae:
+        try:
+            buffer = io.BytesIO()
+            buffer.name = "render.png"
+            math_to_image(formula, buffer, dpi=250, format="png")
+            buffer.seek(0)
+            renders.append(buffer)
+        except Exception:
+            log.exception("Got an error while rendering:")
+            continue
+    return renders
+
+
 class MathRenderCog(commands.Cog, name="Math renderer"):
     def __init__(self, bot: Milton) -> None:
         self.bot = bot
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if CONFIG.bot.warm_up:
+            try:
+                await warm_up(MATHTEXT)
+            except ImportError:
+                log.exception("Cannot import matplotlib. Math will not be rendered.")
+
     @commands.Cog.listener(name="on_message")
     async def on_message(self, message: Message):
         if message.author.bot:
@@ -40,17 +75,8 @@ class MathRenderCog(commands.Cog, name="Math renderer"):
         log.debug(f"Found {len(formulae)} formulae to render.")
         # If we get here, the message probably has a valid formula.
         # Make an image out of it.
-        renders = []
-        for formula in formulae:
-            try:
-                buffer = io.BytesIO()
-                buffer.name = "render.png"
-                math_to_image(formula, buffer, dpi=250, format="png")
-                buffer.seek(0)
-                renders.append(buffer)
-            except Exception as e:
-                log.exception("Got an error while rendering:", e)
-                continue
+        loop = asyncio.get_running_loop()
+        renders = await loop.run_in_executor(None, render_formulae, formulae)
 
         # If we failed to render anything, stop here
         if not renders:
@@ -6,18 +6,31 @@ from io import BytesIO
 import discord
 from discord.ext import commands
 from discord.ext.commands import Cog
-from pdf2image import convert_from_bytes
-from pypdf import PdfReader
 
 from milton.core.bot import Milton
+from milton.core.config import CONFIG
+from milton.utils.tools import lazy_import, warm_up
 
 log = logging.getLogger(__name__)
 
+# These are heavy, so they are imported on first use (or after startup)
+PDF_MODULES = ("pypdf", "pdf2image")
+
 
 class PDFRenderCog(commands.Cog, name="PDF renderer"):
     def __init__(self, bot: Milton) -> None:
         self.bot: Milton = bot
 
+    @Cog.listener()
+    async def on_ready(self):
+        if CONFIG.bot.warm_up:
+            try:
+                await warm_up(*PDF_MODULES)
+            except ImportError:
+                log.exception(
+                    "Cannot import the PDF libraries. PDFs will not be previewed."
+                )
+
     @Cog.listener(name="on_message")
     async def on_message(self, message: discord.Message):
         loop = get_running_loop()
@@ -28,12 +41,21 @@ class PDFRenderCog(commands.Cog, name="PDF renderer"):
         if message.attachments is None:
             return
 
-        ref = message.to_reference()
+        pdfs = [x for x in message.attachments if x.filename.lower().endswith(".pdf")]
+        if not pdfs:
+            return
 
-        for attachment in message.attachments:
-            if not attachment.filename.lower().endswith(".pdf"):
-                continue
+        try:
+            await warm_up(*PDF_MODULES)
+        except ImportError:
+            log.exception("Cannot import the PDF libraries.")
+            return
+        PdfReader = lazy_import("pypdf").PdfReader
+        convert_from_bytes = lazy_import("pdf2image").convert_from_bytes
+
+        ref = message.to_reference()
 
+        for attachment in pdfs:
             # Someone sent a pdf. Render and send a preview of it
             try:
                 async with self.bot.http_session.request(
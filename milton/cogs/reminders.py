@@ -0,0 +1,329 @@
+"""Reminders that users can set for themselves, and that survive restarts"""
+import asyncio
+import heapq
+import logging
+import time
+from typing import List, Optional, Set, Tuple
+
+import discord
+from discord import Interaction, app_commands
+from discord.ext import commands
+
+from milton.core.bot import Milton
+from milton.core.config import CONFIG
+from milton.repositories.reminders import Reminder
+from milton.utils.paginator import Paginator
+from milton.utils.tools import gather_limited, parse_duration
+
+log = logging.getLogger(__name__)
+
+# Reminders sent later than this (in seconds) say that they are late
+LATE_THRESHOLD = 60
+
+# Seconds to wait before reading the reminders again, if it failed
+RETRY_DELAY = 60
+
+
+def shorten(text: str, length: int) -> str:
+    """Cut some text down to some length, with an ellipsis if needed."""
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[: length - 1] + "…"
+
+
+class Reminders(commands.Cog, name="Reminders"):
+    """Cog that reminds users of things, when they ask for it.
+
+    The reminders are kept in the database, and only the earliest ones are
+    kept in memory, in a heap of (due, reminder_id). A single task sleeps
+    until the first of them is due, so that any number of pending reminders
+    costs the same.
+
+    The reminders are read from the database in pages, ordered by (due,
+    reminder_id). Every pending reminder up to the `_cursor` (the last one
+    read) is in the heap, or being sent. When the heap is empty and the
+    `_horizon` has passed, the next page is read, from the cursor on: the
+    reminders being sent are never read twice, however many are due.
+    """
+
+    reminders = app_commands.Group(
+        name="reminders", description="See or cancel your reminders."
+    )
+
+    def __init__(self, bot: Milton) -> None:
+        self.bot: Milton = bot
+
+        self._heap: List[Tuple[float, int]] = []
+        self._cursor: Tuple[float, int] = (0, 0)
+        """The (due, reminder_id) of the last reminder read."""
+        self._horizon: float = 0
+        """When to read the next page of reminders, once the heap is empty."""
+        self._late: Optional[List[Tuple[float, int]]] = None
+        """Reminders added while the heap is being refilled, or None."""
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._fires: Set[asyncio.Task] = set()
+
+    async def cog_load(self):
+        self._task = asyncio.create_task(self.run_timer())
+
+    def cog_unload(self):
+        if self._task:
+            self._task.cancel()
+        for task in self._fires:
+            task.cancel()
+
+    def _track(self, due: float, reminder_id: int):
+        """Start tracking a new reminder, if it comes before the cursor."""
+        if self._late is not None:
+            self._late.append((due, reminder_id))
+        elif (due, reminder_id) <= self._cursor:
+            heapq.heappush(self._heap, (due, reminder_id))
+            if self._heap[0][1] == reminder_id:
+                self._changed.set()
+
+    def _untrack(self, reminder_id: int):
+        """Stop tracking a reminder that was cancelled."""
+        self._heap = [x for x in self._heap if x[1] != reminder_id]
+        heapq.heapify(self._heap)
+        if self._late is not None:
+            self._late = [x for x in self._late if x[1] != reminder_id]
+
+    async def refill(self, now: float):
+        """Read the next page of reminders from the database."""
+        until = now + CONFIG.reminders.window
+        self._late = []
+        try:
+            rows = await self.bot.reminders.due_before(
+                until, self._cursor, CONFIG.reminders.batch_size
+            )
+        except Exception:
+            self._late = None
+            raise
+
+        if len(rows) < CONFIG.reminders.batch_size:
+            # Everything due before `until` was read. Reminder ids are
+            # positive, so nothing due right at `until` is covered.
+            self._cursor = (until, -1)
+            self._horizon = until
+        else:
+            # There might be more, from the last one on
+            self._cursor = rows[-1]
+            self._horizon = rows[-1][0]
+
+        # Only failed reminders may have been added to the heap meanwhile
+        self._heap.extend(rows)
+        heapq.heapify(self._heap)
+        known = {x[1] for x in rows}
+        late, self._late = self._late, None
+        for due, reminder_id in late:
+            if (due, reminder_id) <= self._cursor and reminder_id not in known:
+                heapq.heappush(self._heap, (due, reminder_id))
+        log.debug(
+            f"Tracking {len(self._heap)} reminders until {time.ctime(self._horizon)}"
+        )
+
+    async def run_timer(self):
+        """Send the reminders when they are due, forever."""
+        await self.bot.wait_until_ready()
+
+        while True:
+            self._changed.clear()
+            now = time.time()
+
+            if not self._heap and now >= self._horizon:
+                try:
+                    await self.refill(now)
+                except Exception:
+                    log.exception("Failed to read the reminders. Retrying later.")
+                    await asyncio.sleep(RETRY_DELAY)
+                continue
+
+            wake = self._heap[0][0] if self._heap else self._horizon
+            if wake > now:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), wake - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+            task = asyncio.create_task(self.fire(due))
+            self._fires.add(task)
+            task.add_done_callback(self._fires.discard)
+
+    async def fire(self, due: List[Tuple[float, int]]):
+        """Send some reminders, and forget them.
+
+        The reminders are removed only after they are sent, so a crash in
+        the middle might send some of them twice, but never zero times. If
+        the database fails, they are tried again after `RETRY_DELAY`.
+
+        Args:
+            due: The (due, reminder_id) of the reminders to send.
+        """
+        reminder_ids = [x[1] for x in due]
+        try:
+            reminders = await self.bot.reminders.get_many(reminder_ids)
+            results = await gather_limited(
+                (self.deliver(x) for x in reminders), CONFIG.reminders.max_concurrency
+            )
+            for reminder, result in zip(reminders, results):
+                if isinstance(result, Exception):
+                    log.error(
+                        f"Failed to send reminder {reminder.reminder_id} "
+                        f"to user {reminder.user_id}",
+                        exc_info=result,
+                    )
+            await self.bot.reminders.remove_many(reminder_ids)
+        except Exception:
+            log.exception(f"Failed to send {len(reminder_ids)} reminders")
+            # They are behind the cursor, so they will not be read again
+            retry = time.time() + RETRY_DELAY
+            for reminder_id in reminder_ids:
+                heapq.heappush(self._heap, (retry, reminder_id))
+            self._changed.set()
+
+    async def deliver(self, reminder: Reminder):
+        """Send a reminder where it was made, or to the user if that fails."""
+        content = (
+            f"<@{reminder.user_id}>, you asked me to remind you: {reminder.message}"
+        )
+        if time.time() - reminder.due > LATE_THRESHOLD:
+            content += f"\n(Sorry, I'm late! This was due <t:{int(reminder.due)}:R>.)"
+        mentions = discord.AllowedMentions(
+            everyone=False, roles=False, users=[discord.Object(reminder.user_id)]
+        )
+
+        channel = self.bot.get_channel(reminder.channel_id)
+        if channel is not None:
+            try:
+                await channel.send(content, allowed_mentions=mentions)
+                return
+            except discord.HTTPException as e:
+                log.warning(
+                    f"Cannot send reminder {reminder.reminder_id} to channel "
+                    f"{reminder.channel_id} ({e}). Sending it in DMs."
+                )
+
+        user = self.bot.get_user(reminder.user_id) or await self.bot.fetch_user(
+            reminder.user_id
+        )
+        await user.send(content, allowed_mentions=mentions)
+
+    @app_commands.command()
+    async def remind(
+        self,
+        interaction: Interaction,
+        when: str,
+        what: app_commands.Range[str, 1, 1000],
+    ):
+        """Remind you of something, after some time.
+
+        Args:
+            when: In how long, like "2h", "1d 12h" or "90 minutes".
+            what: What to remind you of.
+        """
+        try:
+            delay = parse_duration(when)
+        except ValueError:
+            await interaction.response.send_message(
+                f"Sorry, I don't understand '{when}'. Try something like '1d 2h'.",
+                ephemeral=True,
+            )
+            return
+
+        if not 0 < delay <= CONFIG.reminders.max_days * 24 * 3600:
+            await interaction.response.send_message(
+                "Sorry, I can only remind you of things up to "
+                f"{CONFIG.reminders.max_days} days from now.",
+                ephemeral=True,
+            )
+            return
+
+        user_id = interaction.user.id
+        pending = await self.bot.reminders.of_user(user_id)
+        if len(pending) >= CONFIG.reminders.max_per_user:
+            await interaction.response.send_message(
+                f"Sorry, you already have {len(pending)} pending reminders. "
+                "Cancel some with `/reminders cancel` first.",
+                ephemeral=True,
+            )
+            return
+
+        now = time.time()
+        reminder = Reminder(
+            reminder_id=interaction.id,
+            user_id=user_id,
+            guild_id=interaction.guild_id,
+            channel_id=interaction.channel_id,
+            due=now + delay,
+            created_on=now,
+            message=what,
+        )
+        await self.bot.reminders.add(reminder)
+        self._track(reminder.due, reminder.reminder_id)
+
+        log.debug(f"User {user_id} set reminder {reminder.reminder_id}")
+        await interaction.response.send_message(
+            f"Okay! I will remind you <t:{int(reminder.due)}:R>.", ephemeral=True
+        )
+
+    @reminders.command(name="list")
+    async def list_reminders(self, interaction: Interaction):
+        """List your pending reminders."""
+        pending = await self.bot.reminders.of_user(interaction.user.id)
+        if not pending:
+            await interaction.response.send_message(
+                "You have no pending reminders.", ephemeral=True
+            )
+            return
+
+        out = Paginator(title="Your reminders")
+        for reminder in pending:
+            out.add_line(f"<t:{int(reminder.due)}:R>: {shorten(reminder.message, 100)}")
+        await out.paginate(interaction)
+
+    @reminders.command(name="cancel")
+    async def cancel_reminder(self, interaction: Interaction, reminder: str):
+        """Cancel one of your pending reminders."""
+        try:
+            reminder_id = int(reminder)
+        except ValueError:
+            reminder_id = None
+
+        if reminder_id is None or not await self.bot.reminders.cancel(
+            interaction.user.id, reminder_id
+        ):
+            await interaction.response.send_message(
+                "Sorry, I can't find that reminder.", ephemeral=True
+            )
+            return
+
+        self._untrack(reminder_id)
+        await interaction.response.send_message(
+            "Done! I will not remind you of that.", ephemeral=True
+        )
+
+    @cancel_reminder.autocomplete("reminder")
+    async def reminder_autocomplete(self, interaction: Interaction, current: str):
+        current = current.lower()
+        pending = await self.bot.reminders.of_user(interaction.user.id)
+        now = time.time()
+        choices = []
+        for reminder in pending:
+            if current not in reminder.message.lower():
+                continue
+            hours = max(0, reminder.due - now) / 3600
+            name = f"in {hours:.1f}h: {reminder.message}"
+            choices.append(
+                app_commands.Choice(
+                    name=shorten(name, 100), value=str(reminder.reminder_id)
+                )
+            )
+        return choices[:25]
+
+
+async def setup(bot):
+    await bot.add_cog(Reminders(bot))
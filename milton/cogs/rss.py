@@ -1,7 +1,13 @@
 """RSS feeds parser"""
+import asyncio
+import calendar
 import html
 import logging
 import re
+import statistics
+import time
+from functools import partial
+from typing import Dict, List, Optional
 
 import discord
 import feedparser
@@ -9,16 +15,148 @@ from discord import Interaction, app_commands
 from discord.ext import commands, tasks
 
 from milton.core.bot import Milton
+from milton.core.config import CONFIG
+from milton.core.database import Statement
+from milton.core.jobs import Job, every
+from milton.core.queries import query
+from milton.repositories.feeds import Feed
+from milton.utils.metrics import timings
+from milton.utils.paginator import Paginator
+from milton.utils.tools import gather_limited
 
 log = logging.getLogger(__name__)
 
+TAG_REGEX = re.compile(r"<[^>]+>")
+
+# Maximum number of embeds that discord accepts in a single message
+EMBEDS_PER_MESSAGE = 10
+
+FEED_PARSE_TIMINGS = timings("feed_parse")
+
+# The comics in the archive, and the numbers known to have no comic
+XKCD_COMIC_NUMBERS = query(
+    "xkcd.comic_numbers",
+    "SELECT num FROM xkcd_comics UNION ALL SELECT num FROM xkcd_missing",
+)
+INSERT_XKCD_MISSING = query(
+    "xkcd.insert_missing", "INSERT OR IGNORE INTO xkcd_missing (num) VALUES (:num)"
+)
+UPSERT_XKCD_COMIC = query(
+    "xkcd.upsert_comic",
+    "INSERT INTO xkcd_comics (num, title, alt, img) "
+    "VALUES (:num, :title, :alt, :img) "
+    "ON CONFLICT (num) DO UPDATE SET "
+    "title = excluded.title, alt = excluded.alt, img = excluded.img",
+)
+GET_XKCD_COMIC = query(
+    "xkcd.get_comic",
+    "SELECT num, title, alt, img FROM xkcd_comics WHERE num = :num",
+    hot=True,
+)
+SEARCH_XKCD_COMICS = query(
+    "xkcd.search_comics",
+    "SELECT xkcd_comics.num, xkcd_comics.title, xkcd_comics.alt, "
+    "xkcd_comics.img FROM xkcd_comics_fts "
+    "JOIN xkcd_comics ON xkcd_comics.num = xkcd_comics_fts.rowid "
+    "WHERE xkcd_comics_fts MATCH :query ORDER BY rank LIMIT 10",
+    hot=True,
+)
+SET_XKCD_CHANNEL = query(
+    "xkcd.set_channel",
+    "INSERT INTO xkcd (guild_id, shout_channel) VALUES (:guild_id, :channel_id) "
+    "ON CONFLICT (guild_id) DO UPDATE SET shout_channel = :channel_id "
+    "WHERE guild_id = :guild_id",
+)
+DELETE_XKCD_CHANNEL = query(
+    "xkcd.delete_channel", "DELETE FROM xkcd WHERE guild_id = :guild_id"
+)
+# Scans the (small) xkcd table, once every few hours
+XKCD_TARGETS = query(
+    "xkcd.targets",
+    "SELECT guild_id, shout_channel FROM xkcd "
+    "WHERE last_sent_xkcd IS NOT :last_title",
+)
+SET_LAST_SENT_XKCD = query(
+    "xkcd.set_last_sent",
+    "UPDATE xkcd SET last_sent_xkcd = :last_title WHERE guild_id = :guild_id",
+    hot=True,
+)
+
+
+def truncate_feed(content: str, limit: int) -> str:
+    """Drop all but the first `limit` entries of a feed document.
+
+    The document is scanned only up to the end of the `limit`-th entry, then
+    everything up to the end of the last entry is cut out. What remains is
+    still a well-formed feed, just shorter. Feeds list their newest entries
+    first, so these are the ones that are kept.
+
+    Args:
+        content: The raw feed document.
+        limit: How many entries to keep.
+
+    Returns:
+        The truncated document, or the same document if it has no more
+        entries than the limit.
+    """
+    for closing_tag in ("</item>", "</entry>"):
+        if content.find(closing_tag) == -1:
+            continue
+
+        cut = 0
+        for _ in range(limit):
+            cut = content.find(closing_tag, cut)
+            if cut == -1:
+                return content
+            cut += len(closing_tag)
+
+        last = content.rfind(closing_tag) + len(closing_tag)
+        return content[:cut] + content[last:]
+
+    return content
+
+
+def _parse_feed(content: str, limit: int):
+    start = time.perf_counter()
+
+    size = len(content)
+    if size > CONFIG.rss.stream_threshold:
+        content = truncate_feed(content, limit)
+    parsed = feedparser.parse(content)
+    # Small feeds are not truncated, but must keep the same entries: the
+    # seen items that are not among them are forgotten.
+    parsed["entries"] = parsed.entries[:limit]
+
+    elapsed = time.perf_counter() - start
+    FEED_PARSE_TIMINGS.record(elapsed)
+    log.debug(f"Parsed a feed of {size} characters in {elapsed * 1000:.2f} ms")
+
+    return parsed
+
+
+async def parse_feed(content: str, limit: Optional[int] = None):
+    """Parse a feed with feedparser, without blocking the event loop.
+
+    The parsing happens in the default executor. Only the newest `limit`
+    entries are kept, whatever the size of the feed: large feeds are cut
+    down to them before being parsed.
+
+    Args:
+        content: The raw feed document.
+        limit: How many entries to keep at most. Defaults to the
+            `rss.max_entries` config.
+    """
+    limit = limit or CONFIG.rss.max_entries
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(_parse_feed, content, limit))
+
 
 async def get_last_xkcd(session):
     """Get the last comic from xkcd and make an embed."""
     url = "https://xkcd.com/rss.xml"
     async with session.get(url) as response:
         content = await response.text()
-        parsed = feedparser.parse(content)
+    parsed = await parse_feed(content, limit=1)
 
     title = re.search('title="(.*?)"', parsed.entries[0].description)
     img_url = re.search('src="(.*?)"', parsed.entries[0].description)
@@ -33,12 +171,228 @@ async def get_last_xkcd(session):
     return embed
 
 
+def make_xkcd_embed(num: int, title: str, alt: str, img: str) -> discord.Embed:
+    """Make an embed for a comic in the local xkcd archive."""
+    embed = discord.Embed()
+
+    embed.title = title
+    embed.description = alt
+    if img:
+        embed.set_image(url=img)
+    embed.set_footer(text=f"https://xkcd.com/{num}/")
+
+    return embed
+
+
+async def fetch_xkcd_info(session, base_url: str, num: Optional[int] = None):
+    """Fetch the JSON metadata of a comic from xkcd.
+
+    Args:
+        session: The aiohttp session to use.
+        base_url: The base URL of xkcd (or something that acts like it).
+        num: The number of the comic. If None, fetches the latest comic.
+
+    Returns:
+        The parsed JSON, or None if there is no such comic.
+    """
+    url = f"{base_url}/info.0.json" if num is None else f"{base_url}/{num}/info.0.json"
+    async with session.get(url) as response:
+        if response.status == 404:
+            return None
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+async def sync_xkcd_archive(db, session, base_url: str, concurrency: int = 8) -> int:
+    """Add the comics that are missing to the local xkcd archive.
+
+    Only the comics that are not already in the archive are fetched, so this
+    is cheap to run often. Numbers that have no comic (xkcd answers 404) are
+    remembered, and not fetched again.
+
+    Args:
+        db: The database with the `xkcd_comics` table.
+        session: The aiohttp session to use.
+        base_url: The base URL of xkcd (or something that acts like it).
+        concurrency: How many comics to fetch at once.
+
+    Returns:
+        The number of comics that were added.
+    """
+    latest = await fetch_xkcd_info(session, base_url)
+    if latest is None:
+        log.warning("Could not find the latest xkcd comic to sync the archive.")
+        return 0
+
+    async with db.read(XKCD_COMIC_NUMBERS) as cursor:
+        have = {row[0] async for row in cursor}
+
+    missing = [x for x in range(1, latest["num"] + 1) if x not in have]
+    if not missing:
+        return 0
+
+    log.info(f"Adding {len(missing)} comic(s) to the xkcd archive...")
+    added = 0
+    # Save the comics in chunks, so an interrupted sync does not start over
+    for i in range(0, len(missing), 100):
+        chunk = missing[i : i + 100]
+        results = await gather_limited(
+            (fetch_xkcd_info(session, base_url, x) for x in chunk), concurrency
+        )
+
+        rows = []
+        gone = []
+        for num, result in zip(chunk, results):
+            if isinstance(result, Exception):
+                log.debug(f"Could not fetch xkcd {num}: {result}")
+                continue
+            if result is None:
+                log.debug(f"There is no xkcd {num}, not asking for it again.")
+                gone.append((num,))
+                continue
+            rows.append(
+                (
+                    result["num"],
+                    result.get("safe_title") or result.get("title", ""),
+                    result.get("alt"),
+                    result.get("img"),
+                )
+            )
+
+        await db.transaction(
+            Statement(UPSERT_XKCD_COMIC, rows, many=True),
+            Statement(INSERT_XKCD_MISSING, gone, many=True),
+        )
+        added += len(rows)
+
+    log.info(f"Added {added} comic(s) to the xkcd archive.")
+    return added
+
+
+def fts_query(text: str) -> str:
+    """Make some free text safe to use in a full-text MATCH query.
+
+    Each word is quoted, so that FTS5 operators in the text are not parsed.
+    """
+    return " ".join('"' + x.replace('"', '""') + '"' for x in text.split())
+
+
+def entry_id(entry) -> str:
+    """Get a stable identifier for a feed entry.
+
+    Not all feeds set a proper `id` (or `guid`), so fall back to the link and
+    then to the title.
+    """
+    return entry.get("id") or entry.get("link") or entry.get("title", "")
+
+
+def entry_timestamp(entry) -> Optional[float]:
+    """Get the UNIX timestamp of when an entry was published, if known."""
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    if parsed is None:
+        return None
+    return calendar.timegm(parsed)
+
+
+def estimate_poll_interval(entries, current: int, had_new: bool) -> int:
+    """Estimate how often a feed should be polled.
+
+    If the entries carry publication dates, the median gap between the latest
+    ones is used: polling twice per expected update is plenty. If they do not,
+    the current interval is halved when something new showed up and slowly
+    increased when nothing did.
+
+    Args:
+        entries: The parsed entries of the feed.
+        current: The current polling interval, in seconds.
+        had_new: If this poll found new entries.
+
+    Returns:
+        The new polling interval, in seconds, clamped to the configured limits.
+    """
+    stamps = sorted(
+        (x for x in map(entry_timestamp, entries) if x is not None), reverse=True
+    )[:10]
+    gaps = [a - b for a, b in zip(stamps, stamps[1:]) if a > b]
+
+    if gaps:
+        interval = statistics.median(gaps) / 2
+    elif had_new:
+        interval = current / 2
+    else:
+        interval = current * 1.5
+
+    return int(
+        min(max(interval, CONFIG.rss.min_poll_interval), CONFIG.rss.max_poll_interval)
+    )
+
+
+def make_feed_embed(feed_title: Optional[str], entry) -> discord.Embed:
+    """Make a generic embed for an entry of a feed."""
+    embed = discord.Embed()
+
+    embed.title = html.unescape(entry.get("title", "Untitled"))[:256]
+    if link := entry.get("link"):
+        embed.url = link
+
+    summary = TAG_REGEX.sub("", entry.get("summary", ""))
+    summary = html.unescape(summary).strip()
+    if len(summary) > 500:
+        summary = summary[:500] + "..."
+    embed.description = summary or None
+
+    if feed_title:
+        embed.set_footer(text=feed_title[:2048])
+
+    return embed
+
+
+async def fetch_feed(
+    session, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+):
+    """Fetch a feed, using a conditional request if possible.
+
+    Returns:
+        A tuple with the response status, the content of the feed (None if
+        it was not modified), and the new etag and last-modified headers.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304:
+            return response.status, None, etag, last_modified
+        content = await response.text()
+        return (
+            response.status,
+            content,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+
 @app_commands.guild_only
 class RSSCog(commands.GroupCog, name="xkcd"):
     def __init__(self, bot) -> None:
         self.bot: Milton = bot
 
-        self.check_xkcd_task.start()
+    async def cog_load(self):
+        # New installs check right away, restarts keep the schedule
+        interval = every(CONFIG.xkcd.check_interval * 3600)
+        for name, func in (
+            ("xkcd.check", self.check_xkcd),
+            ("xkcd.sync_archive", self.sync_archive),
+        ):
+            self.bot.jobs.add(
+                Job(name, func, interval, jitter=CONFIG.xkcd.jitter, start_now=True)
+            )
+
+    def cog_unload(self):
+        self.bot.jobs.remove("xkcd.check")
+        self.bot.jobs.remove("xkcd.sync_archive")
 
     @app_commands.command()
     async def latest(self, interaction: Interaction):
@@ -46,6 +400,48 @@ class RSSCog(commands.GroupCog, name="xkcd"):
         embed = await get_last_xkcd(self.bot.http_session)
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command()
+    async def get(self, interaction: Interaction, number: app_commands.Range[int, 1]):
+        """Send an XKCD issue, given its number."""
+        async with self.bot.db.read(GET_XKCD_COMIC, (number,)) as cursor:
+            row = await cursor.fetchone()
+
+        if row is None:
+            await interaction.response.send_message(
+                f"I don't know about xkcd {number} (yet).", ephemeral=True
+            )
+            return
+
+        await interaction.response.send_message(embed=make_xkcd_embed(*row))
+
+    @app_commands.command()
+    async def search(self, interaction: Interaction, query: str):
+        """Search XKCD issues by their title and alt text."""
+        query = fts_query(query)
+        if not query:
+            await interaction.response.send_message(
+                "What should I search for?", ephemeral=True
+            )
+            return
+
+        async with self.bot.db.read(SEARCH_XKCD_COMICS, (query,)) as cursor:
+            rows = await cursor.fetchall()
+
+        if not rows:
+            await interaction.response.send_message(
+                "I found no xkcd issue matching that.", ephemeral=True
+            )
+            return
+
+        if len(rows) == 1:
+            await interaction.response.send_message(embed=make_xkcd_embed(*rows[0]))
+            return
+
+        out = Paginator(force_embed=True, title="Here is what I found")
+        for num, title, *_ in rows:
+            out.add_line(f"[{num}: {title}](https://xkcd.com/{num}/)")
+        await out.paginate(interaction)
+
     @app_commands.command()
     @app_commands.checks.has_permissions(administrator=True)
     async def here(self, interaction: Interaction):
@@ -54,15 +450,7 @@ class RSSCog(commands.GroupCog, name="xkcd"):
         channel_id = interaction.channel_id
 
         log.info(f"Updating xkcd shout channel for guild {guild_id} to {channel_id}")
-        await self.bot.db.execute(
-            (
-                "INSERT INTO xkcd (guild_id, shout_channel) VALUES (:guild_id, :channel_id) "
-                "ON CONFLICT (guild_id) DO UPDATE SET shout_channel = :channel_id "
-                "WHERE guild_id = :guild_id"
-            ),
-            (guild_id, channel_id),
-        )
-        await self.bot.db.commit()
+        await self.bot.db.write(SET_XKCD_CHANNEL, (guild_id, channel_id))
 
         await interaction.response.send_message(
             "I will send the xkcd issues here from now on!"
@@ -75,51 +463,354 @@ class RSSCog(commands.GroupCog, name="xkcd"):
         guild_id = interaction.guild_id
 
         log.info(f"Removing xkcd shout channel for guild {guild_id}")
-        await self.bot.db.execute(
-            ("DELETE FROM xkcd WHERE guild_id = :guild_id"), (guild_id,)
-        )
-        await self.bot.db.commit()
+        await self.bot.db.write(DELETE_XKCD_CHANNEL, (guild_id,))
 
         await interaction.response.send_message("I won't send the xkcd issues anymore.")
 
-    @tasks.loop(hours=8)
-    async def check_xkcd_task(self):
-        """Task that checks for new comics"""
+    async def check_xkcd(self, due: float):
+        """Job that checks for new comics"""
         log.info("Checking for new xkcd issues...")
         embed = await get_last_xkcd(self.bot.http_session)
 
-        async with self.bot.db.execute(
-            "SELECT last_sent_xkcd, shout_channel FROM xkcd"
-        ) as cursor:
-            async for row in cursor:
-                last_title, shout_channel = row
+        # Every guild keeps track of the last comic it actually got
+        async with self.bot.db.read(XKCD_TARGETS, (embed.title,)) as cursor:
+            targets = await cursor.fetchall()
 
-                if embed.title == last_title:
-                    log.info("No need to send an update")
-                    return
+        if not targets:
+            log.info("No need to send an update")
+            return
 
-                channel = self.bot.get_channel(shout_channel)
+        start = time.perf_counter()
+        results = await gather_limited(
+            (
+                self.send_xkcd(guild_id, channel_id, embed)
+                for guild_id, channel_id in targets
+            ),
+            CONFIG.rss.max_concurrency,
+        )
+        done = [
+            guild_id
+            for (guild_id, _), result in zip(targets, results)
+            if result is True
+        ]
 
-                if not channel:
-                    log.warning(
-                        f"Couldn't find the channel to send the xkcd message to ({shout_channel})."
-                    )
-                    return
+        # Guilds that did not get it (but could) will be tried again later
+        await self.bot.db.write_many(
+            SET_LAST_SENT_XKCD, [(embed.title, guild_id) for guild_id in done]
+        )
+
+        log.info(
+            f"Done with xkcd '{embed.title}' in {len(done)}/{len(targets)} guild(s) "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+    async def sync_archive(self, due: float):
+        """Job that adds new comics to the local xkcd archive"""
+        await sync_xkcd_archive(
+            self.bot.db,
+            self.bot.http_session,
+            CONFIG.xkcd.base_url,
+            CONFIG.xkcd.sync_concurrency,
+        )
 
+    async def send_xkcd(
+        self, guild_id: int, channel_id: int, embed: discord.Embed
+    ) -> bool:
+        """Send the xkcd embed to a channel, retrying if discord hiccups.
+
+        If the channel does not exist anymore, it is removed for the guild.
+
+        Args:
+            guild_id: The id of the guild of the channel.
+            channel_id: The id of the channel.
+            embed: The xkcd embed to send.
+
+        Returns:
+            True if the guild is done with this comic: the message was sent,
+            or it can never be. False if it should be tried again later.
+        """
+        channel = self.bot.get_channel(channel_id)
+
+        for attempt in range(CONFIG.rss.send_attempts):
+            if attempt:
+                await asyncio.sleep(2**attempt)
+            try:
+                if channel is None:
+                    channel = await self.bot.fetch_channel(channel_id)
                 await channel.send(embed=embed)
+                return True
+            except discord.NotFound:
+                log.warning(
+                    f"The xkcd channel {channel_id} of guild {guild_id} is gone. "
+                    "Removing it."
+                )
+                await self.bot.db.write(DELETE_XKCD_CHANNEL, (guild_id,))
+                return True
+            except discord.Forbidden as e:
+                # Retrying would not help: skip this comic, and try the next one
+                log.warning(
+                    f"Couldn't send the xkcd message to channel {channel_id}: {e}"
+                )
+                return True
+            except (discord.HTTPException, asyncio.TimeoutError) as e:
+                log.debug(
+                    f"Failed to send xkcd to {channel_id} (attempt {attempt}): {e}"
+                )
+
+        log.error(f"Gave up sending the xkcd message to channel {channel_id}.")
+        return False
+
+
+@app_commands.guild_only
+class FeedCog(commands.GroupCog, name="feed"):
+    """Subscribe channels to generic RSS or Atom feeds.
+
+    Every feed is stored (and fetched) once, no matter how many channels are
+    subscribed to it. Each feed is polled on its own schedule, based on how
+    often it seems to be updated.
+    """
+
+    def __init__(self, bot: Milton) -> None:
+        self.bot: Milton = bot
+
+        self.poll_feeds_task.start()
+
+    def cog_unload(self):
+        self.poll_feeds_task.stop()
+
+    @app_commands.command()
+    @app_commands.checks.has_permissions(administrator=True)
+    async def subscribe(self, interaction: Interaction, url: str):
+        """Send new items of an RSS or Atom feed in this channel."""
+        await interaction.response.defer(thinking=True)
+
+        try:
+            status, content, etag, last_modified = await fetch_feed(
+                self.bot.http_session, url
+            )
+        except Exception as e:
+            log.debug(f"Failed to fetch feed {url}: {e}")
+            status, content = None, None
+
+        if status != 200 or not content:
+            await interaction.followup.send("Sorry, I could not reach that feed.")
+            return
+
+        parsed = await parse_feed(content)
+        if not parsed.entries and parsed.bozo:
+            await interaction.followup.send("Sorry, that does not look like a feed.")
+            return
 
-        last_title = embed.title
-        # Update all rows with the new xkcd.
-        # I mean, it might not have been sent, but who cares...
-        await self.bot.db.execute(
-            "UPDATE xkcd SET last_sent_xkcd = :last_title", (last_title,)
+        now = time.time()
+        title = parsed.feed.get("title") or url
+        interval = estimate_poll_interval(
+            parsed.entries, CONFIG.rss.max_poll_interval, had_new=False
         )
-        await self.bot.db.commit()
 
-    @check_xkcd_task.before_loop
+        log.info(f"Subscribing channel {interaction.channel_id} to feed {url}")
+        await self.bot.feeds.subscribe(
+            url,
+            interaction.guild_id,
+            interaction.channel_id,
+            title,
+            interval,
+            now,
+            etag,
+            last_modified,
+            # What is in the feed now is old news: do not send it.
+            seen=[entry_id(x) for x in parsed.entries],
+        )
+
+        await interaction.followup.send(
+            f"I will send new items from **{title}** here from now on!"
+        )
+
+    @app_commands.command()
+    @app_commands.checks.has_permissions(administrator=True)
+    async def unsubscribe(self, interaction: Interaction, url: str):
+        """Stop sending the items of a feed in this channel."""
+        feed_id = await self.bot.feeds.feed_id(url)
+        if feed_id is None:
+            await interaction.response.send_message(
+                "This channel is not subscribed to that feed.", ephemeral=True
+            )
+            return
+
+        if not await self.bot.feeds.unsubscribe(feed_id, interaction.channel_id):
+            await interaction.response.send_message(
+                "This channel is not subscribed to that feed.", ephemeral=True
+            )
+            return
+        log.info(f"Unsubscribed channel {interaction.channel_id} from feed {url}")
+
+        await interaction.response.send_message(
+            "I won't send the items of that feed here anymore."
+        )
+
+    @app_commands.command(name="list")
+    async def list_feeds(self, interaction: Interaction):
+        """List the feeds that this server is subscribed to."""
+        out = Paginator(
+            force_embed=True,
+            title=f"Feeds followed in **{interaction.guild.name}**",
+        )
+
+        feeds = await self.bot.feeds.of_guild(interaction.guild_id)
+        for title, url, channel_id in feeds:
+            out.add_line(f"<#{channel_id}> - [{title}]({url})")
+
+        if not feeds:
+            await interaction.response.send_message(
+                "This server is not following any feed."
+            )
+            return
+
+        await out.paginate(interaction)
+
+    @tasks.loop(minutes=1)
+    async def poll_feeds_task(self):
+        """Task that polls the feeds that are due."""
+        due = await self.bot.feeds.due(time.time())
+        if not due:
+            return
+
+        log.debug(f"Polling {len(due)} feed(s)...")
+        results = await gather_limited(
+            (self.poll_feed(x) for x in due), CONFIG.rss.max_concurrency
+        )
+
+        for feed, result in zip(due, results):
+            if isinstance(result, Exception):
+                log.error(f"Failed to poll feed {feed.url}", exc_info=result)
+
+    @poll_feeds_task.before_loop
     async def before_task(self):
         await self.bot.wait_until_ready()
 
+    async def poll_feed(self, feed: Feed):
+        """Fetch a feed once and send its new items to all subscribed channels."""
+        now = time.time()
+        entries = []
+        new_entries = []
+        unsent = None
+        title, etag, last_modified = feed.title, feed.etag, feed.last_modified
+
+        # The items to send again are needed, even if the feed did not change
+        retries = await self.bot.feeds.unsent(feed.feed_id)
+        conditional = (None, None) if retries else (etag, last_modified)
+
+        try:
+            status, content, etag, last_modified = await fetch_feed(
+                self.bot.http_session, feed.url, *conditional
+            )
+        except Exception as e:
+            log.warning(f"Could not fetch feed {feed.url}: {e}")
+            status, content = None, None
+
+        if status == 200 and content:
+            parsed = await parse_feed(content)
+            entries = parsed.entries
+            title = parsed.feed.get("title") or title
+
+            seen = await self.bot.feeds.seen(feed.feed_id)
+
+            # Feeds usually list the newest items first
+            new_entries = [x for x in reversed(entries) if entry_id(x) not in seen]
+            unsent = {}
+
+            if new_entries:
+                log.info(f"Found {len(new_entries)} new item(s) in feed {feed.url}")
+            if new_entries or retries:
+                new_ids = {entry_id(x) for x in new_entries}
+                pending = {
+                    channel_id: [
+                        x
+                        for x in reversed(entries)
+                        if entry_id(x) in new_ids
+                        or entry_id(x) in retries.get(channel_id, ())
+                    ]
+                    for channel_id in await self.bot.feeds.channels(feed.feed_id)
+                }
+                unsent = await self.deliver(feed.feed_id, title, pending)
+
+        interval = estimate_poll_interval(
+            entries, feed.poll_interval, bool(new_entries)
+        )
+        await self.bot.feeds.record_poll(
+            feed._replace(
+                title=title,
+                poll_interval=interval,
+                etag=etag,
+                last_modified=last_modified,
+            ),
+            now,
+            [entry_id(x) for x in new_entries],
+            [entry_id(x) for x in entries],
+            unsent,
+        )
+
+    async def deliver(
+        self, feed_id: int, title: Optional[str], entries: Dict[int, list]
+    ) -> Dict[int, List[str]]:
+        """Send some entries of a feed to the channels subscribed to it.
+
+        Channels that were deleted are unsubscribed from the feed.
+
+        Args:
+            feed_id: The id of the feed.
+            title: The title of the feed.
+            entries: The entries to send to each channel (the oldest first),
+                by channel id.
+
+        Returns:
+            The ids of the entries that could not be sent, by channel id. They
+            should be sent again later.
+        """
+
+        async def send_to(channel_id: int, items: list) -> int:
+            """Send some entries to a channel, returning how many were sent."""
+            sent = 0
+            channel = self.bot.get_channel(channel_id)
+            try:
+                if channel is None:
+                    channel = await self.bot.fetch_channel(channel_id)
+                for i in range(0, len(items), EMBEDS_PER_MESSAGE):
+                    chunk = items[i : i + EMBEDS_PER_MESSAGE]
+                    await channel.send(
+                        embeds=[make_feed_embed(title, x) for x in chunk]
+                    )
+                    sent += len(chunk)
+            except discord.NotFound:
+                log.info(
+                    f"Channel {channel_id} is gone, "
+                    f"unsubscribing it from feed {feed_id}."
+                )
+                await self.bot.feeds.unsubscribe(feed_id, channel_id)
+                return len(items)
+            except discord.HTTPException as e:
+                log.warning(
+                    f"Failed to send feed items to channel {channel_id} ({e}). "
+                    "Trying again on the next poll."
+                )
+            return sent
+
+        channel_ids = [x for x in entries if entries[x]]
+        results = await gather_limited(
+            (send_to(x, entries[x]) for x in channel_ids), CONFIG.rss.max_concurrency
+        )
+        unsent = {}
+        for channel_id, result in zip(channel_ids, results):
+            if isinstance(result, Exception):
+                log.error(
+                    f"Failed to send feed items to channel {channel_id}",
+                    exc_info=result,
+                )
+                result = 0
+            if items := entries[channel_id][result:]:
+                unsent[channel_id] = [entry_id(x) for x in items]
+        return unsent
+
 
 async def setup(bot: Milton):
     await bot.add_cog(RSSCog(bot))
+    await bot.add_cog(FeedCog(bot))
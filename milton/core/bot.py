@@ -1,12 +1,13 @@
+import hashlib
+import json
 import logging
 import sys
 import time
 from importlib import resources
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, List, Mapping, Optional
 
 import aiohttp
-import aiosqlite
 import discord
 from box import Box
 from discord.abc import PrivateChannel
@@ -16,6 +17,22 @@ from discord.ext.commands.errors import ExtensionNotFound
 
 import milton
 from milton.core.config import CONFIG
+from milton.core.database import Database
+from milton.core.guild_settings import GuildSettingsCache
+from milton.core.jobs import JobScheduler
+from milton.core.members import MemberResolver
+from milton.core.migrations import Migration, find_migrations, migrate
+from milton.core.queries import check_query_plans
+from milton.repositories import (
+    BirthdayRepository,
+    FeedRepository,
+    ReminderRepository,
+    SqliteBirthdayRepository,
+    SqliteFeedRepository,
+    SqliteGuildSettingsRepository,
+    SqliteReminderRepository,
+)
+from milton.utils.startup import TIMELINE
 
 log = logging.getLogger(__name__)
 
@@ -46,7 +63,13 @@ class Milton(commands.Bot):
     Attributes:
         started_on: The ISO timestamp when the bot instance was initiated.
         owner_id: The id snowflake for the owner of the bot.
-        db: The aiosqlite connection to the milton DB.
+        db: The connections to the milton DB.
+        birthdays: Where the birthdays of the users are kept.
+        feeds: Where the feeds and their subscriptions are kept.
+        reminders: Where the pending reminders are kept.
+        guild_settings: The cached settings of each guild.
+        jobs: The jobs that run on a schedule.
+        members: Finds the members of guilds on demand.
         http_session: An aiohttp session that can be used to make HTTP requests.
         changelog: The changelog object of the bot.
         version: The version of the bot.
@@ -64,110 +87,165 @@ class Milton(commands.Bot):
         """An aiohttp.ClientSession or None if it has not been initialized yet."""
         self.version: str = milton.__version__
         """The bot's version string"""
+        self.jobs: JobScheduler = JobScheduler()
+        """The jobs that run on a schedule. Cogs can add theirs at any time."""
+        self.members: MemberResolver = MemberResolver(
+            self.intents.members,
+            ttl=CONFIG.members.cache_ttl,
+            max_size=CONFIG.members.cache_size,
+        )
+        """Finds members on demand, as they are not all kept in memory."""
 
     async def setup_hook(self):
+        TIMELINE.mark("log in")
+
         # Add AIOHTTP session
         self.http_session = aiohttp.ClientSession()
 
         # Add cogs and extensions to be loaded
         log.debug("Loading default extensions")
 
-        essentials = ["cli", "error_handler", "debug"]
-
-        # Essential extensions
-        for cog in essentials:
-            try:
-                await self.load_extension(f"milton.core.{cog}")
-            except ExtensionNotFound as e:
-                log.exception(e)
-                continue
-
-        for cog in CONFIG.bot.startup_extensions:
-            try:
-                await self.load_extension(f"milton.cogs.{cog}")
-            except ExtensionNotFound as e:
-                log.error(f"Cannot find startup cog {cog}. Continuing.")
-                continue
-
-        # Send the slash commands to discord for syncing.
-        # This should not be called too many times but it's good here.
-        await self.tree.sync()
+        essentials = ["cli", "error_handler", "debug", "maintenance"]
+
+        with TIMELINE.phase("load extensions"):
+            # Essential extensions
+            for cog in essentials:
+                try:
+                    with TIMELINE.phase(f"milton.core.{cog}"):
+                        await self.load_extension(f"milton.core.{cog}")
+                except ExtensionNotFound as e:
+                    log.exception(e)
+                    continue
+
+            for cog in CONFIG.bot.startup_extensions:
+                try:
+                    with TIMELINE.phase(f"milton.cogs.{cog}"):
+                        await self.load_extension(f"milton.cogs.{cog}")
+                except ExtensionNotFound as e:
+                    log.error(f"Cannot find startup cog {cog}. Continuing.")
+                    continue
+
+        # Send the slash commands to discord, if they changed since last time
+        try:
+            with TIMELINE.phase("sync app commands"):
+                await self.sync_commands()
+        except discord.HTTPException:
+            log.exception("Failed to sync the app commands. Continuing.")
 
         db_path = Path(CONFIG.database.path).expanduser().absolute()
-        # If the DB is not there, we need to initialize it
-        initialize_db = not db_path.exists()
 
-        self.db: aiosqlite.Connection = await aiosqlite.connect(db_path)
-
-        await self.migrate(initialize_db)
+        self.db: Database = Database(
+            db_path,
+            read_connections=CONFIG.database.read_connections,
+            cache_size=CONFIG.database.cache_size,
+            mmap_size=CONFIG.database.mmap_size,
+            commit_interval=CONFIG.database.commit_interval,
+            commit_batch_size=CONFIG.database.commit_batch_size,
+            slow_query_threshold=CONFIG.database.slow_query_threshold,
+        )
+        with TIMELINE.phase("connect to the database"):
+            await self.db.connect()
+
+        with TIMELINE.phase("migrate the database"):
+            await self.migrate()
+
+        if CONFIG.database.check_query_plans:
+            # The extensions registered their queries when they were loaded
+            with TIMELINE.phase("check query plans"):
+                await check_query_plans(self.db, strict=True)
+
+        self.birthdays: BirthdayRepository = SqliteBirthdayRepository(self.db)
+        self.feeds: FeedRepository = SqliteFeedRepository(self.db)
+        self.reminders: ReminderRepository = SqliteReminderRepository(self.db)
+        self.guild_settings: GuildSettingsCache = GuildSettingsCache(
+            SqliteGuildSettingsRepository(self.db)
+        )
+        with TIMELINE.phase("load guild settings"):
+            await self.guild_settings.load()
+
+        # Jobs that missed a run while offline catch up once ready
+        self.jobs.start(self.db, ready=self.wait_until_ready)
 
     async def on_ready(self):
         log.info(f"Logged in as {self.user}. Milton is Ready!")
 
-    async def migrate(self, initialize=False):
+        # This is called again on reconnections, but only the first one counts
+        if not TIMELINE.done:
+            TIMELINE.finish("connect to the gateway")
+            log.info(TIMELINE.report())
+
+    async def migrate(self, dry_run: bool = False) -> List[Migration]:
         """Apply migrations to the database from one version to another
 
         The bot's database needs a way to be migrated between versions.
         This is it - migrations in the schemas folder are applied to the
         database, in order, to get from some old version to the latest.
 
-        The database version is stored in the database itself.
-
-        What migrations to apply and the order to apply them are sourced from
-        the migrations.txt file.
+        Every migration is applied in its own transaction, and the database
+        remembers which migrations (and what version of them) were applied.
 
         See the README.md file in the `schemas` folder for more information.
+
+        Args:
+            dry_run: If True, do not apply anything, just find what would be.
+
+        Returns:
+            The migrations that were (or would be) applied.
         """
         migrations_path = self.path_to_myself / "schemas"
         log.info(f"Looking into {migrations_path} for migrations...")
-        migrations = list(migrations_path.iterdir())
-        log.info(f"Raw migrations found: {migrations}")
-        migrations.remove([x for x in migrations if x.name == "__init__.py"][0])
-        # Remove non-sql files
-        migrations = [x for x in migrations if x.suffix == ".sql"]
-        migrations.sort(key=lambda x: x.stem)
+        migrations = find_migrations(migrations_path)
 
         assert migrations, "No migrations found. Something has gone terribly wrong."
 
-        if initialize:
-            log.info("Initializing new empty DB.")
-            initial_script = migrations[0]
-
-            await self.db.executescript(initial_script.read_text())
-            await self.db.execute(
-                "UPDATE version SET version = :version",
-                {"version": int(migrations[0].stem)},
-            )
-            log.info("DB initialized.")
-
-        async with self.db.execute("SELECT version FROM version") as cursor:
-            db_version = await cursor.fetchone()
-            db_version = db_version[0]
-
-        latest_version = int(migrations[-1].stem)
-        if db_version == latest_version:
-            log.info("No migrations to apply.")
-            return
-        elif db_version > latest_version:
-            log.info(
-                f"The DB is in the future! db: {db_version}, migration: {latest_version}"
-            )
-
-        log.info("Found migrations to apply.")
-        # This is a bit fragile...
-        migration_stems = [x.stem for x in migrations]
-        to_apply = migrations[migration_stems.index(f"{db_version}") + 1 :]
-        log.info(f"Applying {len(to_apply)} migration(s).")
-        for migration in to_apply:
-            log.debug(f"Applying migration {migration}...")
-            await self.db.executescript(migration.read_text())
-            await self.db.execute(
-                "UPDATE version SET version = :version",
-                {"version": int(migration.stem)},
-            )
-            await self.db.commit()
-
-        log.info("Done migrating database to new schema.")
+        return await migrate(self.db, migrations, dry_run=dry_run)
+
+    async def sync_commands(self, force: bool = False) -> bool:
+        """Sync the app commands with Discord, only if they changed.
+
+        Syncing is slow and rate limited, so the hash of the synced commands
+        is saved (to `bot.sync_hash_path`), and the commands are synced again
+        only when their hash changes.
+
+        In development mode, the commands are synced only to the test
+        server, where they show up right away.
+
+        Args:
+            force: Sync even if the commands did not change.
+
+        Returns:
+            True if the commands were synced.
+        """
+        guild = None
+        if CONFIG.bot.development:
+            if CONFIG.bot.test_server_id is None:
+                log.error("Cannot sync the app commands without a test_server_id.")
+                return False
+            guild = discord.Object(CONFIG.bot.test_server_id)
+            self.tree.copy_global_to(guild=guild)
+
+        target = f"guild:{guild.id}" if guild else "global"
+        digest = command_tree_hash(self.tree, guild)
+
+        hash_path = Path(CONFIG.bot.sync_hash_path).expanduser()
+        try:
+            hashes = json.loads(hash_path.read_text())
+        except (OSError, ValueError):
+            hashes = {}
+
+        if not force and hashes.get(target) == digest:
+            log.info(f"The app commands did not change. Not syncing them ({target}).")
+            return False
+
+        log.info(f"Syncing the app commands ({target})...")
+        start = time.perf_counter()
+        await self.tree.sync(guild=guild)
+        log.info(f"Synced the app commands in {time.perf_counter() - start:.2f}s.")
+
+        hashes[target] = digest
+        hash_path.parent.mkdir(parents=True, exist_ok=True)
+        hash_path.write_text(json.dumps(hashes, indent=2))
+        return True
 
     async def add_cog(self, cog: commands.Cog):
         await super().add_cog(cog)
@@ -195,6 +273,8 @@ class Milton(commands.Bot):
             log.info("Closing AIOHTTP session...")
             await self.http_session.close()
 
+        self.jobs.stop()
+
         log.info("Closing database connection...")
         await self.db.close()
 
@@ -210,6 +290,44 @@ class Milton(commands.Bot):
         log.exception("Ignoring exception at the bot level", exc_info=info)
 
 
+def command_tree_hash(
+    tree: discord.app_commands.CommandTree, guild: Optional[discord.abc.Snowflake]
+) -> str:
+    """Hash the app commands of a tree, as they would be sent to Discord.
+
+    Args:
+        tree: The command tree.
+        guild: The guild to hash the commands of, or None for the global ones.
+
+    Returns:
+        The hex digest of the commands.
+    """
+    payload = [x.to_dict(tree) for x in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda x: (x["type"], x["name"]))
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def make_intents(config: Mapping[str, bool]) -> discord.Intents:
+    """Make the gateway intents of the bot, from the config.
+
+    Args:
+        config: The intents to turn on (or off), on top of the default ones.
+
+    Returns:
+        The intents.
+
+    Raises:
+        `ValueError` if some intent does not exist.
+    """
+    intents = discord.Intents.default()
+    for name, value in config.items():
+        if name not in discord.Intents.VALID_FLAGS:
+            raise ValueError(f"Unknown intent {name!r} in the config")
+        setattr(intents, name, value)
+    return intents
+
+
 async def _get_prefix(bot: Milton, message: discord.Message) -> Callable:
     """Returns the function to correctly get the prefix based on context.
 
@@ -227,16 +345,17 @@ async def _get_prefix(bot: Milton, message: discord.Message) -> Callable:
 
 def run_bot():
     """Instantiate the Milton class and run the bot"""
+    TIMELINE.mark("import the bot")
     log.debug("Making the Milton Bot instance")
 
-    intents = discord.Intents.all()
-
     milton = Milton(
         config=CONFIG,
         command_prefix=_get_prefix,
         activity=discord.Game(name="with " + CONFIG.prefixes.guild + "help"),
         case_insensitive=True,
-        intents=intents,
+        intents=make_intents(CONFIG.bot.intents),
+        member_cache_flags=discord.MemberCacheFlags(**CONFIG.bot.member_cache),
+        chunk_guilds_at_startup=CONFIG.bot.chunk_guilds_at_startup,
     )
 
     # Run the client
@@ -1,5 +1,6 @@
 """Provide a cli for additional control"""
 import logging
+import time
 from inspect import cleandoc
 from typing import Coroutine, Mapping, Optional
 import asyncio
@@ -17,6 +18,10 @@ from prompt_toolkit.patch_stdout import patch_stdout
 from tabulate import tabulate
 
 from milton.core.bot import Milton
+from milton.core.migrations import applied_migrations, find_migrations
+from milton.core.queries import check_query_plans, full_scans
+from milton.utils import metrics
+from milton.utils.startup import SUMMARY_HEADERS, TIMELINE
 from milton.utils.tools import glob_word, initialize_empty
 
 log = logging.getLogger(__name__)
@@ -208,20 +213,132 @@ async def setup(bot):
 
     @interface.add_option
     async def sync():
-        """Sync all app commands with Discord"""
+        """Sync all app commands with Discord, even if they did not change"""
         print("Syncing all app commands...")
         try:
-            await interface.bot.tree.sync()
+            await interface.bot.sync_commands(force=True)
         except Exception as e:
             print("Sync failed: {}", e)
 
+    @interface.add_option
+    async def startup():
+        """Show what the bot did while starting up, and how long it took"""
+        print(
+            tabulate(
+                TIMELINE.summary(),
+                headers=SUMMARY_HEADERS,
+                disable_numparse=True,
+                colalign=("left", "right", "right"),
+            )
+        )
+        if TIMELINE.done:
+            print(f"Started up in {TIMELINE.total:.2f}s.")
+        else:
+            print("Still starting up.")
+
+    @interface.add_option
+    async def timings():
+        """Show how long some operations (like parsing feeds) have taken"""
+        if not metrics.REGISTRY:
+            print("Nothing was timed yet.")
+            return
+        print(
+            tabulate(
+                [x.summary() for x in metrics.REGISTRY.values()],
+                headers=metrics.SUMMARY_HEADERS,
+                tablefmt="grid",
+            )
+        )
+
+    @interface.add_option
+    async def queryplans():
+        """Show the query plans of all known SQL statements, flagging hot ones that scan whole tables"""
+        plans = await check_query_plans(interface.bot.db)
+        for registered, plan in sorted(plans.items()):
+            flag = " [FULL SCAN]" if registered.hot and full_scans(plan) else ""
+            print(f"{registered.name}{' (hot)' if registered.hot else ''}{flag}")
+            for step in plan:
+                print(f"\t{step}")
+
+    @interface.add_option
+    async def backup():
+        """Take a backup of the database now"""
+        target, size = await interface.bot.get_cog("maintenance").backup()
+        print(f"Saved a backup of the database ({size} bytes) to {target}")
+
+    @interface.add_option
+    async def maintain():
+        """Optimize and vacuum the database now, instead of in the quiet hours"""
+        await interface.bot.get_cog("maintenance").maintain()
+        print("Done. See the logs for the details.")
+
+    @interface.add_option
+    async def vacuum():
+        """Rebuild the database once, so that it can be vacuumed in the quiet hours. Writes wait until it is done"""
+        await interface.bot.get_cog("maintenance").vacuum()
+        print("Done. See the logs for the details.")
+
+    @interface.add_option
+    async def cleanup():
+        """Remove the data of guilds, members and channels that are gone, and show how much"""
+        removed = await interface.bot.get_cog("maintenance").cleanup()
+        if not any(removed.values()):
+            print("There was nothing to clean up.")
+            return
+        print(tabulate(list(removed.items()), headers=("Table", "Rows removed")))
+
+    @interface.add_option
+    async def reloadsettings():
+        """Read the settings of all guilds from the database again, after editing it by hand"""
+        await interface.bot.guild_settings.invalidate()
+        print("Reloaded the guild settings.")
+
+    @interface.add_option
+    async def jobs():
+        """Show the scheduled jobs, when they last ran and when they will run next"""
+        scheduler = interface.bot.jobs
+        if not scheduler.jobs:
+            print("There are no scheduled jobs.")
+            return
+
+        def when(timestamp):
+            return time.ctime(timestamp) if timestamp else "-"
+
+        rows = []
+        for job in sorted(scheduler.jobs.values(), key=lambda x: x.run_at or 0):
+            rows.append(
+                [
+                    job.name,
+                    when(scheduler.last_runs.get(job.name)),
+                    "running" if scheduler.is_running(job.name) else when(job.run_at),
+                ]
+            )
+        print(tabulate(rows, headers=("Job", "Last run", "Next run")))
+
+    @interface.add_option
+    async def migrations():
+        """Show the database migrations, and which would be applied (a dry run)"""
+        found = find_migrations(interface.bot.path_to_myself / "schemas")
+        applied = await applied_migrations(interface.bot.db, found)
+        rows = []
+        for migration in found:
+            if migration.version not in applied:
+                status = "pending"
+            elif applied[migration.version] != migration.checksum:
+                status = "applied (changed since)"
+            else:
+                status = "applied"
+            rows.append([migration.path.name, status, migration.checksum[:12]])
+        print(tabulate(rows, headers=("Migration", "Status", "Checksum")))
+
     @interface.add_option
     async def listguilds():
         """List the guild that the bot is currently in"""
         print("Guilds MLA is currently in:")
         guilds = list(interface.bot.guilds)
         data = (
-            [len(x.members) for x in guilds],
+            # Members are not all cached, but Discord tells how many there are
+            [x.member_count for x in guilds],
             [x.id for x in guilds],
             [x.name for x in guilds],
         )
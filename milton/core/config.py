@@ -17,6 +17,16 @@ DEFAULTS = {
         "token": None,
         "pagination_timeout": 300,
         "test_server_id": None,
+        "development": False,
+        "warm_up": True,
+        "chunk_guilds_at_startup": False,
+        "intents": {
+            "members": True,
+            "presences": False,
+            "message_content": True,
+        },
+        "member_cache": {"joined": False, "voice": False},
+        "sync_hash_path": "~/.milton/command_tree.json",
         "startup_extensions": [
             "meta",
             "toys",
@@ -24,9 +34,19 @@ DEFAULTS = {
             "math_render",
             "rss",
             "pdf_render",
+            "reminders",
         ],
     },
-    "database": {"path": "~/.milton/database.sqlite"},
+    "database": {
+        "path": "~/.milton/database.sqlite",
+        "read_connections": 4,
+        "cache_size": 8192,
+        "mmap_size": 268435456,
+        "commit_interval": 0.005,
+        "commit_batch_size": 256,
+        "slow_query_threshold": 0.1,
+        "check_query_plans": False,
+    },
     "logs": {"path": "~/.milton/logs/mla.log", "file_level": 10, "stdout_level": 30},
     "prefixes": {"guild": "!!"},
     "emojis": {
@@ -37,7 +57,39 @@ DEFAULTS = {
         "first": "\u23ea",
         "stop": "\u23f9",
     },
-    "birthday": {"when": 10},
+    "members": {"cache_ttl": 600, "cache_size": 5000},
+    "birthday": {"when": 10, "max_concurrency": 8},
+    "rss": {
+        "min_poll_interval": 900,
+        "max_poll_interval": 86400,
+        "max_concurrency": 8,
+        "send_attempts": 3,
+        "max_entries": 50,
+        "stream_threshold": 262144,
+    },
+    "xkcd": {
+        "base_url": "https://xkcd.com",
+        "sync_concurrency": 8,
+        "check_interval": 8,
+        "jitter": 600,
+    },
+    "reminders": {
+        "window": 3600,
+        "batch_size": 500,
+        "max_per_user": 25,
+        "max_days": 365,
+        "max_concurrency": 8,
+    },
+    "maintenance": {
+        "quiet_hour": 4,
+        "vacuum_pages": 256,
+        "cleanup_chunk": 500,
+        "backup_path": "~/.milton/backups",
+        "backup_interval": 24,
+        "backup_keep": 7,
+        "backup_pages": 256,
+        "backup_sleep": 0.05,
+    },
 }
 
 with Path("~/.config/milton/milton.toml").expanduser().open("rb") as stream:
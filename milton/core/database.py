@@ -0,0 +1,337 @@
+"""The connections to Milton's SQLite database"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Iterable, List, NamedTuple, Optional
+
+import aiosqlite
+
+from milton.core.queries import name_of
+from milton.utils.metrics import timings
+
+log = logging.getLogger(__name__)
+
+
+class Statement(NamedTuple):
+    """A statement to be run in a write transaction.
+
+    Attributes:
+        sql: The SQL of the statement.
+        parameters: The parameters of the statement. If `many` is True, an
+            iterable of parameters, one for each time the statement is run.
+        many: Whether to run the statement with `executemany`.
+    """
+
+    sql: str
+    parameters: Any = None
+    many: bool = False
+
+
+class _Write(NamedTuple):
+    statements: List[Statement]
+    future: asyncio.Future
+
+
+class _TimedCursor:
+    """Wraps a cursor, to time the fetches and count the rows fetched."""
+
+    def __init__(self, cursor: aiosqlite.Cursor, elapsed: float) -> None:
+        self._cursor = cursor
+        self.elapsed: float = elapsed
+        self.rows: int = 0
+
+    async def fetchone(self):
+        start = time.perf_counter()
+        row = await self._cursor.fetchone()
+        self.elapsed += time.perf_counter() - start
+        self.rows += row is not None
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None):
+        start = time.perf_counter()
+        rows = await self._cursor.fetchmany(size)
+        self.elapsed += time.perf_counter() - start
+        self.rows += len(rows)
+        return rows
+
+    async def fetchall(self):
+        start = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        self.elapsed += time.perf_counter() - start
+        self.rows += len(rows)
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if (row := await self.fetchone()) is None:
+            raise StopAsyncIteration
+        return row
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+class Database:
+    """Milton's database, with one writer and a pool of readers.
+
+    The database runs in WAL mode, so readers never wait behind the writer
+    (and vice versa). All writes go through a single connection, while reads
+    can be spread over a small pool of read-only connections with `read`.
+
+    Writes should go through `write`, `write_many` or `transaction`. These
+    queue the writes, and a background task commits everything that was
+    queued in the last few milliseconds in a single transaction. Each caller
+    still gets its own result (or exception) once its write is committed.
+
+    For compatibility, `execute`, `executemany`, `executescript` and `commit`
+    go straight to the writer connection, which is in autocommit mode.
+
+    Reads and writes are timed, and counted, by statement (see
+    `milton.core.queries`). Statements slower than `slow_query_threshold`
+    are logged.
+
+    Args:
+        path: The path to the database file.
+        read_connections: How many read-only connections to keep around.
+        cache_size: The size of the page cache of each connection, in KiB.
+        mmap_size: How many bytes of the database to memory-map.
+        commit_interval: How long to wait for more writes before committing,
+            in seconds.
+        commit_batch_size: The maximum number of writes to commit at once.
+        slow_query_threshold: Log statements slower than this, in seconds.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        read_connections: int = 4,
+        cache_size: int = 8192,
+        mmap_size: int = 0,
+        commit_interval: float = 0.005,
+        commit_batch_size: int = 256,
+        slow_query_threshold: float = 0.1,
+    ) -> None:
+        self.path: Path = path
+        self.read_connections: int = read_connections
+        self.cache_size: int = cache_size
+        self.mmap_size: int = mmap_size
+        self.commit_interval: float = commit_interval
+        self.commit_batch_size: int = commit_batch_size
+        self.slow_query_threshold: float = slow_query_threshold
+
+        self.writer: Optional[aiosqlite.Connection] = None
+        """The connection used to write to the database."""
+        self._readers: List[aiosqlite.Connection] = []
+        self._pool: asyncio.Queue = asyncio.Queue()
+        self._writes: asyncio.Queue = asyncio.Queue()
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    async def connect(self):
+        """Open the connections to the database, making it if needed."""
+        log.debug(f"Connecting to the database at {self.path}")
+        # Transactions are handled explicitly by the write queue
+        self.writer = await aiosqlite.connect(self.path, isolation_level=None)
+        # Only takes effect on new databases: others need a `VACUUM` first
+        await self.writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await self.writer.execute("PRAGMA journal_mode = WAL")
+        await self.writer.execute("PRAGMA synchronous = NORMAL")
+        await self._tune(self.writer)
+
+        # The writer has made the file (if needed), so readers can open it
+        uri = self.path.as_uri() + "?mode=ro"
+        for _ in range(self.read_connections):
+            reader = await aiosqlite.connect(uri, uri=True)
+            await reader.execute("PRAGMA query_only = ON")
+            await self._tune(reader)
+            self._readers.append(reader)
+            self._pool.put_nowait(reader)
+
+        self._write_task = asyncio.create_task(self._commit_writes())
+
+        log.info(f"Connected to the database with {len(self._readers)} reader(s).")
+
+    async def _tune(self, connection: aiosqlite.Connection):
+        await connection.execute(f"PRAGMA cache_size = {-int(self.cache_size)}")
+        await connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        await connection.execute("PRAGMA busy_timeout = 5000")
+
+    async def close(self):
+        """Close all of the connections to the database.
+
+        Writes that are already queued are committed first.
+        """
+        if self._write_task:
+            await self._writes.join()
+            self._write_task.cancel()
+            self._write_task = None
+
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._pool = asyncio.Queue()
+
+        if self.writer:
+            await self.writer.close()
+            self.writer = None
+
+    @asynccontextmanager
+    async def read(self, sql: str, parameters: Optional[Iterable[Any]] = None):
+        """Run a read-only query on one of the read connections.
+
+        Use it just like `execute`, as an async context manager that gives
+        back a cursor. Reads only see committed data.
+
+        If there are no read connections, the writer is used instead.
+        """
+        if self._readers:
+            connection = await self._pool.get()
+        else:
+            connection = self.writer
+
+        try:
+            start = time.perf_counter()
+            async with connection.execute(sql, parameters) as cursor:
+                timed = _TimedCursor(cursor, time.perf_counter() - start)
+                yield timed
+        finally:
+            if self._readers:
+                self._pool.put_nowait(connection)
+
+        self._record(sql, timed.elapsed, timed.rows)
+
+    def _record(self, sql: str, seconds: float, rows: int):
+        name = name_of(sql)
+        timings(f"sql: {name}").record(seconds, rows)
+        if seconds > self.slow_query_threshold:
+            log.warning(f"Slow query '{name}': {seconds * 1000:.1f} ms, {rows} row(s).")
+
+    def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None):
+        """Execute a query with the writer connection."""
+        return self.writer.execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]):
+        """Execute a query many times with the writer connection."""
+        return self.writer.executemany(sql, parameters)
+
+    def executescript(self, sql_script: str):
+        """Execute a script with the writer connection."""
+        return self.writer.executescript(sql_script)
+
+    async def commit(self):
+        """Commit the current transaction of the writer connection, if any."""
+        await self.writer.commit()
+
+    @asynccontextmanager
+    async def exclusive(self):
+        """Hold off the write queue, to use the writer connection directly.
+
+        Use it as an async context manager, that gives back the writer. Keep
+        it short: queued writes wait until it is done.
+        """
+        async with self._write_lock:
+            yield self.writer
+
+    async def transaction(self, *statements: Statement) -> int:
+        """Run some statements in a write transaction.
+
+        The statements are queued, and committed together with any other
+        write queued at about the same time. Either all of the statements
+        are committed, or none are.
+
+        Returns:
+            The number of rows changed by the last statement.
+
+        Raises:
+            Any error raised by the statements.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._writes.put_nowait(_Write(list(statements), future))
+        return await future
+
+    async def write(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> int:
+        """Run a single statement in a write transaction.
+
+        See `transaction`.
+        """
+        return await self.transaction(Statement(sql, parameters))
+
+    async def write_many(self, sql: str, parameters: Iterable[Iterable[Any]]) -> int:
+        """Run a single statement many times in a write transaction.
+
+        See `transaction`.
+        """
+        return await self.transaction(Statement(sql, parameters, many=True))
+
+    async def _commit_writes(self):
+        """Commit the queued writes, in batches."""
+        while True:
+            batch = [await self._writes.get()]
+            if self._writes.qsize() < self.commit_batch_size:
+                # Give other writers a chance to join in
+                await asyncio.sleep(self.commit_interval)
+            while not self._writes.empty() and len(batch) < self.commit_batch_size:
+                batch.append(self._writes.get_nowait())
+
+            try:
+                async with self._write_lock:
+                    await self._commit_batch(batch)
+            except Exception as e:
+                log.exception("Failed to commit a batch of writes")
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    async def _commit_batch(self, batch: List[_Write]):
+        results = []
+
+        await self.writer.execute("BEGIN")
+        try:
+            for write in batch:
+                # A savepoint for each write, so that a failing write does
+                # not take the others down with it.
+                await self.writer.execute("SAVEPOINT write")
+                try:
+                    rowcount = 0
+                    for statement in write.statements:
+                        start = time.perf_counter()
+                        if statement.many:
+                            cursor = await self.writer.executemany(
+                                statement.sql, statement.parameters
+                            )
+                        else:
+                            cursor = await self.writer.execute(
+                                statement.sql, statement.parameters
+                            )
+                        rowcount = cursor.rowcount
+                        await cursor.close()
+                        self._record(
+                            statement.sql, time.perf_counter() - start, rowcount
+                        )
+                except Exception as e:
+                    await self.writer.execute("ROLLBACK TO write")
+                    results.append((False, e))
+                else:
+                    results.append((True, rowcount))
+                await self.writer.execute("RELEASE write")
+            await self.writer.execute("COMMIT")
+        except BaseException:
+            await self.writer.execute("ROLLBACK")
+            raise
+
+        log.debug(f"Committed {len(batch)} write(s) in one transaction.")
+        for write, (ok, result) in zip(batch, results):
+            if write.future.done():
+                # The caller is not waiting anymore
+                continue
+            if ok:
+                write.future.set_result(result)
+            else:
+                write.future.set_exception(result)
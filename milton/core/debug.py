@@ -5,9 +5,17 @@ from discord.ext.commands.context import Context
 
 from milton.core.bot import Milton
 from milton.core.errors import MiltonInputError
+from milton.core.queries import query
 from milton.utils.paginator import Paginator
 from milton.utils.tools import fetch
 
+BIRTHDAY_KEYS = "guild_id, user_id, year, day, month"
+USER_BIRTHDAYS = query(
+    "debug.user_birthdays",
+    f"SELECT {BIRTHDAY_KEYS} FROM birthdays WHERE user_id = :user_id",
+    hot=True,
+)
+
 
 class DebugCog(commands.GroupCog, name="debug"):
     """"""
@@ -56,14 +64,11 @@ class DebugCog(commands.GroupCog, name="debug"):
         out = Paginator(force_embed=True, title=f"Data for user {member.name}")
 
         formatted = []
-        bday_keys = "guild_id, user_id, year, day, month"
-        async with self.bot.db.execute(
-            f"SELECT {bday_keys} FROM birthdays WHERE user_id = {member.id}"
-        ) as cursor:
+        async with self.bot.db.read(USER_BIRTHDAYS, (member.id,)) as cursor:
             birthday_data = await cursor.fetchall()
 
         if birthday_data:
-            formatted.append(f"Birthday data ({bday_keys}) :: {birthday_data}")
+            formatted.append(f"Birthday data ({BIRTHDAY_KEYS}) :: {birthday_data}")
         else:
             formatted.append("No birthday data found.")
 
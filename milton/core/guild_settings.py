@@ -0,0 +1,74 @@
+"""An in-memory copy of the settings of each guild"""
+import logging
+from typing import Dict, Iterator, Optional
+
+from milton.repositories.guild_settings import GuildSettings, GuildSettingsRepository
+
+log = logging.getLogger(__name__)
+
+
+class GuildSettingsCache:
+    """Write-through cache of the settings of all guilds.
+
+    Settings are read from the repository once, with `load`. Afterwards, `get`
+    never touches the repository. Changes must go through `update`, which
+    writes them to the repository, then to the cache.
+
+    If the repository is changed by something else, call `invalidate` to
+    read the settings again.
+
+    Args:
+        repository: Where the settings are kept.
+    """
+
+    def __init__(self, repository: GuildSettingsRepository) -> None:
+        self.repository: GuildSettingsRepository = repository
+        self._settings: Dict[int, GuildSettings] = {}
+
+    async def load(self):
+        """(Re)load the settings of all guilds from the repository."""
+        self._settings = {x.guild_id: x for x in await self.repository.all()}
+        log.info(f"Loaded the settings of {len(self._settings)} guild(s).")
+
+    def get(self, guild_id: int) -> GuildSettings:
+        """Get the settings of a guild.
+
+        Guilds that never changed their settings get the default ones.
+        """
+        return self._settings.get(guild_id) or GuildSettings(guild_id)
+
+    def __iter__(self) -> Iterator[GuildSettings]:
+        """Iterate over the settings of all the guilds that have some."""
+        return iter(list(self._settings.values()))
+
+    async def update(self, guild_id: int, **changes) -> GuildSettings:
+        """Change some settings of a guild.
+
+        Args:
+            guild_id: The id of the guild.
+            **changes: The new values of the settings, by name.
+
+        Returns:
+            The new settings of the guild.
+        """
+        await self.repository.update(guild_id, **changes)
+
+        # Only once the change is committed
+        settings = self.get(guild_id)._replace(**changes)
+        self._settings[guild_id] = settings
+        return settings
+
+    async def invalidate(self, guild_id: Optional[int] = None):
+        """Read the settings of a guild (or all of them) from the repository again.
+
+        Use this after changing `guild_config` without going through `update`.
+        """
+        if guild_id is None:
+            await self.load()
+            return
+
+        settings = await self.repository.get(guild_id)
+        if settings is None:
+            self._settings.pop(guild_id, None)
+        else:
+            self._settings[guild_id] = settings
@@ -0,0 +1,310 @@
+"""Jobs that run on a schedule, and remember when they last ran"""
+import asyncio
+import datetime as dt
+import heapq
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from milton.core.database import Database
+from milton.core.queries import query
+
+log = logging.getLogger(__name__)
+
+JOB_RUNS = query(
+    "jobs.last_runs",
+    "SELECT name, last_run FROM jobs "
+    "WHERE name IN (SELECT value FROM json_each(:names))",
+    hot=True,
+)
+RECORD_RUN = query(
+    "jobs.record_run",
+    "INSERT INTO jobs (name, last_run, ran_on, next_run) "
+    "VALUES (:name, :last_run, :ran_on, :next_run) "
+    "ON CONFLICT (name) DO UPDATE SET last_run = excluded.last_run, "
+    "ran_on = excluded.ran_on, next_run = excluded.next_run",
+    hot=True,
+)
+DELETE_JOB = query("jobs.delete", "DELETE FROM jobs WHERE name = :name", hot=True)
+
+# Seconds to wait before reading the last runs again, if it failed
+LOAD_RETRY_DELAY = 60
+
+
+def next_daily(hour: int, timezone: Optional[str], after: float) -> float:
+    """Get the first time that it is some hour of the day, after some moment.
+
+    Args:
+        hour: The hour of the day.
+        timezone: The IANA name of the timezone (like "Europe/Rome"). If None,
+            the local timezone of the server is used.
+        after: A UNIX timestamp.
+
+    Returns:
+        The UNIX timestamp of the first time it is `hour` after `after`.
+    """
+    tz = ZoneInfo(timezone) if timezone else None
+    current = datetime.fromtimestamp(after, tz)
+
+    due = datetime.combine(current.date(), dt.time(hour), tzinfo=tz)
+    if due.timestamp() <= after:
+        tomorrow = current.date() + dt.timedelta(days=1)
+        due = datetime.combine(tomorrow, dt.time(hour), tzinfo=tz)
+
+    return due.timestamp()
+
+
+def daily(hour: int, timezone: Optional[str] = None) -> Callable[[float], float]:
+    """A schedule that runs every day at some hour, in some timezone."""
+    return partial(next_daily, hour, timezone)
+
+
+def every(seconds: float) -> Callable[[float], float]:
+    """A schedule that runs every so many seconds."""
+
+    def after(last: float) -> float:
+        return last + seconds
+
+    return after
+
+
+class Job:
+    """Some coroutine function to run on a schedule.
+
+    The function is called with the UNIX timestamp of the run it is doing,
+    that is the time it was scheduled for (not the time it actually runs).
+
+    Args:
+        name: A unique name for the job. The last run of the job is stored
+            under this name.
+        func: The coroutine function to run.
+        schedule: A function giving the time of the next run after a run
+            scheduled at some time (see `every` and `daily`).
+        jitter: Each run is delayed by a random time up to this, in seconds.
+        catch_up: If a run was missed (as the bot was offline), run once as
+            soon as possible. Otherwise, wait for the next run.
+        start_now: If the job never ran before, run it right away instead of
+            waiting for its first scheduled time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[float], Awaitable],
+        schedule: Callable[[float], float],
+        jitter: float = 0,
+        catch_up: bool = True,
+        start_now: bool = False,
+    ) -> None:
+        self.name: str = name
+        self.func: Callable[[float], Awaitable] = func
+        self.schedule: Callable[[float], float] = schedule
+        self.jitter: float = jitter
+        self.catch_up: bool = catch_up
+        self.start_now: bool = start_now
+
+        self.next_run: Optional[float] = None
+        """The time that the next run is scheduled for."""
+        self.run_at: Optional[float] = None
+        """When the next run will actually start, with the jitter."""
+
+    def __repr__(self) -> str:
+        return f"Job(name={self.name!r}, next_run={self.next_run})"
+
+
+class JobScheduler:
+    """Runs jobs on their schedules, with a single task.
+
+    The last run of each job is stored in the `jobs` table, so that the jobs
+    keep their schedule across restarts. A job that missed some runs while
+    the bot was offline runs once (and only once) when it is added, if it
+    wants to catch up.
+
+    Jobs can be added (or replaced) and removed at any time, even before the
+    scheduler is started. A job never runs twice at the same time.
+    """
+
+    def __init__(self) -> None:
+        self.db: Optional[Database] = None
+        self.jobs: Dict[str, Job] = {}
+        self.last_runs: Dict[str, float] = {}
+        """The time that the last run of each job was scheduled for."""
+
+        self._schedule: List[Tuple[float, str]] = []
+        """Min-heap of (run_at, name) of the next runs. Entries that do not
+        match the `run_at` of their job are stale, and are skipped."""
+        self._loaded: Set[str] = set()
+        """The jobs whose last run was read from the database."""
+        self._new: Set[str] = set()
+        """The jobs whose last run is yet to be read from the database."""
+        self._retry_load: float = 0
+        """When to try reading the last runs again, after a failure."""
+        self._running: Dict[str, asyncio.Task] = {}
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, job: Job):
+        """Add a job, replacing any job with the same name."""
+        self.jobs[job.name] = job
+        if job.name in self._loaded:
+            self._plan(job, time.time())
+        else:
+            self._new.add(job.name)
+        self._changed.set()
+
+    def remove(self, name: str):
+        """Stop running a job. A run in progress is left to finish."""
+        self.jobs.pop(name, None)
+        self._new.discard(name)
+        self._changed.set()
+
+    async def forget(self, name: str):
+        """Remove a job, and forget when it last ran."""
+        self.remove(name)
+        self.last_runs.pop(name, None)
+        await self.db.write(DELETE_JOB, (name,))
+
+    def start(self, db: Database, ready: Optional[Callable[[], Awaitable]] = None):
+        """Start running the jobs.
+
+        Args:
+            db: The database with the `jobs` table.
+            ready: If given, awaited before running anything.
+        """
+        self.db = db
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(ready))
+
+    def stop(self):
+        """Stop running the jobs, cancelling the runs in progress."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in self._running.values():
+            task.cancel()
+
+    def is_running(self, name: str) -> bool:
+        """Check if a job is running right now."""
+        return name in self._running
+
+    def _plan(self, job: Job, now: float):
+        """Schedule the next run of a job."""
+        if job.name in self._running:
+            # Planned once the run is over
+            return
+
+        last = self.last_runs.get(job.name)
+        if last is None:
+            due = now if job.start_now else job.schedule(now)
+        else:
+            due = job.schedule(last)
+            if due <= now:
+                # Only the latest missed run is worth running
+                while (following := job.schedule(due)) <= now:
+                    due = following
+                if job.catch_up:
+                    log.info(
+                        f"Job {job.name} missed its run of {time.ctime(due)}, "
+                        "running it now."
+                    )
+                else:
+                    due = following
+
+        job.next_run = due
+        job.run_at = max(due, now) + random.uniform(0, job.jitter)
+        heapq.heappush(self._schedule, (job.run_at, job.name))
+
+    async def _load(self):
+        """Read the last runs of the new jobs, and schedule them.
+
+        If the read fails, the jobs stay new, to be read again later.
+        """
+        names = list(self._new)
+        last_runs = {}
+        async with self.db.read(JOB_RUNS, (json.dumps(names),)) as cursor:
+            async for name, last_run in cursor:
+                last_runs[name] = last_run
+        self.last_runs.update(last_runs)
+        self._loaded.update(names)
+        # Jobs added in the meantime are read on the next round
+        self._new.difference_update(names)
+
+        now = time.time()
+        for name in names:
+            if job := self.jobs.get(name):
+                self._plan(job, now)
+
+    def _is_stale(self, run_at: float, name: str) -> bool:
+        job = self.jobs.get(name)
+        return job is None or job.run_at != run_at or name in self._running
+
+    async def _run(self, ready: Optional[Callable[[], Awaitable]]):
+        if ready:
+            await ready()
+
+        while True:
+            self._changed.clear()
+
+            if self._new and time.time() >= self._retry_load:
+                try:
+                    await self._load()
+                except Exception:
+                    log.exception("Failed to read the last runs of the jobs")
+                    self._retry_load = time.time() + LOAD_RETRY_DELAY
+
+            while self._schedule and self._is_stale(*self._schedule[0]):
+                heapq.heappop(self._schedule)
+
+            wake = [self._schedule[0][0]] if self._schedule else []
+            if self._new:
+                wake.append(self._retry_load)
+            timeout = min(wake) - time.time() if wake else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            while self._schedule and self._schedule[0][0] <= now:
+                run_at, name = heapq.heappop(self._schedule)
+                if not self._is_stale(run_at, name):
+                    job = self.jobs[name]
+                    job.run_at = None
+                    self._running[name] = asyncio.create_task(self._run_job(job))
+
+    async def _run_job(self, job: Job):
+        due = job.next_run
+        start = time.time()
+        log.debug(f"Running job {job.name}...")
+        try:
+            await job.func(due)
+        except Exception:
+            log.exception(f"Job {job.name} failed")
+        else:
+            log.debug(f"Job {job.name} done in {time.time() - start:.2f}s.")
+
+        del self._running[job.name]
+
+        # The job might have been replaced (or removed) in the meantime. If
+        # it was removed (maybe forgotten by the run itself), there is
+        # nothing to remember.
+        current = self.jobs.get(job.name)
+        if current is None:
+            return
+
+        # Failed runs count as runs too: they are not retried until the next
+        self.last_runs[job.name] = due
+        self._plan(current, time.time())
+        self._changed.set()
+
+        try:
+            await self.db.write(RECORD_RUN, (job.name, due, start, current.next_run))
+        except Exception:
+            log.exception(f"Failed to save the last run of job {job.name}")
@@ -0,0 +1,486 @@
+"""This extension keeps the database in shape, and backs it up
+
+Every day, in the quiet hours, the data of guilds, members and channels that
+are gone is removed, the query planner statistics are refreshed and the free
+pages of the database are given back to the filesystem. Every few hours, an
+online backup of the database is taken.
+
+Data is also removed as soon as the bot hears that a guild, member or
+channel went away. Cogs that keep some of that data elsewhere (in memory, or
+as scheduled jobs) listen to the `guild_data_removed`, `member_data_removed`
+and `channel_data_removed` events to drop it too.
+"""
+import asyncio
+import datetime as dt
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import discord
+from discord.ext import commands, tasks
+
+from milton.core.bot import Milton
+from milton.core.config import CONFIG
+from milton.core.queries import query
+
+log = logging.getLogger(__name__)
+
+# sqlite's `auto_vacuum` value for incremental vacuuming
+INCREMENTAL = 2
+
+# The tables with data of guilds
+GUILD_TABLES = ("birthdays", "guild_config", "xkcd", "feed_subscriptions")
+
+KNOWN_GUILDS = query(
+    "cleanup.known_guilds",
+    " UNION ".join(f"SELECT guild_id FROM {x}" for x in GUILD_TABLES),
+)
+DELETE_GUILDS = {
+    table: query(
+        f"cleanup.delete_guilds_{table}",
+        f"DELETE FROM {table} WHERE guild_id IN "
+        "(SELECT value FROM json_each(:guild_ids))",
+    )
+    for table in GUILD_TABLES
+}
+GUILD_MEMBERS = query(
+    "cleanup.guild_members",
+    "SELECT user_id FROM birthdays WHERE guild_id = :guild_id",
+    hot=True,
+)
+DELETE_MEMBERS = query(
+    "cleanup.delete_members",
+    "DELETE FROM birthdays WHERE guild_id = :guild_id "
+    "AND user_id IN (SELECT value FROM json_each(:user_ids))",
+    hot=True,
+)
+CONFIGURED_CHANNELS = query(
+    "cleanup.configured_channels",
+    "SELECT guild_id, bday_shout_channel FROM guild_config "
+    "WHERE bday_shout_channel IS NOT NULL "
+    "UNION SELECT guild_id, shout_channel FROM xkcd "
+    "UNION SELECT guild_id, channel_id FROM feed_subscriptions",
+)
+DELETE_CHANNELS = {
+    "xkcd": query(
+        "cleanup.delete_channels_xkcd",
+        "DELETE FROM xkcd WHERE shout_channel IN "
+        "(SELECT value FROM json_each(:channel_ids))",
+    ),
+    "feed_subscriptions": query(
+        "cleanup.delete_channels_feed_subscriptions",
+        "DELETE FROM feed_subscriptions WHERE channel_id IN "
+        "(SELECT value FROM json_each(:channel_ids))",
+    ),
+}
+DELETE_UNFOLLOWED_FEEDS = {
+    "feed_unsent": query(
+        "cleanup.unfollowed_feed_unsent",
+        "DELETE FROM feed_unsent WHERE NOT EXISTS (SELECT 1 FROM feed_subscriptions "
+        "WHERE feed_subscriptions.feed_id = feed_unsent.feed_id "
+        "AND feed_subscriptions.channel_id = feed_unsent.channel_id)",
+    ),
+    "feed_seen": query(
+        "cleanup.unfollowed_feed_seen",
+        "DELETE FROM feed_seen WHERE NOT EXISTS (SELECT 1 FROM feed_subscriptions "
+        "WHERE feed_subscriptions.feed_id = feed_seen.feed_id)",
+    ),
+    "feeds": query(
+        "cleanup.unfollowed_feeds",
+        "DELETE FROM feeds WHERE NOT EXISTS (SELECT 1 FROM feed_subscriptions "
+        "WHERE feed_subscriptions.feed_id = feeds.feed_id)",
+    ),
+}
+
+
+def database_size(path: Path) -> int:
+    """Get the size of a database on disk (with its WAL), in bytes."""
+    size = 0
+    for file in (path, path.with_name(path.name + "-wal")):
+        if file.exists():
+            size += file.stat().st_size
+    return size
+
+
+def human_size(size: float) -> str:
+    """Format a size in bytes to something readable, like '1.2 MiB'."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            break
+        size /= 1024
+    return f"{size:.1f} {unit}"
+
+
+async def free_pages(connection) -> int:
+    """Get how many pages of a database are free, and could be given back."""
+    async with connection.execute("PRAGMA freelist_count") as cursor:
+        (free,) = await cursor.fetchone()
+    return free
+
+
+def chunks(items: List, size: int):
+    """Split a list in chunks of (at most) some size."""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def backup_database(source: Path, target: Path, pages: int, sleep: float) -> int:
+    """Copy a live database to a file with the sqlite backup API.
+
+    The database is copied a few pages at a time, sleeping between steps,
+    so that writers are never blocked for long. If the database is written
+    to during the backup, sqlite starts copying again.
+
+    This blocks, so it should be run in an executor.
+
+    Returns:
+        The number of pages copied.
+    """
+    copied = 0
+
+    def progress(status, remaining, total):
+        nonlocal copied
+        copied = total - remaining
+
+    src = sqlite3.connect(f"{source.as_uri()}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+    finally:
+        dst.close()
+        src.close()
+
+    return copied
+
+
+class Maintenance(commands.Cog, name="maintenance"):
+    """Cog that maintains and backs up the database."""
+
+    def __init__(self, bot: Milton) -> None:
+        self.bot: Milton = bot
+
+    async def cog_load(self):
+        # The quiet hour is in the server's local time
+        quiet_time = dt.time(
+            hour=CONFIG.maintenance.quiet_hour,
+            tzinfo=datetime.now().astimezone().tzinfo,
+        )
+        self.maintenance_task.change_interval(time=quiet_time)
+        self.maintenance_task.start()
+
+        if CONFIG.maintenance.backup_interval > 0:
+            self.backup_task.change_interval(hours=CONFIG.maintenance.backup_interval)
+            self.backup_task.start()
+
+    def cog_unload(self):
+        self.maintenance_task.cancel()
+        self.backup_task.cancel()
+
+    @tasks.loop(hours=24)
+    async def maintenance_task(self):
+        try:
+            await self.cleanup()
+        except Exception:
+            log.exception("Cleaning up the database failed")
+
+        try:
+            await self.maintain()
+        except Exception:
+            log.exception("Database maintenance failed")
+
+    @tasks.loop(hours=24)
+    async def backup_task(self):
+        try:
+            await self.backup()
+        except Exception:
+            log.exception("Database backup failed")
+
+    @maintenance_task.before_loop
+    @backup_task.before_loop
+    async def before_task(self):
+        await self.bot.wait_until_ready()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        log.info(f"Left guild {guild.id}, removing its data.")
+        self.bot.members.forget(guild.id)
+        await self.delete_guilds([guild.id])
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # The raw event is sent even if the member was not cached
+        self.bot.members.forget(payload.guild_id, payload.user.id)
+        await self.delete_members(payload.guild_id, [payload.user.id])
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        await self.delete_channels([(channel.guild.id, channel.id)])
+
+    async def delete_guilds(self, guild_ids: List[int]) -> Dict[str, int]:
+        """Delete all the data of some guilds, in chunks.
+
+        Then, the `guild_data_removed` event is dispatched with the ids of the
+        guilds, so that the cogs can forget what they keep of them.
+
+        Returns:
+            The number of rows deleted from each table.
+        """
+        removed = dict.fromkeys(GUILD_TABLES, 0)
+        for chunk in chunks(guild_ids, CONFIG.maintenance.cleanup_chunk):
+            ids = json.dumps(chunk)
+            for table, sql in DELETE_GUILDS.items():
+                removed[table] += await self.bot.db.write(sql, (ids,))
+            for guild_id in chunk:
+                await self.bot.guild_settings.invalidate(guild_id)
+
+        if removed["feed_subscriptions"]:
+            removed.update(await self.delete_unfollowed_feeds())
+        self.bot.dispatch("guild_data_removed", guild_ids)
+        return removed
+
+    async def delete_members(self, guild_id: int, user_ids: List[int]) -> int:
+        """Delete the data of some members of a guild, in chunks.
+
+        If anything was deleted, the `member_data_removed` event is then
+        dispatched with the id of the guild and the ids of the users.
+
+        Returns:
+            The number of rows deleted.
+        """
+        removed = 0
+        for chunk in chunks(user_ids, CONFIG.maintenance.cleanup_chunk):
+            removed += await self.bot.db.write(
+                DELETE_MEMBERS, (guild_id, json.dumps(chunk))
+            )
+        if removed:
+            self.bot.dispatch("member_data_removed", guild_id, user_ids)
+        return removed
+
+    async def delete_channels(self, channels: List[Tuple[int, int]]) -> Dict[str, int]:
+        """Stop using some (deleted) channels, in chunks.
+
+        Then, the `channel_data_removed` event is dispatched with the channels,
+        so that the cogs can stop using them too.
+
+        Args:
+            channels: A list of (guild_id, channel_id) of the channels.
+
+        Returns:
+            The number of rows deleted (or changed) in each table.
+        """
+        removed = {"guild_config": 0, **dict.fromkeys(DELETE_CHANNELS, 0)}
+        for guild_id, channel_id in channels:
+            settings = self.bot.guild_settings.get(guild_id)
+            if settings.bday_shout_channel == channel_id:
+                await self.bot.guild_settings.update(guild_id, bday_shout_channel=None)
+                removed["guild_config"] += 1
+
+        channel_ids = [channel_id for _, channel_id in channels]
+        for chunk in chunks(channel_ids, CONFIG.maintenance.cleanup_chunk):
+            ids = json.dumps(chunk)
+            for table, sql in DELETE_CHANNELS.items():
+                removed[table] += await self.bot.db.write(sql, (ids,))
+
+        if removed["feed_subscriptions"]:
+            removed.update(await self.delete_unfollowed_feeds())
+        self.bot.dispatch("channel_data_removed", channels)
+        return removed
+
+    async def delete_unfollowed_feeds(self) -> Dict[str, int]:
+        """Delete the feeds that nobody follows anymore (and their items)."""
+        return {
+            table: await self.bot.db.write(sql)
+            for table, sql in DELETE_UNFOLLOWED_FEEDS.items()
+        }
+
+    async def cleanup(self) -> Dict[str, int]:
+        """Delete the data of the guilds, members and channels that are gone.
+
+        This catches up with what the bot missed while it was offline. The
+        members with some data are looked up through `bot.members`, in
+        chunks, and only the ones that are surely gone are removed: members
+        that could not be looked up (due to errors) are kept.
+
+        Returns:
+            The number of rows deleted (or changed) in each table.
+        """
+        if not self.bot.is_ready() or not self.bot.guilds:
+            # Without the guilds, everything would look gone
+            log.warning("Not cleaning up the database, as I am not ready.")
+            return {}
+
+        start = time.perf_counter()
+        removed: Dict[str, int] = {}
+
+        def count(changes: Dict[str, int]):
+            for table, rows in changes.items():
+                removed[table] = removed.get(table, 0) + rows
+
+        current = {guild.id for guild in self.bot.guilds}
+        async with self.bot.db.read(KNOWN_GUILDS) as cursor:
+            known: Set[int] = {row[0] async for row in cursor}
+        if gone := sorted(known - current):
+            count(await self.delete_guilds(gone))
+
+        members = 0
+        for guild in self.bot.guilds:
+            if guild.unavailable:
+                continue
+            async with self.bot.db.read(GUILD_MEMBERS, (guild.id,)) as cursor:
+                user_ids = [row[0] async for row in cursor]
+            for chunk in chunks(user_ids, CONFIG.maintenance.cleanup_chunk):
+                if left := await self.bot.members.gone(guild, chunk):
+                    members += await self.delete_members(guild.id, left)
+        count({"birthdays": members})
+
+        channels = []
+        async with self.bot.db.read(CONFIGURED_CHANNELS) as cursor:
+            async for guild_id, channel_id in cursor:
+                guild = self.bot.get_guild(guild_id)
+                if (
+                    guild
+                    and not guild.unavailable
+                    and not guild.get_channel(channel_id)
+                ):
+                    channels.append((guild_id, channel_id))
+        if channels:
+            count(await self.delete_channels(channels))
+
+        log.info(
+            f"Database cleanup: removed {sum(removed.values())} row(s) in "
+            f"{time.perf_counter() - start:.2f}s ({removed})."
+        )
+        return removed
+
+    async def maintain(self):
+        """Optimize the database, and give its free pages back.
+
+        Runs `PRAGMA optimize` (and a full `ANALYZE` the first time), then
+        an incremental vacuum in small steps, so that queued writes can go
+        through between them.
+
+        Databases made before incremental vacuuming was turned on are not
+        vacuumed: they must be rebuilt once, by hand, with `vacuum`.
+        """
+        db = self.bot.db
+        size_before = database_size(db.path)
+
+        start = time.perf_counter()
+        async with db.exclusive() as writer:
+            async with writer.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ) as cursor:
+                analyzed = await cursor.fetchone() is not None
+            await writer.execute("PRAGMA optimize" if analyzed else "ANALYZE")
+        optimized_in = time.perf_counter() - start
+
+        start = time.perf_counter()
+        async with db.exclusive() as writer:
+            async with writer.execute("PRAGMA auto_vacuum") as cursor:
+                (auto_vacuum,) = await cursor.fetchone()
+        if auto_vacuum != INCREMENTAL:
+            log.warning(
+                "The database does not vacuum incrementally, so its free pages "
+                "are kept. Run the `vacuum` CLI command once to switch it."
+            )
+
+        freed = 0
+        while auto_vacuum == INCREMENTAL:
+            async with db.exclusive() as writer:
+                free = await free_pages(writer)
+                if free == 0:
+                    break
+                step = min(free, CONFIG.maintenance.vacuum_pages)
+                # A page is freed for each step of the statement
+                async with writer.execute(
+                    f"PRAGMA incremental_vacuum({step})"
+                ) as cursor:
+                    await cursor.fetchall()
+                left = await free_pages(writer)
+            freed += free - left
+            if left >= free:
+                break
+
+        async with db.exclusive() as writer:
+            await writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        vacuumed_in = time.perf_counter() - start
+
+        log.info(
+            f"Database maintenance: optimized in {optimized_in:.2f}s, "
+            f"freed {freed} page(s) in {vacuumed_in:.2f}s. Size went from "
+            f"{human_size(size_before)} to {human_size(database_size(db.path))}."
+        )
+
+    async def vacuum(self):
+        """Rebuild the database, switching it to incremental vacuuming.
+
+        This is needed only once, for databases made before incremental
+        vacuuming was turned on. The rebuild rewrites the whole database, and
+        queued writes wait until it is done, so it is never run on its own.
+        """
+        db = self.bot.db
+        size_before = database_size(db.path)
+
+        log.info("Rebuilding the database with incremental vacuum...")
+        start = time.perf_counter()
+        async with db.exclusive() as writer:
+            await writer.execute(f"PRAGMA auto_vacuum = {INCREMENTAL}")
+            await writer.execute("VACUUM")
+            await writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        log.info(
+            f"Rebuilt the database in {time.perf_counter() - start:.2f}s. Size "
+            f"went from {human_size(size_before)} to "
+            f"{human_size(database_size(db.path))}."
+        )
+
+    async def backup(self, target: Optional[Path] = None) -> Tuple[Path, int]:
+        """Take an online backup of the database.
+
+        The copy runs in a separate thread, with its own connections.
+        Old backups in the backup folder are deleted, keeping the newest
+        `backup_keep` (at least one).
+
+        Args:
+            target: Where to save the backup. Defaults to a new, timestamped
+                file in the backup folder.
+
+        Returns:
+            The path to the backup and its size, in bytes.
+        """
+        folder = Path(CONFIG.maintenance.backup_path).expanduser().absolute()
+        if target is None:
+            folder.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            target = folder / f"database-{stamp}.sqlite"
+
+        log.info(f"Backing up the database to {target}...")
+        start = time.perf_counter()
+        pages = await asyncio.get_running_loop().run_in_executor(
+            None,
+            backup_database,
+            self.bot.db.path,
+            target,
+            CONFIG.maintenance.backup_pages,
+            CONFIG.maintenance.backup_sleep,
+        )
+        size = target.stat().st_size
+        log.info(
+            f"Backed up {pages} page(s) ({human_size(size)}) "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+        backups = sorted(folder.glob("database-*.sqlite"))
+        for old in backups[: -max(1, CONFIG.maintenance.backup_keep)]:
+            log.debug(f"Removing old backup {old}")
+            old.unlink()
+
+        return target, size
+
+
+async def setup(bot: Milton):
+    await bot.add_cog(Maintenance(bot))
@@ -0,0 +1,181 @@
+"""Finds the members of a guild on demand, without caching them all"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from milton.utils.tools import gather_limited
+
+log = logging.getLogger(__name__)
+
+# Discord answers at most this many user ids per member query
+QUERY_CHUNK = 100
+
+
+class MemberResolver:
+    """Finds some members of a guild, keeping them for a short time.
+
+    The bot does not keep all members of all guilds in memory, so the ones
+    that are needed (say, the ones with a birthday on a page) are requested
+    to Discord: through the gateway if the bot has the members intent, or
+    one by one otherwise. Members that are not found are remembered too, so
+    they are not requested again until they expire.
+
+    Args:
+        use_gateway: Whether the bot has the members intent, to query them
+            through the gateway.
+        ttl: How long to keep the members, in seconds.
+        max_size: How many members to keep at most. The ones used least
+            recently are dropped first.
+        concurrency: How many members to fetch at once, without the members
+            intent.
+    """
+
+    def __init__(
+        self, use_gateway: bool, ttl: float, max_size: int, concurrency: int = 4
+    ) -> None:
+        self.use_gateway: bool = use_gateway
+        self.ttl: float = ttl
+        self.max_size: int = max_size
+        self.concurrency: int = concurrency
+        self._cache: OrderedDict[
+            Tuple[int, int], Tuple[float, Optional[discord.Member]]
+        ] = OrderedDict()
+
+    def _get(self, guild_id: int, user_id: int, now: float):
+        """Get a cached member (or None if it was not found), or False."""
+        key = (guild_id, user_id)
+        expires, member = self._cache.get(key, (0, None))
+        if expires <= now:
+            self._cache.pop(key, None)
+            return False
+        self._cache.move_to_end(key)
+        return member
+
+    def _put(self, guild_id: int, user_id: int, member: Optional[discord.Member]):
+        self._cache[(guild_id, user_id)] = (time.monotonic() + self.ttl, member)
+        self._cache.move_to_end((guild_id, user_id))
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def forget(self, guild_id: int, user_id: Optional[int] = None):
+        """Drop a member (or all the members of a guild) from the cache."""
+        if user_id is not None:
+            self._cache.pop((guild_id, user_id), None)
+            return
+        for key in [x for x in self._cache if x[0] == guild_id]:
+            del self._cache[key]
+
+    async def resolve(
+        self, guild: discord.Guild, user_ids: Iterable[int]
+    ) -> Dict[int, discord.Member]:
+        """Find some members of a guild.
+
+        Args:
+            guild: The guild.
+            user_ids: The ids of the users to find.
+
+        Returns:
+            The members that were found, by their user id. Users that are not
+            in the guild (anymore) are missing.
+        """
+        members = await self._resolve(guild, user_ids)
+        return {k: v for k, v in members.items() if v is not None}
+
+    async def gone(self, guild: discord.Guild, user_ids: Iterable[int]) -> List[int]:
+        """Find which of some users are not in a guild (anymore).
+
+        Args:
+            guild: The guild.
+            user_ids: The ids of the users to check.
+
+        Returns:
+            The ids of the users that are surely not in the guild. Users that
+            could not be checked (due to errors) are not included.
+        """
+        members = await self._resolve(guild, user_ids)
+        return [k for k, v in members.items() if v is None]
+
+    async def _resolve(
+        self, guild: discord.Guild, user_ids: Iterable[int]
+    ) -> Dict[int, Optional[discord.Member]]:
+        """Find some members of a guild.
+
+        Returns:
+            The members by their user id, or None if they are not in the guild.
+            Users that could not be requested (due to errors) are missing.
+        """
+        now = time.monotonic()
+        found: Dict[int, Optional[discord.Member]] = {}
+        missing: List[int] = []
+        for user_id in dict.fromkeys(user_ids):
+            if member := guild.get_member(user_id):
+                found[user_id] = member
+            elif (member := self._get(guild.id, user_id, now)) is not False:
+                found[user_id] = member
+            else:
+                missing.append(user_id)
+
+        if not missing:
+            return found
+
+        log.debug(f"Requesting {len(missing)} members of guild {guild.id}")
+        if self.use_gateway:
+            members = await self._query(guild, missing)
+        else:
+            members = await self._fetch(guild, missing)
+
+        # Users that could not be requested (due to errors) are not cached
+        for user_id, member in members.items():
+            self._put(guild.id, user_id, member)
+        found.update(members)
+
+        return found
+
+    async def _query(
+        self, guild: discord.Guild, user_ids: List[int]
+    ) -> Dict[int, Optional[discord.Member]]:
+        """Request some members through the gateway, in chunks.
+
+        Returns:
+            The members by their user id, or None if they are not in the guild.
+        """
+        members = {}
+        for i in range(0, len(user_ids), QUERY_CHUNK):
+            chunk = user_ids[i : i + QUERY_CHUNK]
+            try:
+                result = await guild.query_members(
+                    user_ids=chunk, limit=len(chunk), cache=False
+                )
+            except Exception:
+                log.exception(f"Failed to query the members of guild {guild.id}")
+                continue
+            members.update(dict.fromkeys(chunk))
+            members.update((x.id, x) for x in result)
+        return members
+
+    async def _fetch(
+        self, guild: discord.Guild, user_ids: List[int]
+    ) -> Dict[int, Optional[discord.Member]]:
+        """Request some members through the API, one by one.
+
+        Returns:
+            The members by their user id, or None if they are not in the guild.
+        """
+        results = await gather_limited(
+            (guild.fetch_member(x) for x in user_ids), self.concurrency
+        )
+        members = {}
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, discord.Member):
+                members[user_id] = result
+            elif isinstance(result, discord.NotFound):
+                members[user_id] = None
+            else:
+                log.error(
+                    f"Failed to fetch member {user_id} of guild {guild.id}",
+                    exc_info=result,
+                )
+        return members
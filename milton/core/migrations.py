@@ -0,0 +1,180 @@
+"""Apply the migrations in the schemas folder to the database"""
+import hashlib
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from milton.core.database import Database
+
+log = logging.getLogger(__name__)
+
+CREATE_MIGRATIONS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    "version INTEGER PRIMARY KEY, "
+    "checksum TEXT NOT NULL, "
+    "applied_on REAL NOT NULL)"
+)
+
+
+class MigrationError(Exception):
+    """Raised when the migrations cannot be applied."""
+
+
+class Migration(NamedTuple):
+    """A single migration, from a .sql file in the schemas folder.
+
+    Attributes:
+        version: The version that the migration brings the database to.
+        path: The path to the .sql file.
+        checksum: The SHA-256 hash of the contents of the file.
+    """
+
+    version: int
+    path: Path
+    checksum: str
+
+    @classmethod
+    def from_path(cls, path: Path) -> "Migration":
+        return cls(int(path.stem), path, hashlib.sha256(path.read_bytes()).hexdigest())
+
+
+def find_migrations(path: Path) -> List[Migration]:
+    """Find all the migrations in some folder, sorted by version.
+
+    Migrations are the .sql files named after their version, which is just
+    an integer.
+
+    Raises:
+        MigrationError: If some .sql file is not named after a version.
+    """
+    migrations = []
+    for file in path.glob("*.sql"):
+        if not file.stem.isdigit():
+            raise MigrationError(f"Migration {file.name} is not named like a version.")
+        migrations.append(Migration.from_path(file))
+
+    migrations.sort(key=lambda x: x.version)
+    return migrations
+
+
+async def _table_exists(db: Database, name: str) -> bool:
+    async with db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", (name,)
+    ) as cursor:
+        return await cursor.fetchone() is not None
+
+
+async def applied_migrations(
+    db: Database, migrations: List[Migration]
+) -> Dict[int, str]:
+    """Get the versions of the migrations applied to the database.
+
+    Databases migrated before migrations were tracked one by one only know
+    their latest version: all migrations up to it are considered applied,
+    with the checksums that they have now.
+
+    Returns:
+        A dictionary of versions to the checksums they had when applied.
+    """
+    if await _table_exists(db, "schema_migrations"):
+        async with db.execute("SELECT version, checksum FROM schema_migrations") as c:
+            applied = {version: checksum async for version, checksum in c}
+        if applied:
+            return applied
+
+    if not await _table_exists(db, "version"):
+        # A brand new database
+        return {}
+
+    async with db.execute("SELECT version FROM version") as cursor:
+        (legacy_version,) = await cursor.fetchone()
+
+    return {x.version: x.checksum for x in migrations if x.version <= legacy_version}
+
+
+async def _apply(db: Database, migration: Migration):
+    # `executescript` does not take parameters, but these are just
+    # an integer and a hex string.
+    script = (
+        "BEGIN;\n"
+        f"{migration.path.read_text()}\n;\n"
+        "INSERT INTO schema_migrations (version, checksum, applied_on) "
+        f"VALUES ({migration.version}, '{migration.checksum}', {time.time()});\n"
+        f"UPDATE version SET version = {migration.version};\n"
+        "COMMIT;"
+    )
+    try:
+        await db.executescript(script)
+    except Exception:
+        # Errors leave the transaction open: undo the whole step
+        await db.execute("ROLLBACK")
+        raise
+
+
+async def migrate(
+    db: Database, migrations: List[Migration], dry_run: bool = False
+) -> List[Migration]:
+    """Bring the database to the latest version.
+
+    Every migration that was not applied yet is applied, in order. Each of
+    them (and the record that it was applied) is a single transaction, so
+    a failing migration leaves the database as it was before it.
+
+    Args:
+        db: The database to migrate.
+        migrations: All of the migrations, sorted by version.
+        dry_run: If True, only find the migrations to apply.
+
+    Returns:
+        The migrations that were (or would be) applied.
+
+    Raises:
+        MigrationError: If some migration fails.
+    """
+    applied = await applied_migrations(db, migrations)
+
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            log.warning(
+                f"Migration {migration.path.name} was changed after being applied."
+            )
+
+    known = {x.version for x in migrations}
+    if unknown := sorted(set(applied) - known):
+        log.warning(f"The DB has migrations that I do not know about: {unknown}")
+
+    pending = [x for x in migrations if x.version not in applied]
+    if not pending:
+        log.info("No migrations to apply.")
+        return []
+
+    names = ", ".join(x.path.name for x in pending)
+    if dry_run:
+        log.info(f"Would apply {len(pending)} migration(s): {names}")
+        return pending
+
+    log.info(f"Applying {len(pending)} migration(s): {names}")
+    await db.execute(CREATE_MIGRATIONS_TABLE)
+    # Record what older databases already had, so they are not applied again
+    await db.executemany(
+        "INSERT OR IGNORE INTO schema_migrations (version, checksum, applied_on) "
+        "VALUES (:version, :checksum, :applied_on)",
+        [(version, checksum, time.time()) for version, checksum in applied.items()],
+    )
+
+    for migration in pending:
+        log.debug(f"Applying migration {migration.path.name}...")
+        start = time.perf_counter()
+        try:
+            await _apply(db, migration)
+        except Exception as e:
+            raise MigrationError(f"Migration {migration.path.name} failed: {e}") from e
+        log.info(
+            f"Applied migration {migration.path.name} "
+            f"in {time.perf_counter() - start:.2f}s."
+        )
+
+    log.info("Done migrating database to new schema.")
+    return pending
@@ -0,0 +1,118 @@
+"""A registry of the SQL statements that Milton runs, and their query plans"""
+import logging
+from typing import TYPE_CHECKING, Dict, List, NamedTuple
+
+if TYPE_CHECKING:
+    from milton.core.database import Database
+
+log = logging.getLogger(__name__)
+
+
+class Query(NamedTuple):
+    """A registered SQL statement.
+
+    Attributes:
+        name: A short name for the statement, used in the timings.
+        sql: The SQL of the statement.
+        hot: Whether the statement runs often (or on large tables), and so
+            must never scan a whole table.
+    """
+
+    name: str
+    sql: str
+    hot: bool
+
+
+REGISTRY: Dict[str, Query] = {}
+"""The registered statements, by their SQL."""
+
+
+class QueryPlanError(Exception):
+    """Raised when a hot query would scan a whole table."""
+
+
+def query(name: str, sql: str, hot: bool = False) -> str:
+    """Register a SQL statement.
+
+    Registered statements are timed under their name, and their query plans
+    can be checked with `check_query_plans`.
+
+    Args:
+        name: A short name for the statement.
+        sql: The SQL of the statement.
+        hot: Whether the statement must never scan a whole table.
+
+    Returns:
+        The SQL, unchanged, so this can wrap the definition of a statement.
+    """
+    REGISTRY[sql] = Query(name, sql, hot)
+    return sql
+
+
+def name_of(sql: str) -> str:
+    """Get the name of a statement, or a shortened version of unregistered ones."""
+    if registered := REGISTRY.get(sql):
+        return registered.name
+    return " ".join(sql.split())[:60]
+
+
+class _NullParameters(dict):
+    # Any named parameter is NULL: it is enough to plan the query
+    def __missing__(self, key):
+        return None
+
+
+async def explain(db: "Database", sql: str) -> List[str]:
+    """Get the query plan of a statement, one step per line."""
+    if ":" in sql:
+        parameters = _NullParameters()
+    else:
+        parameters = (None,) * sql.count("?")
+
+    async with db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters) as cursor:
+        return [detail async for _, _, _, detail in cursor]
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """Find the steps of a query plan that scan a whole table."""
+    return [
+        step
+        for step in plan
+        if step.startswith("SCAN ")
+        and "USING" not in step
+        and "VIRTUAL TABLE" not in step
+        and not step.startswith(("SCAN CONSTANT ROW", "SCAN ("))
+    ]
+
+
+async def check_query_plans(
+    db: "Database", strict: bool = False
+) -> Dict[Query, List[str]]:
+    """Check the query plans of all registered statements.
+
+    Args:
+        db: The database to plan the statements on.
+        strict: If True, raise if a hot statement scans a whole table.
+
+    Returns:
+        A dictionary of the registered statements to their query plans.
+
+    Raises:
+        QueryPlanError: If strict, and a hot statement scans a whole table.
+    """
+    plans = {}
+    problems = []
+    for registered in REGISTRY.values():
+        plan = await explain(db, registered.sql)
+        plans[registered] = plan
+        if registered.hot and (scans := full_scans(plan)):
+            problems.append(f"{registered.name}: {'; '.join(scans)}")
+
+    for problem in problems:
+        log.warning(f"Hot query scans a whole table: {problem}")
+    if strict and problems:
+        raise QueryPlanError(
+            f"{len(problems)} hot queries scan whole tables: " + ", ".join(problems)
+        )
+
+    return plans
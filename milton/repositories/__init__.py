@@ -0,0 +1,49 @@
+"""Where Milton keeps its data.
+
+Each repository has the same async interface in all of its implementations:
+one backed by the SQLite database, used by the bot, and one that only lives
+in memory, to test (and time) the cogs without any disk I/O.
+"""
+from milton.repositories.birthdays import (
+    Birthday,
+    BirthdayRepository,
+    MemoryBirthdayRepository,
+    SqliteBirthdayRepository,
+)
+from milton.repositories.feeds import (
+    Feed,
+    FeedRepository,
+    MemoryFeedRepository,
+    SqliteFeedRepository,
+)
+from milton.repositories.guild_settings import (
+    GuildSettings,
+    GuildSettingsRepository,
+    MemoryGuildSettingsRepository,
+    SqliteGuildSettingsRepository,
+)
+from milton.repositories.reminders import (
+    MemoryReminderRepository,
+    Reminder,
+    ReminderRepository,
+    SqliteReminderRepository,
+)
+
+__all__ = [
+    "Birthday",
+    "BirthdayRepository",
+    "MemoryBirthdayRepository",
+    "SqliteBirthdayRepository",
+    "Feed",
+    "FeedRepository",
+    "MemoryFeedRepository",
+    "SqliteFeedRepository",
+    "GuildSettings",
+    "GuildSettingsRepository",
+    "MemoryGuildSettingsRepository",
+    "SqliteGuildSettingsRepository",
+    "Reminder",
+    "ReminderRepository",
+    "MemoryReminderRepository",
+    "SqliteReminderRepository",
+]
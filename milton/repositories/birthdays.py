@@ -0,0 +1,491 @@
+"""Where the birthdays of the users are kept"""
+import datetime as dt
+import json
+from abc import ABC, abstractmethod
+from calendar import isleap
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from milton.core.database import Database
+from milton.core.queries import query
+
+# Birthdays are placed on the calendar of a leap year, so that everyone (even
+# people born on the 29th of February) has a day of the year.
+LEAP_YEAR = 2000
+
+
+def day_of_year(month: int, day: int) -> int:
+    """Returns the day of the year of a day, as if it was in a leap year.
+
+    Raises:
+        ValueError if the day does not exist.
+    """
+    return dt.date(LEAP_YEAR, month, day).timetuple().tm_yday
+
+
+class Birthday:
+    """The birthday of someone, with an optional year of birth.
+
+    Args:
+        day: The day of the month.
+        month: The month, from 1 to 12.
+        year: The year of birth, if known.
+
+    Raises:
+        ValueError if the day does not exist. The 29th of February is a
+        valid day without a year, or with a leap year.
+    """
+
+    __slots__ = ("day", "month", "year")
+
+    def __init__(self, day: int, month: int, year: Optional[int] = None) -> None:
+        dt.date(year or LEAP_YEAR, month, day)  # Raises if not a real day
+
+        self.day: int = day
+        self.month: int = month
+        self.year: Optional[int] = year
+
+    def __str__(self) -> str:
+        if self.year:
+            return f"{self.day:02}-{self.month:02}-{self.year:04}"
+        return f"{self.day:02}-{self.month:02}"
+
+    def __repr__(self) -> str:
+        return f"Birthday(day={self.day}, month={self.month}, year={self.year})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Birthday):
+            return NotImplemented
+        return (self.day, self.month, self.year) == (other.day, other.month, other.year)
+
+    @property
+    def doy(self) -> int:
+        """The day of the year of this birthday, as if it was in a leap year."""
+        return day_of_year(self.month, self.day)
+
+    def occurrence(self, year: int) -> dt.date:
+        """The date when this birthday is celebrated in some year.
+
+        Birthdays on the 29th of February are celebrated on the 28th in
+        non-leap years.
+        """
+        if self.month == 2 and self.day == 29 and not isleap(year):
+            return dt.date(year, 2, 28)
+        return dt.date(year, self.month, self.day)
+
+    def is_today(self, today: dt.date) -> bool:
+        """Checks if this birthday is celebrated today."""
+        return self.occurrence(today.year) == today
+
+    def days_until(self, today: dt.date) -> int:
+        """The number of days from today to the next time this birthday is celebrated.
+
+        Returns 0 if the birthday is today.
+        """
+        this_year = self.occurrence(today.year)
+        if this_year >= today:
+            return (this_year - today).days
+        return (self.occurrence(today.year + 1) - today).days
+
+    def age(self, today: dt.date) -> Optional[int]:
+        """How old is the person born on this birthday today.
+
+        Returns None if the year of birth is not known. The age is negative for
+        people that are yet to be born.
+        """
+        if not self.year:
+            return None
+        return today.year - self.year - (today < self.occurrence(today.year))
+
+
+def _celebrated_on(today: dt.date) -> List[int]:
+    # People born on the 29th of February celebrate on the 28th in non-leap years
+    if today.month == 2 and today.day == 28 and not isleap(today.year):
+        return [28, 29]
+    return [today.day]
+
+
+class BirthdayRepository(ABC):
+    """The birthdays of the users, one per user in each guild.
+
+    All implementations behave the same, so the cogs do not need to know
+    where the birthdays are actually kept.
+    """
+
+    @abstractmethod
+    async def set(self, guild_id: int, user_id: int, birthday: Birthday):
+        """Set the birthday of a user in a guild, replacing the old one."""
+
+    @abstractmethod
+    async def set_many(self, guild_id: int, birthdays: Dict[int, Birthday]):
+        """Set the birthdays of many users of a guild at once.
+
+        Args:
+            guild_id: The id of the guild.
+            birthdays: A dictionary of user ids to their birthdays.
+        """
+
+    @abstractmethod
+    async def remove(self, guild_id: int, user_id: int) -> bool:
+        """Forget the birthday of a user in a guild.
+
+        Returns:
+            True if there was a birthday to forget.
+        """
+
+    @abstractmethod
+    async def celebrating(
+        self, today: dt.date, guild_ids: List[int]
+    ) -> List[Tuple[int, int, Birthday]]:
+        """Find who celebrates their birthday on some day.
+
+        Args:
+            today: The day to check for.
+            guild_ids: The ids of the guilds to check.
+
+        Returns:
+            A list of (guild_id, user_id, birthday), in no particular order.
+        """
+
+    @abstractmethod
+    async def count(self, guild_id: int, today: dt.date) -> Tuple[int, int]:
+        """Count the birthdays of a guild.
+
+        Returns:
+            A tuple with the number of birthdays, and how many of them are
+            from today to the end of the year.
+        """
+
+    @abstractmethod
+    async def upcoming(
+        self, guild_id: int, today: dt.date, limit: int, offset: int = 0
+    ) -> List[Tuple[int, Birthday, int]]:
+        """Get a slice of the birthdays of a guild, from the next one onward.
+
+        Birthdays later this year come first, then the ones that wrap around
+        to the next year. Ties are broken by user id.
+
+        Args:
+            guild_id: The id of the guild.
+            today: The day to count from.
+            limit: How many birthdays to get at most.
+            offset: How many birthdays to skip.
+
+        Returns:
+            A list of (user_id, birthday, days until the birthday).
+        """
+
+    @abstractmethod
+    async def stats(
+        self, guild_id: int, today: dt.date, days: int
+    ) -> Tuple[List[int], List[int], List[int]]:
+        """Get some statistics on the birthdays of a guild.
+
+        Args:
+            guild_id: The id of the guild.
+            today: The day to count from.
+            days: How many of the next days to count the birthdays of.
+
+        Returns:
+            A tuple with the number of birthdays in each month (from January),
+            on each weekday of this year (from Monday), and in each of the
+            next `days` days (from today).
+        """
+
+    @abstractmethod
+    def of_guild(self, guild_id: int) -> AsyncIterator[Tuple[int, Birthday]]:
+        """Iterate over the (user_id, birthday) of all the users of a guild."""
+
+
+# Users have one birthday per server: setting it again replaces the old one
+UPSERT_BIRTHDAY = query(
+    "birthday.upsert",
+    "INSERT INTO birthdays (guild_id, user_id, year, day, month, doy) "
+    "VALUES (:guild_id, :user_id, :year, :day, :month, :doy) "
+    "ON CONFLICT (guild_id, user_id) DO UPDATE SET year = excluded.year, "
+    "day = excluded.day, month = excluded.month, doy = excluded.doy",
+    hot=True,
+)
+DELETE_BIRTHDAY = query(
+    "birthday.delete",
+    "DELETE FROM birthdays WHERE guild_id = :guild_id AND user_id = :user_id",
+    hot=True,
+)
+# Feb 29th birthdays are also found on Feb 28th, when other_day is 29
+TODAYS_BIRTHDAYS = query(
+    "birthday.today",
+    "SELECT guild_id, user_id, day, month, year FROM birthdays "
+    "WHERE month = :month AND day IN (:day, :other_day) "
+    "AND guild_id IN (SELECT value FROM json_each(:guild_ids))",
+    hot=True,
+)
+EXPORT_BIRTHDAYS = query(
+    "birthday.export",
+    "SELECT user_id, day, month, year FROM birthdays WHERE guild_id = :guild_id",
+    hot=True,
+)
+
+# The two halves of the `show` listing, both in index order: the birthdays
+# from today to the end of the year, then those from the start of the year.
+# In non-leap years the nonexistent 29th of February (day 60) is skipped when
+# counting the days, so 29-02 birthdays fall on the 28th.
+UPCOMING_BIRTHDAYS = query(
+    "birthday.upcoming",
+    "SELECT user_id, year, day, month, "
+    "doy - :today - (doy >= 60 AND :today <= 60) * :skip_this "
+    "FROM birthdays WHERE guild_id = :guild_id AND doy >= :today "
+    "ORDER BY doy, user_id LIMIT :limit OFFSET :offset",
+    hot=True,
+)
+WRAPPED_BIRTHDAYS = query(
+    "birthday.wrapped",
+    "SELECT user_id, year, day, month, "
+    "doy - :today + 366 - (:today <= 60) * :skip_this - (doy >= 60) * :skip_next "
+    "FROM birthdays WHERE guild_id = :guild_id AND doy < :today "
+    "ORDER BY doy, user_id LIMIT :limit OFFSET :offset",
+    hot=True,
+)
+COUNT_BIRTHDAYS = query(
+    "birthday.count",
+    "SELECT COUNT(*), TOTAL(doy >= :today) FROM birthdays "
+    "WHERE guild_id = :guild_id AND doy IS NOT NULL",
+    hot=True,
+)
+
+BIRTHDAYS_PER_MONTH = query(
+    "birthday.stats_months",
+    "SELECT month, COUNT(*) FROM birthdays WHERE guild_id = :guild_id GROUP BY month",
+    hot=True,
+)
+BIRTHDAYS_PER_WEEKDAY = query(
+    "birthday.stats_weekdays",
+    "SELECT CAST(strftime('%w', printf('%04d-%02d-%02d', :year, month, "
+    "CASE WHEN month = 2 AND day = 29 AND NOT :leap THEN 28 ELSE day END)) AS INT) "
+    "AS weekday, COUNT(*) FROM birthdays WHERE guild_id = :guild_id GROUP BY weekday",
+    hot=True,
+)
+UPCOMING_BIRTHDAYS_PER_DAY = query(
+    "birthday.stats_upcoming",
+    "SELECT CASE WHEN doy >= :today "
+    "THEN doy - :today - (doy >= 60 AND :today <= 60) * :skip_this "
+    "ELSE doy - :today + 366 - (:today <= 60) * :skip_this - (doy >= 60) * :skip_next "
+    "END AS days, COUNT(*) FROM birthdays WHERE guild_id = :guild_id "
+    "AND doy IS NOT NULL GROUP BY days HAVING days < :days",
+    hot=True,
+)
+
+
+def _calendar_parameters(today: dt.date) -> dict:
+    return {
+        "year": today.year,
+        "leap": int(isleap(today.year)),
+        "today": day_of_year(today.month, today.day),
+        "skip_this": int(not isleap(today.year)),
+        "skip_next": int(not isleap(today.year + 1)),
+    }
+
+
+class SqliteBirthdayRepository(BirthdayRepository):
+    """Birthdays kept in the `birthdays` table of the database.
+
+    Args:
+        db: The database with the `birthdays` table.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db: Database = db
+
+    async def set(self, guild_id: int, user_id: int, birthday: Birthday):
+        await self.db.write(
+            UPSERT_BIRTHDAY,
+            (
+                guild_id,
+                user_id,
+                birthday.year,
+                birthday.day,
+                birthday.month,
+                birthday.doy,
+            ),
+        )
+
+    async def set_many(self, guild_id: int, birthdays: Dict[int, Birthday]):
+        # A single transaction for all of the rows
+        await self.db.write_many(
+            UPSERT_BIRTHDAY,
+            [
+                (guild_id, user_id, x.year, x.day, x.month, x.doy)
+                for user_id, x in birthdays.items()
+            ],
+        )
+
+    async def remove(self, guild_id: int, user_id: int) -> bool:
+        return await self.db.write(DELETE_BIRTHDAY, (guild_id, user_id)) > 0
+
+    async def celebrating(
+        self, today: dt.date, guild_ids: List[int]
+    ) -> List[Tuple[int, int, Birthday]]:
+        days = _celebrated_on(today)
+        async with self.db.read(
+            TODAYS_BIRTHDAYS,
+            {
+                "month": today.month,
+                "day": days[0],
+                "other_day": days[-1],
+                "guild_ids": json.dumps(list(guild_ids)),
+            },
+        ) as cursor:
+            return [
+                (guild_id, user_id, Birthday(*date))
+                async for guild_id, user_id, *date in cursor
+            ]
+
+    async def count(self, guild_id: int, today: dt.date) -> Tuple[int, int]:
+        params = {"guild_id": guild_id, **_calendar_parameters(today)}
+        async with self.db.read(COUNT_BIRTHDAYS, params) as cursor:
+            total, upcoming = await cursor.fetchone()
+        return total, int(upcoming)
+
+    async def upcoming(
+        self, guild_id: int, today: dt.date, limit: int, offset: int = 0
+    ) -> List[Tuple[int, Birthday, int]]:
+        params = {"guild_id": guild_id, **_calendar_parameters(today)}
+
+        async with self.db.read(COUNT_BIRTHDAYS, params) as cursor:
+            _, this_year = await cursor.fetchone()
+        this_year = int(this_year)
+
+        # Birthdays later this year come first, then the ones that wrap
+        # around to the next year.
+        rows = []
+        if offset < this_year:
+            async with self.db.read(
+                UPCOMING_BIRTHDAYS, {**params, "limit": limit, "offset": offset}
+            ) as cursor:
+                rows += await cursor.fetchall()
+            offset = 0
+        else:
+            offset -= this_year
+        if len(rows) < limit:
+            async with self.db.read(
+                WRAPPED_BIRTHDAYS,
+                {**params, "limit": limit - len(rows), "offset": offset},
+            ) as cursor:
+                rows += await cursor.fetchall()
+
+        return [
+            (user_id, Birthday(day, month, year), days_until)
+            for user_id, year, day, month, days_until in rows
+        ]
+
+    async def stats(
+        self, guild_id: int, today: dt.date, days: int
+    ) -> Tuple[List[int], List[int], List[int]]:
+        params = {"guild_id": guild_id, "days": days, **_calendar_parameters(today)}
+
+        months = [0] * 12
+        async with self.db.read(BIRTHDAYS_PER_MONTH, params) as cursor:
+            async for month, count in cursor:
+                months[month - 1] = count
+
+        weekdays = [0] * 7
+        async with self.db.read(BIRTHDAYS_PER_WEEKDAY, params) as cursor:
+            async for weekday, count in cursor:
+                # SQLite starts the week on Sunday
+                weekdays[(weekday - 1) % 7] = count
+
+        upcoming = [0] * days
+        async with self.db.read(UPCOMING_BIRTHDAYS_PER_DAY, params) as cursor:
+            async for day, count in cursor:
+                upcoming[day] = count
+
+        return months, weekdays, upcoming
+
+    async def of_guild(self, guild_id: int) -> AsyncIterator[Tuple[int, Birthday]]:
+        # Rows go straight from the cursor to the caller
+        async with self.db.read(EXPORT_BIRTHDAYS, (guild_id,)) as cursor:
+            async for user_id, day, month, year in cursor:
+                yield user_id, Birthday(day, month, year)
+
+
+class MemoryBirthdayRepository(BirthdayRepository):
+    """Birthdays kept in memory, and lost when the bot stops.
+
+    Useful to test (and time) the cogs without touching the disk.
+    """
+
+    def __init__(self) -> None:
+        self._birthdays: Dict[int, Dict[int, Birthday]] = {}
+        """The birthdays of each guild, by user id."""
+        self._by_day: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+        """The (guild_id, user_id) born on each (month, day)."""
+
+    def _put(self, guild_id: int, user_id: int, birthday: Birthday):
+        self._drop(guild_id, user_id)
+        self._birthdays.setdefault(guild_id, {})[user_id] = birthday
+        self._by_day.setdefault((birthday.month, birthday.day), set()).add(
+            (guild_id, user_id)
+        )
+
+    def _drop(self, guild_id: int, user_id: int) -> bool:
+        old = self._birthdays.get(guild_id, {}).pop(user_id, None)
+        if old is None:
+            return False
+        self._by_day[old.month, old.day].discard((guild_id, user_id))
+        return True
+
+    async def set(self, guild_id: int, user_id: int, birthday: Birthday):
+        self._put(guild_id, user_id, birthday)
+
+    async def set_many(self, guild_id: int, birthdays: Dict[int, Birthday]):
+        for user_id, birthday in birthdays.items():
+            self._put(guild_id, user_id, birthday)
+
+    async def remove(self, guild_id: int, user_id: int) -> bool:
+        return self._drop(guild_id, user_id)
+
+    async def celebrating(
+        self, today: dt.date, guild_ids: List[int]
+    ) -> List[Tuple[int, int, Birthday]]:
+        guild_ids = set(guild_ids)
+        return [
+            (guild_id, user_id, self._birthdays[guild_id][user_id])
+            for day in _celebrated_on(today)
+            for guild_id, user_id in self._by_day.get((today.month, day), ())
+            if guild_id in guild_ids
+        ]
+
+    async def count(self, guild_id: int, today: dt.date) -> Tuple[int, int]:
+        birthdays = self._birthdays.get(guild_id, {}).values()
+        today_doy = day_of_year(today.month, today.day)
+        return len(birthdays), sum(x.doy >= today_doy for x in birthdays)
+
+    async def upcoming(
+        self, guild_id: int, today: dt.date, limit: int, offset: int = 0
+    ) -> List[Tuple[int, Birthday, int]]:
+        today_doy = day_of_year(today.month, today.day)
+        # The same order as the halves of the SQLite implementation
+        ordered = sorted(
+            self._birthdays.get(guild_id, {}).items(),
+            key=lambda x: ((doy := x[1].doy) < today_doy, doy, x[0]),
+        )
+        return [
+            (user_id, birthday, birthday.days_until(today))
+            for user_id, birthday in ordered[offset : offset + limit]
+        ]
+
+    async def stats(
+        self, guild_id: int, today: dt.date, days: int
+    ) -> Tuple[List[int], List[int], List[int]]:
+        months = [0] * 12
+        weekdays = [0] * 7
+        upcoming = [0] * days
+        for birthday in self._birthdays.get(guild_id, {}).values():
+            months[birthday.month - 1] += 1
+            weekdays[birthday.occurrence(today.year).weekday()] += 1
+            if (until := birthday.days_until(today)) < days:
+                upcoming[until] += 1
+
+        return months, weekdays, upcoming
+
+    async def of_guild(self, guild_id: int) -> AsyncIterator[Tuple[int, Birthday]]:
+        for user_id, birthday in list(self._birthdays.get(guild_id, {}).items()):
+            yield user_id, birthday
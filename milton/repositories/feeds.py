@@ -0,0 +1,450 @@
+"""Where the feeds, the channels subscribed to them and their seen items are kept"""
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from milton.core.database import Database, Statement
+from milton.core.queries import query
+
+
+class Feed(NamedTuple):
+    """A feed, and how to poll it.
+
+    Attributes:
+        feed_id: The id of the feed.
+        url: The URL of the feed.
+        title: The title of the feed, if known.
+        poll_interval: How often to poll the feed, in seconds.
+        etag: The ETag of the last response, for conditional requests.
+        last_modified: The Last-Modified of the last response, for conditional
+            requests.
+    """
+
+    feed_id: int
+    url: str
+    title: Optional[str]
+    poll_interval: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class FeedRepository(ABC):
+    """The feeds that channels are subscribed to.
+
+    Every feed is kept once, no matter how many channels are subscribed to
+    it, together with the ids of the items that were already sent, and of
+    the ones that could not be sent to some channel yet.
+    """
+
+    @abstractmethod
+    async def subscribe(
+        self,
+        url: str,
+        guild_id: int,
+        channel_id: int,
+        title: Optional[str],
+        interval: int,
+        now: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        seen: Optional[List[str]] = None,
+    ):
+        """Subscribe a channel to a feed, adding the feed if it is new.
+
+        Args:
+            url: The URL of the feed.
+            guild_id: The id of the guild of the channel.
+            channel_id: The id of the channel.
+            title: The title of the feed.
+            interval: How often to poll the feed, in seconds.
+            now: The current UNIX timestamp.
+            etag: The ETag of the response, if any.
+            last_modified: The Last-Modified of the response, if any.
+            seen: The ids of the items in the feed now, that should not be sent.
+        """
+
+    @abstractmethod
+    async def feed_id(self, url: str) -> Optional[int]:
+        """Get the id of a feed from its URL, or None if it is unknown."""
+
+    @abstractmethod
+    async def unsubscribe(self, feed_id: int, channel_id: int) -> bool:
+        """Unsubscribe a channel from a feed.
+
+        Feeds that nobody follows anymore are removed.
+
+        Returns:
+            True if the channel was subscribed to the feed.
+        """
+
+    @abstractmethod
+    async def of_guild(self, guild_id: int) -> List[Tuple[Optional[str], str, int]]:
+        """Get the (title, url, channel_id) of the feeds followed in a guild."""
+
+    @abstractmethod
+    async def due(self, now: float) -> List[Feed]:
+        """Get the feeds that are due to be polled."""
+
+    @abstractmethod
+    async def seen(self, feed_id: int) -> Set[str]:
+        """Get the ids of the items of a feed that were already sent."""
+
+    @abstractmethod
+    async def unsent(self, feed_id: int) -> Dict[int, Set[str]]:
+        """Get the ids of the items of a feed not sent yet, by channel id."""
+
+    @abstractmethod
+    async def channels(self, feed_id: int) -> List[int]:
+        """Get the ids of the channels subscribed to a feed."""
+
+    @abstractmethod
+    async def record_poll(
+        self,
+        feed: Feed,
+        now: float,
+        new_items: List[str],
+        current_items: Optional[List[str]] = None,
+        unsent: Optional[Dict[int, List[str]]] = None,
+    ):
+        """Save the outcome of polling a feed, all at once.
+
+        Args:
+            feed: The feed, with its new title, interval and headers.
+            now: When the feed was polled, as a UNIX timestamp.
+            new_items: The ids of the new items, that were sent (or kept in
+                `unsent`, for the channels that they could not be sent to).
+            current_items: The ids of all the items in the feed now, if it
+                was fetched. Seen items not in the feed anymore are dropped.
+            unsent: The ids of the items that could not be sent yet, by
+                channel id, replacing the previous ones. If None, the previous
+                ones are kept.
+        """
+
+
+INSERT_FEED = query(
+    "feed.insert",
+    "INSERT INTO feeds "
+    "(url, title, poll_interval, next_poll, last_polled, etag, last_modified) "
+    "VALUES (:url, :title, :interval, :next_poll, :now, :etag, :last_modified) "
+    "ON CONFLICT (url) DO NOTHING",
+)
+FEED_ID = query("feed.id", "SELECT feed_id FROM feeds WHERE url = :url", hot=True)
+INSERT_SEEN_BY_URL = query(
+    "feed.insert_seen_by_url",
+    "INSERT OR IGNORE INTO feed_seen (feed_id, item_id, seen_on) "
+    "VALUES ((SELECT feed_id FROM feeds WHERE url = :url), :item_id, :now)",
+    hot=True,
+)
+INSERT_SUBSCRIPTION = query(
+    "feed.insert_subscription",
+    "INSERT OR IGNORE INTO feed_subscriptions (feed_id, guild_id, channel_id) "
+    "VALUES ((SELECT feed_id FROM feeds WHERE url = :url), :guild_id, :channel_id)",
+)
+DELETE_SUBSCRIPTION = query(
+    "feed.delete_subscription",
+    "DELETE FROM feed_subscriptions "
+    "WHERE feed_id = :feed_id AND channel_id = :channel_id",
+)
+GUILD_FEEDS = query(
+    "feed.guild_feeds",
+    "SELECT feeds.title, feeds.url, feed_subscriptions.channel_id "
+    "FROM feed_subscriptions JOIN feeds USING (feed_id) "
+    "WHERE feed_subscriptions.guild_id = :guild_id",
+    hot=True,
+)
+DUE_FEEDS = query(
+    "feed.due",
+    "SELECT feed_id, url, title, poll_interval, etag, last_modified "
+    "FROM feeds WHERE next_poll <= :now",
+    hot=True,
+)
+SEEN_ITEMS = query(
+    "feed.seen_items",
+    "SELECT item_id FROM feed_seen WHERE feed_id = :feed_id",
+    hot=True,
+)
+INSERT_SEEN = query(
+    "feed.insert_seen",
+    "INSERT OR IGNORE INTO feed_seen (feed_id, item_id, seen_on) "
+    "VALUES (:feed_id, :item_id, :now)",
+    hot=True,
+)
+# Items that fell off the feed will not come back
+PRUNE_SEEN = query(
+    "feed.prune_seen",
+    "DELETE FROM feed_seen WHERE feed_id = :feed_id "
+    "AND item_id NOT IN (SELECT value FROM json_each(:current))",
+    hot=True,
+)
+UPDATE_FEED = query(
+    "feed.update",
+    "UPDATE feeds SET title = :title, poll_interval = :interval, "
+    "next_poll = :next_poll, last_polled = :now, etag = :etag, "
+    "last_modified = :last_modified WHERE feed_id = :feed_id",
+    hot=True,
+)
+UNSENT_ITEMS = query(
+    "feed.unsent_items",
+    "SELECT channel_id, item_id FROM feed_unsent WHERE feed_id = :feed_id",
+    hot=True,
+)
+INSERT_UNSENT = query(
+    "feed.insert_unsent",
+    "INSERT OR IGNORE INTO feed_unsent (feed_id, channel_id, item_id) "
+    "VALUES (:feed_id, :channel_id, :item_id)",
+    hot=True,
+)
+DELETE_UNSENT = query(
+    "feed.delete_unsent",
+    "DELETE FROM feed_unsent WHERE feed_id = :feed_id",
+    hot=True,
+)
+DELETE_CHANNEL_UNSENT = query(
+    "feed.delete_channel_unsent",
+    "DELETE FROM feed_unsent WHERE feed_id = :feed_id AND channel_id = :channel_id",
+)
+FEED_CHANNELS = query(
+    "feed.channels",
+    "SELECT channel_id FROM feed_subscriptions WHERE feed_id = :feed_id",
+    hot=True,
+)
+
+# Remove the feeds (and their seen items) that nobody follows anymore
+DROP_UNUSED_FEEDS = (
+    Statement(
+        query(
+            "feed.drop_unused_seen",
+            "DELETE FROM feed_seen WHERE feed_id NOT IN "
+            "(SELECT feed_id FROM feed_subscriptions)",
+        )
+    ),
+    Statement(
+        query(
+            "feed.drop_unused",
+            "DELETE FROM feeds WHERE feed_id NOT IN "
+            "(SELECT feed_id FROM feed_subscriptions)",
+        )
+    ),
+)
+
+
+class SqliteFeedRepository(FeedRepository):
+    """Feeds kept in the `feeds`, `feed_subscriptions` and `feed_seen` tables.
+
+    Args:
+        db: The database with the feed tables.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db: Database = db
+
+    async def subscribe(
+        self,
+        url: str,
+        guild_id: int,
+        channel_id: int,
+        title: Optional[str],
+        interval: int,
+        now: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        seen: Optional[List[str]] = None,
+    ):
+        # The feed might not exist until this transaction, so look its id up
+        await self.db.transaction(
+            Statement(
+                INSERT_FEED,
+                (url, title, interval, now + interval, now, etag, last_modified),
+            ),
+            Statement(
+                INSERT_SEEN_BY_URL, [(url, x, now) for x in seen or []], many=True
+            ),
+            Statement(INSERT_SUBSCRIPTION, (url, guild_id, channel_id)),
+        )
+
+    async def feed_id(self, url: str) -> Optional[int]:
+        async with self.db.read(FEED_ID, (url,)) as cursor:
+            row = await cursor.fetchone()
+        return None if row is None else row[0]
+
+    async def unsubscribe(self, feed_id: int, channel_id: int) -> bool:
+        removed = await self.db.transaction(
+            Statement(DELETE_CHANNEL_UNSENT, (feed_id, channel_id)),
+            Statement(DELETE_SUBSCRIPTION, (feed_id, channel_id)),
+        )
+        if removed:
+            await self.db.transaction(*DROP_UNUSED_FEEDS)
+        return removed > 0
+
+    async def of_guild(self, guild_id: int) -> List[Tuple[Optional[str], str, int]]:
+        async with self.db.read(GUILD_FEEDS, (guild_id,)) as cursor:
+            return await cursor.fetchall()
+
+    async def due(self, now: float) -> List[Feed]:
+        async with self.db.read(DUE_FEEDS, (now,)) as cursor:
+            return [Feed(*row) async for row in cursor]
+
+    async def seen(self, feed_id: int) -> Set[str]:
+        async with self.db.read(SEEN_ITEMS, (feed_id,)) as cursor:
+            return {row[0] async for row in cursor}
+
+    async def unsent(self, feed_id: int) -> Dict[int, Set[str]]:
+        unsent: Dict[int, Set[str]] = {}
+        async with self.db.read(UNSENT_ITEMS, (feed_id,)) as cursor:
+            async for channel_id, item_id in cursor:
+                unsent.setdefault(channel_id, set()).add(item_id)
+        return unsent
+
+    async def channels(self, feed_id: int) -> List[int]:
+        async with self.db.read(FEED_CHANNELS, (feed_id,)) as cursor:
+            return [row[0] async for row in cursor]
+
+    async def record_poll(
+        self,
+        feed: Feed,
+        now: float,
+        new_items: List[str],
+        current_items: Optional[List[str]] = None,
+        unsent: Optional[Dict[int, List[str]]] = None,
+    ):
+        statements = []
+        if new_items:
+            statements.append(
+                Statement(
+                    INSERT_SEEN, [(feed.feed_id, x, now) for x in new_items], many=True
+                )
+            )
+        if current_items:
+            statements.append(
+                Statement(PRUNE_SEEN, (feed.feed_id, json.dumps(current_items)))
+            )
+        if unsent is not None:
+            statements.append(Statement(DELETE_UNSENT, (feed.feed_id,)))
+            statements.append(
+                Statement(
+                    INSERT_UNSENT,
+                    [
+                        (feed.feed_id, channel_id, x)
+                        for channel_id, items in unsent.items()
+                        for x in items
+                    ],
+                    many=True,
+                )
+            )
+        statements.append(
+            Statement(
+                UPDATE_FEED,
+                (
+                    feed.title,
+                    feed.poll_interval,
+                    now + feed.poll_interval,
+                    now,
+                    feed.etag,
+                    feed.last_modified,
+                    feed.feed_id,
+                ),
+            )
+        )
+        await self.db.transaction(*statements)
+
+
+class MemoryFeedRepository(FeedRepository):
+    """Feeds kept in memory, and lost when the bot stops."""
+
+    def __init__(self) -> None:
+        self._feeds: Dict[int, Feed] = {}
+        self._ids: Dict[str, int] = {}
+        """The id of each feed, by URL."""
+        self._next_poll: Dict[int, float] = {}
+        self._subscriptions: Dict[int, Dict[int, int]] = {}
+        """The subscribed channels of each feed, to the id of their guild."""
+        self._seen: Dict[int, Set[str]] = {}
+        self._unsent: Dict[int, Dict[int, Set[str]]] = {}
+        self._last_id: int = 0
+
+    async def subscribe(
+        self,
+        url: str,
+        guild_id: int,
+        channel_id: int,
+        title: Optional[str],
+        interval: int,
+        now: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        seen: Optional[List[str]] = None,
+    ):
+        if (feed_id := self._ids.get(url)) is None:
+            self._last_id += 1
+            feed_id = self._ids[url] = self._last_id
+            self._feeds[feed_id] = Feed(
+                feed_id, url, title, interval, etag, last_modified
+            )
+            self._next_poll[feed_id] = now + interval
+            self._subscriptions[feed_id] = {}
+            self._seen[feed_id] = set()
+
+        self._seen[feed_id].update(seen or [])
+        self._subscriptions[feed_id].setdefault(channel_id, guild_id)
+
+    async def feed_id(self, url: str) -> Optional[int]:
+        return self._ids.get(url)
+
+    async def unsubscribe(self, feed_id: int, channel_id: int) -> bool:
+        subscriptions = self._subscriptions.get(feed_id)
+        if subscriptions is None or channel_id not in subscriptions:
+            return False
+        del subscriptions[channel_id]
+        self._unsent.get(feed_id, {}).pop(channel_id, None)
+        if not subscriptions:
+            del self._ids[self._feeds.pop(feed_id).url]
+            del self._next_poll[feed_id]
+            del self._subscriptions[feed_id]
+            del self._seen[feed_id]
+            self._unsent.pop(feed_id, None)
+        return True
+
+    async def of_guild(self, guild_id: int) -> List[Tuple[Optional[str], str, int]]:
+        return [
+            (self._feeds[feed_id].title, self._feeds[feed_id].url, channel_id)
+            for feed_id, subscriptions in self._subscriptions.items()
+            for channel_id, subscribed_guild in subscriptions.items()
+            if subscribed_guild == guild_id
+        ]
+
+    async def due(self, now: float) -> List[Feed]:
+        # The same order as the index on the next poll
+        due = sorted(
+            (next_poll, feed_id)
+            for feed_id, next_poll in self._next_poll.items()
+            if next_poll <= now
+        )
+        return [self._feeds[feed_id] for _, feed_id in due]
+
+    async def seen(self, feed_id: int) -> Set[str]:
+        return set(self._seen.get(feed_id, ()))
+
+    async def unsent(self, feed_id: int) -> Dict[int, Set[str]]:
+        return {k: set(v) for k, v in self._unsent.get(feed_id, {}).items()}
+
+    async def channels(self, feed_id: int) -> List[int]:
+        return list(self._subscriptions.get(feed_id, {}))
+
+    async def record_poll(
+        self,
+        feed: Feed,
+        now: float,
+        new_items: List[str],
+        current_items: Optional[List[str]] = None,
+        unsent: Optional[Dict[int, List[str]]] = None,
+    ):
+        if feed.feed_id not in self._feeds:
+            return
+        seen = self._seen[feed.feed_id]
+        seen.update(new_items)
+        if current_items:
+            seen.intersection_update(current_items)
+        if unsent is not None:
+            self._unsent[feed.feed_id] = {k: set(v) for k, v in unsent.items() if v}
+        self._feeds[feed.feed_id] = feed
+        self._next_poll[feed.feed_id] = now + feed.poll_interval
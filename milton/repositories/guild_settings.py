@@ -0,0 +1,118 @@
+"""Where the settings of the guilds are kept"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, NamedTuple, Optional
+
+from milton.core.database import Database
+from milton.core.queries import query
+
+
+class GuildSettings(NamedTuple):
+    """The settings of a guild, as in the `guild_config` table.
+
+    Attributes:
+        guild_id: The id of the guild.
+        bday_shout_channel: Where to announce birthdays, if anywhere.
+        bday_timezone: The timezone of the birthday announcements.
+        bday_hour: The hour (in the timezone) of the birthday announcements.
+    """
+
+    guild_id: int
+    bday_shout_channel: Optional[int] = None
+    bday_timezone: Optional[str] = None
+    bday_hour: Optional[int] = None
+
+
+COLUMNS = GuildSettings._fields
+
+
+def _check_settings(changes: dict):
+    if unknown := set(changes) - set(COLUMNS[1:]):
+        raise ValueError(f"Unknown guild settings: {', '.join(unknown)}")
+
+
+class GuildSettingsRepository(ABC):
+    """The settings of the guilds that changed some of them."""
+
+    @abstractmethod
+    async def all(self) -> List[GuildSettings]:
+        """Get the settings of all the guilds that have some."""
+
+    @abstractmethod
+    async def get(self, guild_id: int) -> Optional[GuildSettings]:
+        """Get the settings of a guild, or None if it never changed them."""
+
+    @abstractmethod
+    async def update(self, guild_id: int, **changes) -> None:
+        """Change some settings of a guild.
+
+        Args:
+            guild_id: The id of the guild.
+            **changes: The new values of the settings, by name.
+
+        Raises:
+            ValueError: If some of the settings do not exist.
+        """
+
+
+ALL_SETTINGS = query(
+    "guild_settings.all", f"SELECT {', '.join(COLUMNS)} FROM guild_config"
+)
+GUILD_SETTINGS = query(
+    "guild_settings.get",
+    f"SELECT {', '.join(COLUMNS)} FROM guild_config WHERE guild_id = :guild_id",
+    hot=True,
+)
+
+
+class SqliteGuildSettingsRepository(GuildSettingsRepository):
+    """Guild settings kept in the `guild_config` table of the database.
+
+    Args:
+        db: The database with the `guild_config` table.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db: Database = db
+
+    async def all(self) -> List[GuildSettings]:
+        async with self.db.read(ALL_SETTINGS) as cursor:
+            return [GuildSettings(*row) async for row in cursor]
+
+    async def get(self, guild_id: int) -> Optional[GuildSettings]:
+        async with self.db.read(GUILD_SETTINGS, (guild_id,)) as cursor:
+            row = await cursor.fetchone()
+        return None if row is None else GuildSettings(*row)
+
+    async def update(self, guild_id: int, **changes) -> None:
+        _check_settings(changes)
+
+        columns = ", ".join(changes)
+        values = ", ".join(f":{x}" for x in changes)
+        updates = ", ".join(f"{x} = excluded.{x}" for x in changes)
+        await self.db.write(
+            (
+                f"INSERT INTO guild_config (guild_id, {columns}) "
+                f"VALUES (:guild_id, {values}) "
+                f"ON CONFLICT (guild_id) DO UPDATE SET {updates}"
+            ),
+            {"guild_id": guild_id, **changes},
+        )
+
+
+class MemoryGuildSettingsRepository(GuildSettingsRepository):
+    """Guild settings kept in memory, and lost when the bot stops."""
+
+    def __init__(self) -> None:
+        self._settings: Dict[int, GuildSettings] = {}
+
+    async def all(self) -> List[GuildSettings]:
+        return list(self._settings.values())
+
+    async def get(self, guild_id: int) -> Optional[GuildSettings]:
+        return self._settings.get(guild_id)
+
+    async def update(self, guild_id: int, **changes) -> None:
+        _check_settings(changes)
+
+        old = self._settings.get(guild_id) or GuildSettings(guild_id)
+        self._settings[guild_id] = old._replace(**changes)
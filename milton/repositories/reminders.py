@@ -0,0 +1,193 @@
+"""Where the pending reminders of the users are kept"""
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from milton.core.database import Database
+from milton.core.queries import query
+
+
+class Reminder(NamedTuple):
+    """Something to remind a user of, at some time.
+
+    Attributes:
+        reminder_id: The id of the reminder (the id of the interaction that
+            made it, so it is unique).
+        user_id: The id of the user to remind.
+        guild_id: The id of the guild where the reminder was made, if any.
+        channel_id: The id of the channel where to send the reminder.
+        due: When to send the reminder, as a UNIX timestamp.
+        created_on: When the reminder was made, as a UNIX timestamp.
+        message: What to remind the user of.
+    """
+
+    reminder_id: int
+    user_id: int
+    guild_id: Optional[int]
+    channel_id: int
+    due: float
+    created_on: float
+    message: str
+
+
+class ReminderRepository(ABC):
+    """The reminders that are yet to be sent."""
+
+    @abstractmethod
+    async def add(self, reminder: Reminder):
+        """Add a reminder."""
+
+    @abstractmethod
+    async def due_before(
+        self, until: float, after: Tuple[float, int], limit: int
+    ) -> List[Tuple[float, int]]:
+        """Find the earliest reminders due before some time, from some point on.
+
+        Reminders are ordered by (due, reminder_id), so the next page of
+        reminders starts right after the last one of the previous page.
+
+        Args:
+            until: A UNIX timestamp.
+            after: Only find the reminders whose (due, reminder_id) comes after
+                this one.
+            limit: How many reminders to find at most.
+
+        Returns:
+            A list of (due, reminder_id), sorted.
+        """
+
+    @abstractmethod
+    async def get_many(self, reminder_ids: Iterable[int]) -> List[Reminder]:
+        """Get some reminders by their id. Unknown ids are skipped."""
+
+    @abstractmethod
+    async def remove_many(self, reminder_ids: Iterable[int]) -> int:
+        """Remove some reminders, returning how many were removed."""
+
+    @abstractmethod
+    async def of_user(self, user_id: int) -> List[Reminder]:
+        """Get the reminders of a user, the earliest first."""
+
+    @abstractmethod
+    async def cancel(self, user_id: int, reminder_id: int) -> bool:
+        """Remove a reminder, only if it belongs to some user.
+
+        Returns:
+            True if the reminder was removed.
+        """
+
+
+COLUMNS = ", ".join(Reminder._fields)
+
+INSERT_REMINDER = query(
+    "reminders.insert",
+    f"INSERT INTO reminders ({COLUMNS}) VALUES "
+    "(:reminder_id, :user_id, :guild_id, :channel_id, :due, :created_on, :message)",
+    hot=True,
+)
+DUE_REMINDERS = query(
+    "reminders.due",
+    "SELECT due, reminder_id FROM reminders "
+    "WHERE due >= :after_due AND due < :until "
+    "AND (due, reminder_id) > (:after_due, :after_id) "
+    "ORDER BY due, reminder_id LIMIT :limit",
+    hot=True,
+)
+GET_REMINDERS = query(
+    "reminders.get",
+    f"SELECT {COLUMNS} FROM reminders "
+    "WHERE reminder_id IN (SELECT value FROM json_each(:reminder_ids))",
+    hot=True,
+)
+DELETE_REMINDERS = query(
+    "reminders.delete",
+    "DELETE FROM reminders "
+    "WHERE reminder_id IN (SELECT value FROM json_each(:reminder_ids))",
+    hot=True,
+)
+USER_REMINDERS = query(
+    "reminders.of_user",
+    f"SELECT {COLUMNS} FROM reminders WHERE user_id = :user_id ORDER BY due",
+    hot=True,
+)
+CANCEL_REMINDER = query(
+    "reminders.cancel",
+    "DELETE FROM reminders WHERE reminder_id = :reminder_id AND user_id = :user_id",
+    hot=True,
+)
+
+
+class SqliteReminderRepository(ReminderRepository):
+    """Reminders kept in the `reminders` table of the database.
+
+    Args:
+        db: The database with the `reminders` table.
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db: Database = db
+
+    async def add(self, reminder: Reminder):
+        await self.db.write(INSERT_REMINDER, reminder)
+
+    async def due_before(
+        self, until: float, after: Tuple[float, int], limit: int
+    ) -> List[Tuple[float, int]]:
+        params = {
+            "after_due": after[0],
+            "after_id": after[1],
+            "until": until,
+            "limit": limit,
+        }
+        async with self.db.read(DUE_REMINDERS, params) as cursor:
+            return [tuple(row) async for row in cursor]
+
+    async def get_many(self, reminder_ids: Iterable[int]) -> List[Reminder]:
+        ids = json.dumps(list(reminder_ids))
+        async with self.db.read(GET_REMINDERS, (ids,)) as cursor:
+            return [Reminder(*row) async for row in cursor]
+
+    async def remove_many(self, reminder_ids: Iterable[int]) -> int:
+        return await self.db.write(DELETE_REMINDERS, (json.dumps(list(reminder_ids)),))
+
+    async def of_user(self, user_id: int) -> List[Reminder]:
+        async with self.db.read(USER_REMINDERS, (user_id,)) as cursor:
+            return [Reminder(*row) async for row in cursor]
+
+    async def cancel(self, user_id: int, reminder_id: int) -> bool:
+        return await self.db.write(CANCEL_REMINDER, (reminder_id, user_id)) > 0
+
+
+class MemoryReminderRepository(ReminderRepository):
+    """Reminders kept in memory, and lost when the bot stops."""
+
+    def __init__(self) -> None:
+        self._reminders: Dict[int, Reminder] = {}
+
+    async def add(self, reminder: Reminder):
+        self._reminders[reminder.reminder_id] = reminder
+
+    async def due_before(
+        self, until: float, after: Tuple[float, int], limit: int
+    ) -> List[Tuple[float, int]]:
+        due = sorted((x.due, x.reminder_id) for x in self._reminders.values())
+        return [x for x in due if x > after and x[0] < until][:limit]
+
+    async def get_many(self, reminder_ids: Iterable[int]) -> List[Reminder]:
+        return [self._reminders[x] for x in set(reminder_ids) if x in self._reminders]
+
+    async def remove_many(self, reminder_ids: Iterable[int]) -> int:
+        return sum(self._reminders.pop(x, None) is not None for x in set(reminder_ids))
+
+    async def of_user(self, user_id: int) -> List[Reminder]:
+        return sorted(
+            (x for x in self._reminders.values() if x.user_id == user_id),
+            key=lambda x: x.due,
+        )
+
+    async def cancel(self, user_id: int, reminder_id: int) -> bool:
+        reminder = self._reminders.get(reminder_id)
+        if reminder is None or reminder.user_id != user_id:
+            return False
+        del self._reminders[reminder_id]
+        return True
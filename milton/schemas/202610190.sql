@@ -0,0 +1,28 @@
+CREATE TABLE feeds (
+    feed_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT,
+    poll_interval INT NOT NULL,
+    next_poll REAL NOT NULL DEFAULT 0,
+    last_polled REAL,
+    etag TEXT,
+    last_modified TEXT
+);
+
+CREATE INDEX feeds_next_poll ON feeds (next_poll);
+
+CREATE TABLE feed_subscriptions (
+    feed_id INT NOT NULL,
+    guild_id INT NOT NULL,
+    channel_id INT NOT NULL,
+    PRIMARY KEY (feed_id, channel_id)
+);
+
+CREATE INDEX feed_subscriptions_guild ON feed_subscriptions (guild_id);
+
+CREATE TABLE feed_seen (
+    feed_id INT NOT NULL,
+    item_id TEXT NOT NULL,
+    seen_on REAL NOT NULL,
+    PRIMARY KEY (feed_id, item_id)
+) WITHOUT ROWID;
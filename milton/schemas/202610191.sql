@@ -0,0 +1,25 @@
+CREATE TABLE xkcd_comics (
+    num INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    alt TEXT,
+    img TEXT
+);
+
+CREATE VIRTUAL TABLE xkcd_comics_fts USING fts5 (
+    title, alt, content = 'xkcd_comics', content_rowid = 'num'
+);
+
+CREATE TRIGGER xkcd_comics_insert AFTER INSERT ON xkcd_comics BEGIN
+    INSERT INTO xkcd_comics_fts (rowid, title, alt) VALUES (new.num, new.title, new.alt);
+END;
+
+CREATE TRIGGER xkcd_comics_delete AFTER DELETE ON xkcd_comics BEGIN
+    INSERT INTO xkcd_comics_fts (xkcd_comics_fts, rowid, title, alt)
+        VALUES ('delete', old.num, old.title, old.alt);
+END;
+
+CREATE TRIGGER xkcd_comics_update AFTER UPDATE ON xkcd_comics BEGIN
+    INSERT INTO xkcd_comics_fts (xkcd_comics_fts, rowid, title, alt)
+        VALUES ('delete', old.num, old.title, old.alt);
+    INSERT INTO xkcd_comics_fts (rowid, title, alt) VALUES (new.num, new.title, new.alt);
+END;
@@ -0,0 +1 @@
+CREATE INDEX birthdays_month_day ON birthdays (month, day);
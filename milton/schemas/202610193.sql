@@ -0,0 +1,7 @@
+-- The day of the year of the birthday, in a leap year (so 29-02 is day 60,
+-- and 01-03 is always day 61).
+ALTER TABLE birthdays ADD COLUMN doy INT;
+
+UPDATE birthdays SET doy = CAST(strftime('%j', printf('2000-%02d-%02d', month, day)) AS INT);
+
+CREATE INDEX birthdays_guild_doy ON birthdays (guild_id, doy, user_id);
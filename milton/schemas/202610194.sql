@@ -0,0 +1,5 @@
+-- When to announce birthdays. NULLs mean the server's local timezone and
+-- the `birthday.when` hour in the config.
+ALTER TABLE guild_config ADD COLUMN bday_timezone TEXT;
+
+ALTER TABLE guild_config ADD COLUMN bday_hour INT;
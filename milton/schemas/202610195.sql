@@ -0,0 +1,29 @@
+-- Every user has (at most) one birthday per server, so (guild_id, user_id)
+-- becomes the primary key of birthdays, and setting a birthday is an UPSERT.
+-- SQLite cannot add a primary key to a table, so it is rebuilt.
+CREATE TABLE birthdays_new (
+    guild_id INT NOT NULL,
+    user_id INT NOT NULL,
+    year INT,
+    day INT NOT NULL,
+    month INT NOT NULL,
+    doy INT NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+
+-- If someone somehow has more than one birthday, keep the latest one.
+INSERT INTO birthdays_new (guild_id, user_id, year, day, month, doy)
+SELECT guild_id, user_id, year, day, month, doy FROM birthdays
+WHERE rowid IN (SELECT max(rowid) FROM birthdays GROUP BY guild_id, user_id)
+    AND guild_id IS NOT NULL AND user_id IS NOT NULL AND doy IS NOT NULL;
+
+DROP TABLE birthdays;
+
+ALTER TABLE birthdays_new RENAME TO birthdays;
+
+CREATE INDEX birthdays_month_day ON birthdays (month, day);
+
+CREATE INDEX birthdays_guild_doy ON birthdays (guild_id, doy, user_id);
+
+-- Looking up (or removing) a user in every server at once
+CREATE INDEX birthdays_user ON birthdays (user_id);
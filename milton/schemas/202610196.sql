@@ -0,0 +1,10 @@
+-- Jobs that run on a schedule (see milton/core/jobs.py), and when they last
+-- ran, so that they keep their schedule across restarts.
+-- `last_run` is the time that the last run was scheduled for, `ran_on` when
+-- it actually started.
+CREATE TABLE jobs (
+    name TEXT PRIMARY KEY,
+    last_run REAL NOT NULL,
+    ran_on REAL NOT NULL,
+    next_run REAL
+);
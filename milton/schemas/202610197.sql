@@ -0,0 +1,16 @@
+-- Reminders that are yet to be sent. Sent reminders are deleted.
+-- The id is the id of the interaction that made the reminder.
+CREATE TABLE reminders (
+    reminder_id INTEGER PRIMARY KEY,
+    user_id INT NOT NULL,
+    guild_id INT,
+    channel_id INT NOT NULL,
+    due REAL NOT NULL,
+    created_on REAL NOT NULL,
+    message TEXT NOT NULL
+);
+
+-- The timer reads the earliest reminders in order
+CREATE INDEX reminders_due ON reminders (due);
+
+CREATE INDEX reminders_user ON reminders (user_id, due);
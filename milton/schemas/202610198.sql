@@ -0,0 +1,8 @@
+-- Items of a feed that could not be sent to a channel yet, to try again on
+-- the next poll. They are dropped once they fall off the feed.
+CREATE TABLE feed_unsent (
+    feed_id INT NOT NULL,
+    channel_id INT NOT NULL,
+    item_id TEXT NOT NULL,
+    PRIMARY KEY (feed_id, channel_id, item_id)
+) WITHOUT ROWID;
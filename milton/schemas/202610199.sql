@@ -0,0 +1,5 @@
+-- Numbers that xkcd has no comic for (like 404), so that the archive sync
+-- does not ask for them again
+CREATE TABLE xkcd_missing (
+    num INTEGER PRIMARY KEY
+);
@@ -0,0 +1,80 @@
+"""Simple in-process metrics, to see how long things take"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Upper bounds (in seconds) of the histogram buckets.
+BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class Timings:
+    """Keeps track of the durations of some operation.
+
+    Durations are summarized (count, total, max) and bucketed in a histogram,
+    so keeping track of a hot operation costs constant memory.
+
+    Args:
+        name: The name of the operation being timed.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.count: int = 0
+        self.total: float = 0
+        self.max: float = 0
+        self.rows: int = 0
+        """The total number of rows read or changed, for database queries."""
+        self.histogram: List[int] = [0] * (len(BUCKETS) + 1)
+        """Counts for each bucket in BUCKETS, plus one for anything slower."""
+
+    def record(self, seconds: float, rows: int = 0) -> None:
+        """Record a new duration, in seconds, and optionally some rows."""
+        self.count += 1
+        self.rows += rows
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.histogram[bisect_left(BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def time(self):
+        """Context manager that records how long its body takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0
+
+    def summary(self) -> List:
+        """Get a row summarizing these timings, for use with `tabulate`."""
+        return [
+            self.name,
+            self.count,
+            self.rows,
+            f"{self.mean * 1000:.2f}",
+            f"{self.max * 1000:.2f}",
+            " ".join(str(x) for x in self.histogram),
+        ]
+
+
+SUMMARY_HEADERS = (
+    "Name",
+    "Count",
+    "Rows",
+    "Mean (ms)",
+    "Max (ms)",
+    "Histogram (" + ", ".join(f"<={x}s" for x in BUCKETS) + ", slower)",
+)
+
+REGISTRY: Dict[str, Timings] = {}
+
+
+def timings(name: str) -> Timings:
+    """Get the Timings with some name, making them if they do not exist."""
+    if name not in REGISTRY:
+        REGISTRY[name] = Timings(name)
+    return REGISTRY[name]
@@ -1,7 +1,7 @@
 import asyncio
 import logging
 from contextlib import suppress
-from typing import Optional
+from typing import Awaitable, Callable, List, Optional
 
 import discord
 from discord import Interaction, Message
@@ -63,6 +63,15 @@ class Paginator(commands.Paginator):
 
         self.interaction = None
 
+    @property
+    def page_count(self) -> int:
+        """The number of pages of this paginator."""
+        return len(self.pages)
+
+    async def get_page(self, number: int) -> str:
+        """Get the content of a page, given its (zero-based) number."""
+        return self.pages[number]
+
     async def paginate(self, interaction: Interaction):
         """Send and start to paginate this message
 
@@ -93,18 +102,20 @@ class Paginator(commands.Paginator):
 
         self.interaction = interaction
 
-        pages = self.pages
-        max_pages = len(pages)
+        max_pages = self.page_count
 
         embed = discord.Embed(
-            description=pages[0], title=self.title, url=self.url, colour=self.colour
+            description=await self.get_page(0),
+            title=self.title,
+            url=self.url,
+            colour=self.colour,
         )
         current_page = 0
 
         if max_pages <= 1 and self.force_embed is False:
             # Only a single page to send. Just send it and stop
             return await interaction.response.send_message(embed.description)
-        elif self.force_embed:
+        elif max_pages <= 1:
             # Forced to send an embed anyway.
             return await interaction.response.send_message(embed=embed)
 
@@ -138,7 +149,7 @@ class Paginator(commands.Paginator):
 
                 log.debug(f"Got first page reaction - changing to page 1/{max_pages}")
 
-                embed.description = pages[current_page]
+                embed.description = await self.get_page(current_page)
                 embed.set_footer(text=f"Page {current_page + 1}/{max_pages}")
                 await message.edit(embed=embed)
 
@@ -150,7 +161,7 @@ class Paginator(commands.Paginator):
                     f"Got last page reaction - changing to page {current_page + 1}/{max_pages}"
                 )
 
-                embed.description = pages[current_page]
+                embed.description = await self.get_page(current_page)
                 embed.set_footer(text=f"Page {current_page + 1}/{max_pages}")
                 await message.edit(embed=embed)
 
@@ -168,7 +179,7 @@ class Paginator(commands.Paginator):
                     f"Got previous page reaction - changing to page {current_page + 1}/{max_pages}"
                 )
 
-                embed.description = pages[current_page]
+                embed.description = await self.get_page(current_page)
                 embed.set_footer(text=f"Page {current_page + 1}/{max_pages}")
                 await message.edit(embed=embed)
 
@@ -186,7 +197,7 @@ class Paginator(commands.Paginator):
                     f"Got next page reaction - changing to page {current_page + 1}/{max_pages}"
                 )
 
-                embed.description = pages[current_page]
+                embed.description = await self.get_page(current_page)
                 embed.set_footer(text=f"Page {current_page + 1}/{max_pages}")
 
                 await message.edit(embed=embed)
@@ -197,3 +208,41 @@ class Paginator(commands.Paginator):
         log.debug("Ending pagination and clearing reactions.")
         with suppress(discord.NotFound):
             await message.clear_reactions()
+
+
+class LazyPaginator(Paginator):
+    """A Paginator that makes its pages only when they need to be shown.
+
+    Useful when the content comes from the database: only the pages that
+    are actually looked at are fetched.
+
+    Args:
+        fetch_lines: A coroutine function that takes the (zero-based) number
+            of a page and returns the lines in that page.
+        page_count: The total number of pages.
+
+    Other arguments are passed to :class:`Paginator`.
+    """
+
+    def __init__(
+        self,
+        fetch_lines: Callable[[int], Awaitable[List[str]]],
+        page_count: int,
+        *args,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.fetch_lines = fetch_lines
+        self._page_count = page_count
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    async def get_page(self, number: int) -> str:
+        lines = await self.fetch_lines(number)
+        if self.prefix:
+            lines = [self.prefix, *lines]
+        if self.suffix:
+            lines = [*lines, self.suffix]
+        return "\n".join(lines)
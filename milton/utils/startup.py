@@ -0,0 +1,100 @@
+"""A timeline of what the bot does while it starts, and how long it takes.
+
+This is imported first thing by `milton`, so it does not import anything
+from the bot itself.
+"""
+import time
+from contextlib import contextmanager
+from typing import List, NamedTuple
+
+
+class Phase(NamedTuple):
+    """Something done while starting up.
+
+    Attributes:
+        name: What was done.
+        start: When it started, in seconds since the timeline started.
+        duration: How long it took, in seconds.
+        depth: How many phases this is nested in.
+    """
+
+    name: str
+    start: float
+    duration: float
+    depth: int
+
+
+SUMMARY_HEADERS = ("Phase", "Start (s)", "Duration (ms)")
+
+
+class StartupTimeline:
+    """Records the phases of the startup, in the order they end.
+
+    Phases are either timed as they run, with `phase`, or as whatever
+    happened since the last phase ended, with `mark`.
+    """
+
+    def __init__(self) -> None:
+        self.started_on: float = time.time()
+        """The UNIX timestamp when the timeline started."""
+        self.phases: List[Phase] = []
+        self.done: bool = False
+        """Whether the bot finished starting up."""
+
+        self._start: float = time.perf_counter()
+        self._last_end: float = self._start
+        self._depth: int = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        """Context manager that records its body as a phase."""
+        start = time.perf_counter()
+        depth = self._depth
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth = depth
+            self._record(name, start, time.perf_counter(), depth)
+
+    def mark(self, name: str):
+        """Record everything done since the last phase ended as a phase."""
+        self._record(name, self._last_end, time.perf_counter(), self._depth)
+
+    def finish(self, name: str = "ready"):
+        """Mark the last phase, and the end of the startup."""
+        self.mark(name)
+        self.done = True
+
+    def _record(self, name: str, start: float, end: float, depth: int):
+        self.phases.append(Phase(name, start - self._start, end - start, depth))
+        if depth == 0:
+            self._last_end = end
+
+    @property
+    def total(self) -> float:
+        """Seconds from the start of the timeline to the end of the last phase."""
+        return self._last_end - self._start
+
+    def summary(self) -> List[List]:
+        """Get the rows of the timeline, for use with `tabulate`."""
+        return [
+            [
+                # Nested phases are indented (tabulate strips plain spaces)
+                "- " * x.depth + x.name,
+                f"{x.start:.3f}",
+                f"{x.duration * 1000:.1f}",
+            ]
+            for x in sorted(self.phases, key=lambda x: (x.start, x.depth))
+        ]
+
+    def report(self) -> str:
+        """Get the timeline as some lines of text, for the logs."""
+        lines = [f"Started up in {self.total:.2f}s:"]
+        for name, start, duration in self.summary():
+            lines.append(f"{start:>9}s {duration:>10}ms  {name}")
+        return "\n".join(lines)
+
+
+TIMELINE = StartupTimeline()
+"""The timeline of the startup of this process."""
@@ -1,14 +1,32 @@
 """Collection of utility functions used around the bot"""
+import asyncio
+import importlib
 import logging
 import random
+import re
+import sys
+from asyncio import Timeout
 from datetime import datetime, time, timedelta
 from difflib import get_close_matches
 from pathlib import Path
-from typing import Any, List, Mapping, Optional, Tuple, Union
-from asyncio import Timeout
+from time import perf_counter
+from types import ModuleType
+from typing import (
+    Any,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from aiohttp import ClientSession
 
+from milton.utils.metrics import timings
+
 log = logging.getLogger(__name__)
 
 
@@ -112,6 +130,80 @@ async def fetch(session: ClientSession, url: str, params: Mapping = {}):
             return await response.text()
 
 
+async def gather_limited(
+    aws: Iterable[Awaitable], limit: int, return_exceptions: bool = True
+) -> List[Any]:
+    """Await a bunch of awaitables concurrently, but at most `limit` at a time.
+
+    Args:
+        aws: The awaitables to run. They are started only when a slot frees up.
+        limit: The maximum number of awaitables that can run at the same time.
+        return_exceptions: Passed to `asyncio.gather`. By default, exceptions
+            are returned in the results instead of being raised, so one
+            failure does not stop the others.
+
+    Returns:
+        The results of the awaitables, in the same order they were given.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(aw: Awaitable):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(run(aw) for aw in aws), return_exceptions=return_exceptions
+    )
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module, logging how long it took if it was not imported yet.
+
+    Heavy dependencies that are only needed by some commands are imported
+    with this when they are first needed, instead of when the bot starts.
+
+    Args:
+        name: The full name of the module, like "matplotlib.mathtext".
+
+    Returns:
+        The imported module.
+    """
+    if name in sys.modules:
+        return importlib.import_module(name)
+
+    start = perf_counter()
+    module = importlib.import_module(name)
+    seconds = perf_counter() - start
+    timings(f"import: {name}").record(seconds)
+    log.info(f"Imported {name} in {seconds:.2f}s")
+    return module
+
+
+_WARM_UPS: Dict[str, asyncio.Future] = {}
+"""The imports started by `warm_up`, by module name."""
+
+
+async def warm_up(*names: str):
+    """Import some modules in a thread, so that the bot does not wait for them.
+
+    Each module is imported once: later calls wait for the same import to
+    finish. A module is in `sys.modules` as soon as its import starts, so
+    that is no sign that it can be used yet.
+
+    Args:
+        names: The full names of the modules to import.
+
+    Raises:
+        `ImportError` if a module cannot be imported.
+    """
+    loop = asyncio.get_running_loop()
+    for name in names:
+        if name not in _WARM_UPS:
+            _WARM_UPS[name] = loop.run_in_executor(None, lazy_import, name)
+        # Shielded, so that a cancelled caller does not cancel the import
+        await asyncio.shield(_WARM_UPS[name])
+
+
 def timediff(now: time, then: time) -> timedelta:
     """Calculates the difference between two times.
 
@@ -126,6 +218,50 @@ def timediff(now: time, then: time) -> timedelta:
     return now - then
 
 
+DURATION_UNITS = {
+    "w": 7 * 24 * 3600,
+    "d": 24 * 3600,
+    "h": 3600,
+    "m": 60,
+    "s": 1,
+}
+DURATION_PART = re.compile(
+    r"(\d+(?:\.\d+)?)\s*"
+    r"(weeks?|w|days?|d|hours?|h|minutes?|mins?|m|seconds?|secs?|s)(?![a-z])"
+)
+
+
+def parse_duration(text: str) -> float:
+    """Parse a human-readable duration, like "1d 2h" or "90 minutes".
+
+    The units are weeks, days, hours, minutes and seconds, written in full or
+    with their first letter. Parts can be separated by spaces, commas or "and".
+
+    Args:
+        text: The duration to parse.
+
+    Returns:
+        The duration in seconds.
+
+    Raises:
+        `ValueError` if the text is not a duration.
+    """
+    text = text.strip().lower()
+    seconds = 0
+    end = 0
+    for match in DURATION_PART.finditer(text):
+        if text[end : match.start()].strip(" ,").removeprefix("and").strip():
+            raise ValueError(f"Cannot parse duration {text!r}")
+        value, unit = match.groups()
+        seconds += float(value) * DURATION_UNITS[unit[0]]
+        end = match.end()
+
+    if end == 0 or text[end:].strip():
+        raise ValueError(f"Cannot parse duration {text!r}")
+
+    return seconds
+
+
 def id_from_mention(mention: str) -> Tuple[int, Optional[str]]:
     """Get an ID from a mention
 
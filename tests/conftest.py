@@ -0,0 +1,17 @@
+"""Sets up a throwaway config for the bot, before anything imports it"""
+import os
+import tempfile
+from pathlib import Path
+
+_HOME = Path(tempfile.mkdtemp(prefix="milton-tests-"))
+os.environ["HOME"] = str(_HOME)
+
+(_HOME / ".config" / "milton").mkdir(parents=True)
+(_HOME / ".config" / "milton" / "milton.toml").write_text(
+    "[bot]\n"
+    'token = "not a token"\n'
+    "[database]\n"
+    f'path = "{_HOME / "milton.db"}"\n'
+    "[logs]\n"
+    f'path = "{_HOME / "logs" / "milton.log"}"\n'
+)
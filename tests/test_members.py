@@ -0,0 +1,48 @@
+import asyncio
+
+from milton.core.members import QUERY_CHUNK, MemberResolver
+
+
+class FakeMember:
+    def __init__(self, user_id: int) -> None:
+        self.id = user_id
+
+
+class FakeGuild:
+    """A guild whose gateway queries fail for some users."""
+
+    def __init__(self, members, broken=()) -> None:
+        self.id = 1
+        self.members = set(members)
+        self.broken = set(broken)
+        self.queries = 0
+
+    def get_member(self, user_id):
+        return None
+
+    async def query_members(self, user_ids, limit, cache):
+        self.queries += 1
+        assert len(user_ids) <= QUERY_CHUNK
+        if self.broken & set(user_ids):
+            raise RuntimeError("The gateway is down")
+        return [FakeMember(x) for x in user_ids if x in self.members]
+
+
+def test_gone_skips_users_that_could_not_be_checked():
+    async def main():
+        resolver = MemberResolver(use_gateway=True, ttl=60, max_size=1000)
+        # The second chunk of users fails
+        guild = FakeGuild(members=range(0, 300, 2), broken=[150])
+        user_ids = list(range(300))
+
+        gone = await resolver.gone(guild, user_ids)
+        assert gone == [x for x in range(300) if x % 2 and not 100 <= x < 200]
+        assert guild.queries == 3
+
+        # What was found is cached, the users that failed are requested again
+        guild.broken.clear()
+        found = await resolver.resolve(guild, user_ids)
+        assert sorted(found) == [x for x in range(300) if not x % 2]
+        assert guild.queries == 4
+
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+import importlib
+from pathlib import Path
+
+import milton
+from milton.core.database import Database
+from milton.core.migrations import find_migrations, migrate
+from milton.core.queries import REGISTRY, check_query_plans
+
+SCHEMAS = Path(milton.__file__).parent / "schemas"
+
+# The modules that register SQL statements with `query`
+QUERY_MODULES = [
+    "milton.cogs.rss",
+    "milton.core.debug",
+    "milton.core.jobs",
+    "milton.core.maintenance",
+    "milton.repositories.birthdays",
+    "milton.repositories.feeds",
+    "milton.repositories.guild_settings",
+    "milton.repositories.reminders",
+]
+
+
+def test_hot_queries_do_not_scan_whole_tables(tmp_path):
+    for module in QUERY_MODULES:
+        importlib.import_module(module)
+    assert any(x.hot for x in REGISTRY.values())
+
+    async def main():
+        db = Database(tmp_path / "milton.db", read_connections=0)
+        await db.connect()
+        try:
+            await migrate(db, find_migrations(SCHEMAS))
+            # Raises if a hot query would scan a whole table
+            plans = await check_query_plans(db, strict=True)
+        finally:
+            await db.close()
+        assert set(plans) == set(REGISTRY.values())
+
+    asyncio.run(main())
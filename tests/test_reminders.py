@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+from box import Box
+
+from milton.cogs import reminders
+from milton.repositories.reminders import MemoryReminderRepository, Reminder
+
+BATCH_SIZE = 10
+
+
+class CountingRepository(MemoryReminderRepository):
+    """Reminders in memory, counting how many times they are read."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads = 0
+
+    async def due_before(self, until, after, limit):
+        self.reads += 1
+        return await super().due_before(until, after, limit)
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.reminders = CountingRepository()
+
+    async def wait_until_ready(self):
+        pass
+
+
+class RecordingReminders(reminders.Reminders):
+    def __init__(self, bot) -> None:
+        super().__init__(bot)
+        self.sent = []
+
+    async def deliver(self, reminder):
+        self.sent.append(reminder.reminder_id)
+
+
+@pytest.fixture(autouse=True)
+def config(monkeypatch):
+    monkeypatch.setattr(
+        reminders,
+        "CONFIG",
+        Box(
+            {
+                "reminders": {
+                    "window": 3600,
+                    "batch_size": BATCH_SIZE,
+                    "max_concurrency": 4,
+                }
+            }
+        ),
+    )
+
+
+def make_reminder(reminder_id: int, due: float) -> Reminder:
+    return Reminder(reminder_id, 1, None, 1, due, due, f"reminder {reminder_id}")
+
+
+async def run_timer(bot, seconds: float) -> RecordingReminders:
+    cog = RecordingReminders(bot)
+    await cog.cog_load()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        cog.cog_unload()
+    return cog
+
+
+def test_sends_more_due_reminders_than_a_batch():
+    async def main():
+        bot = FakeBot()
+        # All due at once, so that every page is due as soon as it is read
+        now = time.time()
+        count = BATCH_SIZE * 3 + 5
+        for i in range(1, count + 1):
+            await bot.reminders.add(make_reminder(i, now - 10))
+
+        cog = await run_timer(bot, 0.2)
+
+        # One read per page, plus the last (partial) one
+        assert bot.reminders.reads == count // BATCH_SIZE + 1
+        assert sorted(cog.sent) == list(range(1, count + 1))
+        assert await bot.reminders.due_before(now + 3600, (0, 0), count) == []
+
+    asyncio.run(main())
+
+
+def test_tracks_reminders_added_while_running():
+    async def main():
+        bot = FakeBot()
+        now = time.time()
+        for i in range(1, BATCH_SIZE * 2 + 1):
+            await bot.reminders.add(make_reminder(i, now - 10))
+        await bot.reminders.add(make_reminder(1000, now + 7200))
+
+        cog = RecordingReminders(bot)
+        await cog.cog_load()
+        try:
+            await asyncio.sleep(0.1)
+            reminder = make_reminder(500, time.time() + 0.1)
+            await bot.reminders.add(reminder)
+            cog._track(reminder.due, reminder.reminder_id)
+            await asyncio.sleep(0.3)
+        finally:
+            cog.cog_unload()
+
+        assert sorted(cog.sent) == list(range(1, BATCH_SIZE * 2 + 1)) + [500]
+
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+import asyncio
+from pathlib import Path
+
+import discord
+import pytest
+from aiohttp import ClientSession, test_utils, web
+from box import Box
+
+import milton
+from milton.cogs import rss
+from milton.core.database import Database
+from milton.core.migrations import find_migrations, migrate
+from milton.repositories.feeds import MemoryFeedRepository, SqliteFeedRepository
+
+SCHEMAS = Path(milton.__file__).parent / "schemas"
+
+
+def make_feed(count: int) -> str:
+    items = "".join(
+        f"<item><guid>item-{i}</guid><title>Item {i}</title></item>"
+        for i in range(count)
+    )
+    return f"<rss><channel><title>A feed</title>{items}</channel></rss>"
+
+
+@pytest.mark.parametrize("threshold", [10, 10**9])
+def test_parse_feed_keeps_the_newest_entries_of_any_feed(monkeypatch, threshold):
+    monkeypatch.setattr(
+        rss, "CONFIG", Box({"rss": {"stream_threshold": threshold, "max_entries": 5}})
+    )
+
+    parsed = asyncio.run(rss.parse_feed(make_feed(20)))
+
+    assert [x.id for x in parsed.entries] == [f"item-{i}" for i in range(5)]
+
+
+class FakeResponse:
+    def __init__(self, status: int) -> None:
+        self.status = status
+        self.reason = "Nope"
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, failures: int = 0) -> None:
+        self.id = channel_id
+        self.failures = failures
+        self.sent = []
+
+    async def send(self, embeds):
+        if self.failures:
+            self.failures -= 1
+            raise discord.HTTPException(FakeResponse(500), "Server error")
+        self.sent.extend(x.title for x in embeds)
+
+
+class FakeBot:
+    def __init__(self, channels) -> None:
+        self.feeds = MemoryFeedRepository()
+        self.http_session = None
+        self.channels = {x.id: x for x in channels}
+        self.ready = asyncio.Event()
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    async def fetch_channel(self, channel_id):
+        raise discord.NotFound(FakeResponse(404), "Unknown Channel")
+
+    async def wait_until_ready(self):
+        await self.ready.wait()
+
+
+def test_feed_items_are_sent_to_every_channel_once(monkeypatch):
+    monkeypatch.setattr(
+        rss,
+        "CONFIG",
+        Box(
+            {
+                "rss": {
+                    "stream_threshold": 10**9,
+                    "max_entries": 50,
+                    "max_concurrency": 4,
+                    "min_poll_interval": 60,
+                    "max_poll_interval": 3600,
+                }
+            }
+        ),
+    )
+    document = make_feed(2)
+
+    async def fetch_feed(session, url, etag=None, last_modified=None):
+        return 200, document, None, None
+
+    monkeypatch.setattr(rss, "fetch_feed", fetch_feed)
+
+    async def main():
+        nonlocal document
+        working, flaky = FakeChannel(1), FakeChannel(2, failures=1)
+        bot = FakeBot([working, flaky])
+        cog = rss.FeedCog(bot)
+        try:
+            # Channel 3 was deleted while the bot was offline
+            for channel_id in (1, 2, 3):
+                await bot.feeds.subscribe(
+                    "url", 1, channel_id, "A feed", 60, 0, seen=["item-1"]
+                )
+            (feed,) = await bot.feeds.due(60)
+
+            await cog.poll_feed(feed)
+            assert working.sent == ["Item 0"]
+            assert flaky.sent == []
+            assert await bot.feeds.channels(feed.feed_id) == [1, 2]
+
+            document = make_feed(3)
+            await cog.poll_feed(feed)
+            assert working.sent == ["Item 0", "Item 2"]
+            assert flaky.sent == ["Item 2", "Item 0"]
+            assert await bot.feeds.unsent(feed.feed_id) == {}
+
+            await cog.poll_feed(feed)
+            assert working.sent == ["Item 0", "Item 2"]
+            assert flaky.sent == ["Item 2", "Item 0"]
+        finally:
+            cog.cog_unload()
+
+    asyncio.run(main())
+
+
+def test_unsubscribe_tells_if_the_channel_was_subscribed(tmp_path):
+    async def main():
+        db = Database(tmp_path / "milton.db", read_connections=1)
+        await db.connect()
+        try:
+            await migrate(db, find_migrations(SCHEMAS))
+            feeds = SqliteFeedRepository(db)
+            await feeds.subscribe("url", 1, 10, "A feed", 60, 0)
+            await feeds.subscribe("url", 1, 11, "A feed", 60, 0)
+            feed_id = await feeds.feed_id("url")
+
+            assert await feeds.unsubscribe(feed_id, 10)
+            assert not await feeds.unsubscribe(feed_id, 10)
+            assert await feeds.feed_id("url") == feed_id
+
+            assert await feeds.unsubscribe(feed_id, 11)
+            assert await feeds.feed_id("url") is None
+        finally:
+            await db.close()
+
+    asyncio.run(main())
+
+
+def test_sync_xkcd_archive_remembers_missing_comics(tmp_path):
+    requested = []
+
+    async def latest(request):
+        return web.json_response({"num": 6})
+
+    async def comic(request):
+        num = int(request.match_info["num"])
+        requested.append(num)
+        if num == 4:
+            raise web.HTTPNotFound()
+        return web.json_response(
+            {"num": num, "safe_title": f"Comic {num}", "alt": "Alt", "img": ""}
+        )
+
+    app = web.Application()
+    app.router.add_get("/info.0.json", latest)
+    app.router.add_get("/{num}/info.0.json", comic)
+
+    async def main():
+        server = test_utils.TestServer(app)
+        await server.start_server()
+        db = Database(tmp_path / "milton.db", read_connections=1)
+        await db.connect()
+        try:
+            await migrate(db, find_migrations(SCHEMAS))
+            base_url = f"http://{server.host}:{server.port}"
+            async with ClientSession() as session:
+                assert await rss.sync_xkcd_archive(db, session, base_url) == 5
+                assert sorted(requested) == [1, 2, 3, 4, 5, 6]
+
+                requested.clear()
+                assert await rss.sync_xkcd_archive(db, session, base_url) == 0
+                assert requested == []
+
+            async with db.read("SELECT num FROM xkcd_comics ORDER BY num") as cursor:
+                assert [row[0] async for row in cursor] == [1, 2, 3, 5, 6]
+        finally:
+            await db.close()
+            await server.close()
+
+    asyncio.run(main())